@@ -0,0 +1,106 @@
+"""
+Benchmark of calculating the depth of a Lyte probe from its accelerometer on
+a long synthetic radicl capture. The time and peak memory of integrating the
+whole dataframe with study_lyte are compared with integrating only the
+acceleration column with numpy.
+
+Methods:
+    * study_lyte - every column of the whole file integrated then joined back
+      on the time
+    * numpy - only the acceleration column at float64
+    * numpy float32 - only the acceleration column at float32
+
+Usage:
+    python benchmarks/acc_depth.py [n_rows]
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+from os.path import join
+
+import numpy as np
+import pandas as pd
+from inicheck.tools import get_user_config
+
+from generators import write_radicl_csv
+from snowplot.depth import depth_from_acceleration
+from snowplot.profiles import LyteProbeProfile
+
+
+def study_lyte_depth(df, acol):
+    """
+    Depth the way it was calculated before only the acceleration column was
+    integrated
+    """
+    from study_lyte.depth import get_depth_from_acceleration
+
+    df = df.copy()
+    acc_depth = get_depth_from_acceleration(df)
+    acc_depth['time'] = df.index
+    acc_depth.set_index('time', inplace=True)
+    df['acc_depth'] = acc_depth[acol].mul(-100)
+    return df['acc_depth'].values
+
+
+def numpy_depth(df, acol, dtype='float64'):
+    return -100 * depth_from_acceleration(df['time'].values, df[acol].values,
+                                          dtype=dtype)
+
+
+def measure(fn, *args, **kwargs):
+    """
+    Returns the result, the best time of three runs and peak memory in MB
+    """
+    seconds = []
+    for i in range(3):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return result, min(seconds), peak / 1e6
+
+
+def main(n_rows=2000000):
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = join(tmp, 'radicl.csv')
+        write_radicl_csv(filename, n_rows)
+
+        cfg_file = join(tmp, 'config.ini')
+        with open(cfg_file, 'w') as fp:
+            fp.write(f'[lyte_probe]\nfilename: {filename}\n[output]\n')
+        cfg = get_user_config(cfg_file, modules=['snowplot']).cfg
+
+        profile = LyteProbeProfile(**cfg['lyte_probe'])
+        df = profile.open()
+
+        # study_lyte needs every axis to calculate the magnitude
+        header_position = profile.read_header(filename)[1]
+        full = pd.read_csv(filename, header=header_position, index_col=0)
+
+    acol = 'Y-Axis'
+    expected, seconds, peak = measure(study_lyte_depth, full, acol)
+
+    print(f'{n_rows} rows')
+    print(f'{"method":>14} {"seconds":>10} {"peak MB":>10} {"rel error":>10}')
+    print(f'{"study_lyte":>14} {seconds:>10.3f} {peak:>10.0f} {0:>10.2g}')
+
+    for dtype in ['float64', 'float32']:
+        depth, seconds, peak = measure(numpy_depth, df, acol, dtype=dtype)
+        error = np.max(np.abs(depth - expected)) / np.max(np.abs(expected))
+        name = 'numpy' if dtype == 'float64' else 'numpy float32'
+        print(f'{name:>14} {seconds:>10.3f} {peak:>10.0f} {error:>10.2g}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
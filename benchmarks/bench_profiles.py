@@ -0,0 +1,185 @@
+"""
+Benchmarks for each stage of making a figure on synthetic profiles of every
+type. Uses pytest-benchmark so results can be saved and compared across
+commits. The peak memory of each stage, measured with tracemalloc in a
+separate untimed run, is stored in the extra info of each result.
+
+Stages:
+    * open - reading the file
+    * processing - processing the opened data
+    * layered - building the layered profile for layered data
+    * resample - projecting the processed profile onto a 0.5 cm grid
+    * envelope - adding the processed profile to a 0.5 cm envelope
+    * build_figure - drawing every profile onto the axes
+    * savefig - rendering the figure to a png
+
+Usage:
+    pytest benchmarks/bench_profiles.py --benchmark-autosave
+    pytest benchmarks/bench_profiles.py --benchmark-compare
+
+Set SNOWPLOT_BENCH_SCALE to scale the profile sizes, e.g. 0.1 for a quick
+run or 10 for very large profiles.
+"""
+import io
+import os
+import tracemalloc
+from os.path import join
+
+import matplotlib
+import pytest
+from inicheck.tools import get_checkers, get_user_config
+
+from generators import write_profile
+
+pytest.importorskip('pytest_benchmark')
+matplotlib.use('Agg')
+
+import snowplot.profiles  # noqa: E402
+from snowplot.envelope import DepthEnvelope  # noqa: E402
+from snowplot.plotting import build_figure  # noqa: E402
+from snowplot.resample import resample_profiles  # noqa: E402
+
+scale = float(os.environ.get('SNOWPLOT_BENCH_SCALE', 1))
+
+# Profile type and number of samples or layers at a scale of 1
+sizes = [('lyte_probe', 1000000),
+         ('rad_app', 1000000),
+         ('snow_micropen', 1000000),
+         ('hand_hardness', 10000),
+         ('grain_size', 10000)]
+sizes = [(kind, max(int(size * scale), 100)) for kind, size in sizes]
+ids = [f'{kind}-{size}' for kind, size in sizes]
+
+profile_classes = get_checkers(module='snowplot.profiles', keywords='profile')
+
+
+def get_peak_memory(fn, *args):
+    """
+    Runs the function once and returns the peak memory it allocated in MB
+    """
+    tracemalloc.start()
+    try:
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak / 1e6
+
+
+@pytest.fixture(scope='module')
+def bench_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp('bench'))
+
+
+@pytest.fixture(scope='module', params=sizes, ids=ids)
+def profile_cfg(request, bench_dir):
+    """
+    Writes a synthetic profile and returns the config for plotting it
+    """
+    kind, size = request.param
+    section, filename = write_profile(kind, bench_dir, size)
+
+    config_file = join(bench_dir, f'{kind}.ini')
+    with open(config_file, 'w') as fp:
+        fp.write(f'[{section}]\nfilename: {filename}\n[output]\n')
+
+    cfg = get_user_config(config_file, modules=['snowplot']).cfg
+    cfg['output']['filename'] = None
+    cfg['output']['show_plot'] = False
+    return section, cfg
+
+
+def make_profile(section, cfg):
+    return profile_classes[section.replace('_', '')](**cfg[section])
+
+
+def make_figure(section, cfg):
+    return build_figure({section: make_profile(section, cfg)}, cfg)
+
+
+def test_open(benchmark, profile_cfg):
+    section, cfg = profile_cfg
+    benchmark.extra_info['peak_mb'] = get_peak_memory(
+        lambda: make_profile(section, cfg).open())
+
+    benchmark.pedantic(lambda p: p.open(), rounds=3,
+                       setup=lambda: ((make_profile(section, cfg),), {}))
+
+
+def test_processing(benchmark, profile_cfg):
+    section, cfg = profile_cfg
+    profile = make_profile(section, cfg)
+    df = profile.open()
+    kw = {k: cfg[section][k] for k in ['smoothing', 'smoothing_depth',
+                                      'smoothing_method', 'average_columns']
+          if k in cfg[section].keys()}
+
+    benchmark.extra_info['peak_mb'] = get_peak_memory(
+        lambda: profile.processing(df.copy(), **kw))
+
+    benchmark.pedantic(lambda d: profile.processing(d, **kw), rounds=3,
+                       setup=lambda: ((df.copy(),), {}))
+
+
+def test_layered(benchmark, profile_cfg):
+    section, cfg = profile_cfg
+    profile = make_profile(section, cfg)
+    if not profile.is_layered_data:
+        pytest.skip(f'{section} is not layered data')
+
+    profile.load()
+    benchmark.extra_info['peak_mb'] = get_peak_memory(
+        profile.build_layered_profile)
+    benchmark.pedantic(profile.build_layered_profile, rounds=3)
+
+
+def test_resample(benchmark, profile_cfg):
+    section, cfg = profile_cfg
+    profile = make_profile(section, cfg)
+    profile.load()
+
+    benchmark.extra_info['peak_mb'] = get_peak_memory(
+        resample_profiles, [profile], 0.5)
+    benchmark.pedantic(resample_profiles, args=([profile], 0.5), rounds=3)
+
+
+def test_envelope(benchmark, profile_cfg):
+    section, cfg = profile_cfg
+    profile = make_profile(section, cfg)
+    profile.load()
+
+    def add(envelope):
+        envelope.add_profile(profile)
+
+    benchmark.extra_info['peak_mb'] = get_peak_memory(
+        add, DepthEnvelope(spacing=0.5))
+    benchmark.pedantic(add, rounds=3,
+                       setup=lambda: ((DepthEnvelope(spacing=0.5),), {}))
+
+
+def test_build_figure(benchmark, profile_cfg):
+    section, cfg = profile_cfg
+    benchmark.extra_info['peak_mb'] = get_peak_memory(
+        lambda: make_figure(section, cfg))
+
+    def build(profile):
+        build_figure({section: profile}, cfg)
+
+    # Load in the setup so only drawing is timed
+    def setup():
+        profile = make_profile(section, cfg)
+        profile.load()
+        return (profile,), {}
+
+    benchmark.pedantic(build, setup=setup, rounds=3)
+
+
+def test_savefig(benchmark, profile_cfg):
+    section, cfg = profile_cfg
+    fig = make_figure(section, cfg)
+
+    def save():
+        fig.savefig(io.BytesIO(), format='png')
+
+    benchmark.extra_info['peak_mb'] = get_peak_memory(save)
+    benchmark.pedantic(save, rounds=3)
@@ -0,0 +1,186 @@
+"""
+Writers for synthetic profiles of any size in every format snowplot reads.
+The values are not physically meaningful but each file has the structure,
+columns and headers of a real one so the whole reading and processing path
+is exercised.
+
+Example:
+    from benchmarks.generators import write_profile
+    section, filename = write_profile('lyte_probe', '/tmp', 1000000)
+"""
+import struct
+from os.path import dirname, join
+
+import numpy as np
+import pandas as pd
+
+# Real SMP file used as the source of a valid pnt header
+smp_template = join(dirname(__file__), '..', 'tests', 'data', 'smp.pnt')
+
+hardness = ['F-', 'F', 'F+', '4F-', '4F', '4F+', '1F-', '1F', '1F+', 'P-',
+            'P', 'P+', 'K']
+grain_sizes = ['< 1 mm', '1-2 mm', '2-4 mm', '4-6 mm', '>6 mm']
+
+
+def write_radicl_csv(filename, n_rows, seed=0):
+    """
+    Writes a synthetic radicl csv with the sensors, accelerometer axes and
+    extra columns that are not used in processing. The accelerometer shows
+    the probe at rest, pushed into the snow and at rest again.
+
+    Args:
+        filename: Path to write the csv to
+        n_rows: Number of samples to write
+        seed: Random seed for the sensor noise
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_rows) / 16000
+
+    # Push in the middle half of the samples
+    motion = np.zeros(n_rows)
+    quarter = n_rows // 4
+    motion[quarter:2 * quarter] = -0.5
+    motion[2 * quarter:3 * quarter] = 0.5
+
+    # Ambient light drops once under the snow surface
+    ambient = np.where(np.arange(n_rows) < int(1.2 * quarter), 100, 10)
+
+    df = pd.DataFrame({'Sensor1': 3000 + rng.normal(0, 50, n_rows),
+                       'Sensor2': ambient + rng.normal(0, 5, n_rows),
+                       'Sensor3': 2400 + rng.normal(0, 20, n_rows),
+                       'Sensor4': 2400 + rng.normal(0, 20, n_rows),
+                       'X-Axis': rng.normal(0, 0.01, n_rows),
+                       'Y-Axis': -1 + motion + rng.normal(0, 0.01, n_rows),
+                       'Z-Axis': rng.normal(0, 0.01, n_rows),
+                       'depth': np.linspace(0, -150, n_rows),
+                       'time': t})
+
+    with open(filename, 'w') as fp:
+        fp.write('RECORDED=2022-01-14--13:07:11\n')
+        fp.write('radicl VERSION=0.5.1\n')
+        fp.write('FIRMWARE REVISION=1.46\n')
+    df.to_csv(filename, mode='a')
+
+
+def write_rad_app_csv(filename, n_rows, seed=0):
+    """
+    Writes a synthetic csv like the ones exported from the mobile app with
+    the depth recorded by the app in millimeters.
+
+    Args:
+        filename: Path to write the csv to
+        n_rows: Number of samples to write
+        seed: Random seed for the sensor noise
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'Sensor1': 3000 + rng.normal(0, 50, n_rows),
+                       'Sensor2': 100 + rng.normal(0, 5, n_rows),
+                       'Sensor3': 2400 + rng.normal(0, 20, n_rows),
+                       'depth': np.linspace(0, 1500, n_rows)})
+
+    with open(filename, 'w') as fp:
+        fp.write('"Device"="Lyte Probe"\n')
+        fp.write('"Recorded"="2022-01-14 13:07:11"\n')
+    df.to_csv(filename, mode='a', index=False)
+
+
+def write_pnt(filename, n_samples, seed=0):
+    """
+    Writes a synthetic SMP pnt file using the header from the test data with
+    the sample counts replaced.
+
+    Args:
+        filename: Path to write the pnt file to
+        n_samples: Number of force samples to write
+        seed: Random seed for the force signal
+    """
+    rng = np.random.default_rng(seed)
+
+    with open(smp_template, 'rb') as fp:
+        header = bytearray(fp.read(512))
+
+    # Samples count and samples force count
+    struct.pack_into('>i', header, 2, n_samples)
+    struct.pack_into('>l', header, 358, n_samples)
+
+    # Force increasing with depth with some spikes, stored as raw counts
+    force = np.linspace(0, 5000, n_samples) + rng.gamma(2, 200, n_samples)
+    samples = np.clip(force, 0, 32767).astype('>i2')
+
+    with open(filename, 'wb') as fp:
+        fp.write(header)
+        fp.write(samples.tobytes())
+
+
+def write_hand_hardness(filename, n_layers, seed=0):
+    """
+    Writes a simple hand hardness text file of 1 cm thick layers each with a
+    range of two hardness values, e.g. 10-9 = F, 4F
+
+    Args:
+        filename: Path to write the text file to
+        n_layers: Number of layers to write
+        seed: Random seed for the hardness of each layer
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.choice(hardness, (n_layers, 2))
+
+    with open(filename, 'w') as fp:
+        for i, (h1, h2) in enumerate(values):
+            top = n_layers - i
+            fp.write(f'{top}-{top - 1} = {h1}, {h2}\n')
+
+
+def write_snowex_csv(filename, n_layers, seed=0):
+    """
+    Writes a SnowEx stratigraphy csv with a comment header
+
+    Args:
+        filename: Path to write the csv to
+        n_layers: Number of layers to write
+        seed: Random seed for the layer properties
+    """
+    rng = np.random.default_rng(seed)
+    depths = np.arange(n_layers, -1, -1) * 0.5
+    df = pd.DataFrame({'Top (cm)': depths[:-1],
+                       'Bottom (cm)': depths[1:],
+                       'Grain Size (mm)': rng.choice(grain_sizes, n_layers),
+                       'Grain Type': rng.choice(['DF', 'FC', 'RG'], n_layers),
+                       'Hand Hardness': rng.choice(hardness, n_layers),
+                       'Manual Wetness': 'D',
+                       'Comments': np.nan})
+
+    with open(filename, 'w') as fp:
+        fp.write('# Location,Grand Mesa\n')
+        fp.write('# Site,3N22\n')
+        fp.write('# PitID,COGM3N22_20200128\n')
+        fp.write('# Date/Local Time,2020-01-28T13:55\n')
+        fp.write('# ' + ','.join(df.columns) + '\n')
+    df.to_csv(filename, mode='a', index=False, header=False)
+
+
+# Config section, writer and file extension for each profile type
+writers = {'lyte_probe': ('lyte_probe', write_radicl_csv, '.csv'),
+           'rad_app': ('lyte_probe', write_rad_app_csv, '.csv'),
+           'snow_micropen': ('snow_micropen', write_pnt, '.pnt'),
+           'hand_hardness': ('hand_hardness', write_hand_hardness, '.txt'),
+           'grain_size': ('grain_size', write_snowex_csv, '.csv')}
+
+
+def write_profile(kind, directory, size, seed=0):
+    """
+    Writes a synthetic profile file of the kind requested
+
+    Args:
+        kind: Key in writers, profile type to write
+        directory: Directory to write the file to
+        size: Number of samples or layers in the profile
+        seed: Random seed
+    Returns:
+        tuple: **section** - config section that plots this file,
+               **filename** - path to the file written
+    """
+    section, writer, ext = writers[kind]
+    filename = join(directory, f'{kind}_{size}{ext}')
+    writer(filename, size, seed=seed)
+    return section, filename
@@ -0,0 +1,52 @@
+"""
+Benchmark for reading hand hardness text files. Times the parser against
+synthetic files of increasing size to show it scales linearly with the number
+of layers.
+
+Usage:
+    python benchmarks/hand_hardness.py
+"""
+import tempfile
+import time
+from os.path import join
+
+from inicheck.tools import get_user_config
+
+from generators import write_hand_hardness
+from snowplot.profiles import HandHardnessProfile
+
+
+def get_profile(tmp):
+    """
+    Build a profile to call the reader on using the defaults
+    """
+    filename = join(tmp, 'small.txt')
+    write_hand_hardness(filename, 10)
+    cfg = join(tmp, 'config.ini')
+    with open(cfg, 'w') as fp:
+        fp.write(f'[hand_hardness]\nfilename: {filename}\n[output]\n')
+    ucfg = get_user_config(cfg, modules=['snowplot'])
+    return HandHardnessProfile(**ucfg.cfg['hand_hardness'])
+
+
+def main(sizes=(1000, 10000, 100000), repeat=3):
+    with tempfile.TemporaryDirectory() as tmp:
+        profile = get_profile(tmp)
+
+        print(f'{"layers":>10} {"seconds":>10} {"us/layer":>10}')
+        for n in sizes:
+            filename = join(tmp, f'hand_hardness_{n}.txt')
+            write_hand_hardness(filename, n)
+
+            times = []
+            for i in range(repeat):
+                start = time.perf_counter()
+                profile.read_simple_text(filename)
+                times.append(time.perf_counter() - start)
+
+            best = min(times)
+            print(f'{n:>10} {best:>10.4f} {1e6 * best / n:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
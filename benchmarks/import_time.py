@@ -0,0 +1,79 @@
+"""
+Import time benchmark for snowplot. Each statement is timed in a fresh
+interpreter several times and the median is compared against a threshold so
+slow imports creeping back in are caught. Exits with 1 if any statement is
+over its threshold.
+
+Statements:
+    * import snowplot - the package alone
+    * import snowplot.cli - what the console script loads before parsing
+    * snowplot --help - the full console script round trip
+
+Usage:
+    python benchmarks/import_time.py [--repeat N] [--scale X]
+
+The thresholds are in seconds and can be loosened on slow machines with
+--scale.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Name, statement, threshold in seconds
+checks = [('import snowplot', 'import snowplot', 0.1),
+          ('import snowplot.cli', 'import snowplot.cli', 0.1),
+          ('snowplot --help', 'from snowplot.cli import main\n'
+                              'sys.argv = ["snowplot", "--help"]\n'
+                              'main()', 0.2)]
+
+# Measure the interpreter start up alone so it can be removed
+startup = 'import sys'
+
+
+def time_statement(statement, repeat=5):
+    """
+    Times running the statement in a fresh python process
+
+    Args:
+        statement: Python code to run
+        repeat: Number of times to run it
+    Returns:
+        float: Median seconds over the runs
+    """
+    code = f'import sys\n{statement}'
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time importing snowplot')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of runs per statement')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiplier on the thresholds')
+    args = parser.parse_args()
+
+    base = time_statement(startup, repeat=args.repeat)
+    print(f'python start up: {base:.3f}s\n')
+    print(f'{"statement":>20} {"seconds":>10} {"limit":>10}')
+
+    failed = False
+    for name, statement, threshold in checks:
+        seconds = max(time_statement(statement, repeat=args.repeat) - base, 0)
+        limit = threshold * args.scale
+        status = 'ok' if seconds <= limit else 'SLOW'
+        failed = failed or seconds > limit
+        print(f'{name:>20} {seconds:>10.3f} {limit:>10.3f}  {status}')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Peak memory benchmark for loading large Lyte probe files. A synthetic radicl
+csv is written then each loading mode is run in a fresh process so the peak
+resident set size (RSS) of each one can be compared.
+
+Modes:
+    * baseline - imports and config parsing only
+    * default - every processing column at float64 in one read
+    * float32 - processing columns read at float32
+
+Usage:
+    python benchmarks/lyte_memory.py [n_rows]
+"""
+import json
+import subprocess
+import sys
+import tempfile
+from os.path import join
+
+from generators import write_radicl_csv
+
+modes = {'baseline': None,
+         'default': '',
+         'float32': 'dtype: float32'}
+
+
+# The baseline only imports and parses the config to measure the overhead.
+# VmHWM is used since ru_maxrss can include the parent at the time of fork
+child = """
+import json, resource, sys, time
+from inicheck.tools import get_user_config
+from snowplot.profiles import LyteProbeProfile
+
+def get_peak():
+    try:
+        with open('/proc/self/status') as fp:
+            for line in fp:
+                if line.startswith('VmHWM'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+ucfg = get_user_config(sys.argv[1], modules=['snowplot'])
+cfg = ucfg.cfg['lyte_probe']
+start = time.perf_counter()
+if sys.argv[2] == 'load':
+    LyteProbeProfile(**cfg).load()
+seconds = time.perf_counter() - start
+peak = get_peak()
+print(json.dumps({'peak': peak, 'seconds': seconds}))
+"""
+
+
+def run_mode(tmp, filename, mode):
+    """
+    Loads the file in a fresh process and returns the peak RSS in MB and the
+    time to load
+    """
+    cfg = join(tmp, f'{mode}.ini')
+    with open(cfg, 'w') as fp:
+        fp.write(f'[lyte_probe]\nfilename: {filename}\n{modes[mode] or ""}\n'
+                 f'[output]\n')
+
+    action = 'skip' if modes[mode] is None else 'load'
+    out = subprocess.run([sys.executable, '-c', child, cfg, action],
+                         capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().split('\n')[-1])
+
+    # Both are in kilobytes on linux
+    return result['peak'] / 1e3, result['seconds']
+
+
+def main(n_rows=2000000):
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = join(tmp, 'radicl.csv')
+        write_radicl_csv(filename, n_rows)
+
+        print(f'{n_rows} rows')
+        print(f'{"mode":>10} {"peak MB":>10} {"load MB":>10} {"seconds":>10}')
+        baseline = None
+        for mode in modes.keys():
+            peak, seconds = run_mode(tmp, filename, mode)
+            if baseline is None:
+                baseline = peak
+            print(f'{mode:>10} {peak:>10.0f} {peak - baseline:>10.0f} '
+                  f'{seconds:>10.2f}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,92 @@
+"""
+Benchmark of reading a long synthetic SMP pnt file natively against reading
+it with snowmicropyn. Each method reads the file and converts it to the
+force in mN against depth in cm the way SnowMicroPenProfile does.
+
+Methods:
+    * snowmicropyn - snowmicropyn.Profile.load then converted in pandas
+    * native - samples mapped from the file and scaled in one pass
+    * header snowmicropyn - timestamp and coordinates from Profile.load
+    * header native - timestamp and coordinates from the first 512 bytes
+
+Usage:
+    python benchmarks/pnt_reader.py [n_samples]
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+from os.path import join
+
+import numpy as np
+from inicheck.tools import get_user_config
+
+from generators import write_pnt
+from snowplot.profiles import SnowMicroPenProfile
+
+
+def measure(fn, *args, **kwargs):
+    """
+    Returns the result, the best time of three runs and peak memory in MB
+    """
+    seconds = []
+    for i in range(3):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return result, min(seconds), peak / 1e6
+
+
+def main(n_samples=5000000):
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = join(tmp, 'smp.pnt')
+        write_pnt(filename, n_samples)
+
+        cfg_file = join(tmp, 'config.ini')
+        with open(cfg_file, 'w') as fp:
+            fp.write(f'[snow_micropen]\nfilename: {filename}\n[output]\n')
+        cfg = get_user_config(cfg_file, modules=['snowplot']).cfg
+
+        def load(reader):
+            profile = SnowMicroPenProfile(
+                **dict(cfg['snow_micropen'], reader=reader))
+            return profile.load()
+
+        def header(reader):
+            profile = SnowMicroPenProfile(
+                **dict(cfg['snow_micropen'], reader=reader))
+            return profile.header_info
+
+        print(f'{n_samples} samples')
+        print(f'{"method":>20} {"seconds":>10} {"peak MB":>10} '
+              f'{"max error":>10}')
+
+        expected, seconds, peak = measure(load, 'snowmicropyn')
+        print(f'{"snowmicropyn":>20} {seconds:>10.3f} {peak:>10.0f} '
+              f'{0:>10.2g}')
+
+        df, seconds, peak = measure(load, 'native')
+        error = np.max(np.abs(df['force'].values -
+                              expected['force'].values))
+        print(f'{"native":>20} {seconds:>10.3f} {peak:>10.0f} '
+              f'{error:>10.2g}')
+
+        for reader in ['snowmicropyn', 'native']:
+            _, seconds, peak = measure(header, reader)
+            name = f'header {reader}'
+            print(f'{name:>20} {seconds:>10.4f} {peak:>10.1f} {"":>10}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -16,18 +16,18 @@ setup_requirements = ['pytest-runner', ]
 
 test_requirements = ['pytest>=3', ]
 
+extra_requirements = {'parquet': ['pyarrow']}
+
 setup(
     author="Micah Johnson",
     author_email='micah.johnson150@gmail.com',
-    python_requires='>=3.5',
+    python_requires='>=3.9',
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
         'Natural Language :: English',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
-        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
     ],
     description="A python package for plotting vertical profiles for analyzing snow",
     entry_points={
@@ -38,6 +38,7 @@ setup(
     },
     package_data={'snowplot':['./master.ini','./recipes.ini']},
     install_requires=requirements,
+    extras_require=extra_requirements,
     license="BSD license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
@@ -1,6 +1,5 @@
 """Top-level package for snowplot."""
 from os.path import abspath, dirname, join
-from .utilities import getConfigHeader
 
 # Inicheck attributes for config files
 __core_config__ = abspath(join(dirname(__file__), 'master.ini'))
@@ -9,12 +8,29 @@ __config_titles__ = {
     "lyte_probe": "Lyte Probe data to plot and process",
     "snow_micropen": "SMP data to plot and process",
     "hand_hardness": "Hand Hardness data to plot and process",
+    "dataset": "Profile from an exported dataset to plot",
+    "envelope": "Quantiles of many profiles to plot against depth",
     "output": " Outputting details for the final figure",
 }
-__config_header__ = getConfigHeader()
-__config_checkers__ = 'utilities'
 
 __author__ = """Micah Johnson"""
 __version__ = '0.2.0'
 
 __non_data_sections__ = ['output']
+
+
+def __getattr__(name):
+    """
+    Defer importing inicheck and the rest of snowplot until inicheck asks for
+    the config header or checkers, keeping import snowplot fast.
+    """
+    if name == '__config_checkers__':
+        # inicheck looks up the checkers module in sys.modules
+        import snowplot.utilities
+        return 'utilities'
+
+    elif name == '__config_header__':
+        from .utilities import getConfigHeader
+        return getConfigHeader()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,285 @@
+"""
+Tools for rendering many snowplot figures in one go using a pool of processes
+"""
+import os
+import traceback
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from glob import glob
+from os import cpu_count
+from os.path import (abspath, basename, commonpath, dirname, isdir, join,
+                     relpath, splitext)
+
+from inicheck.iniparse import read_config
+
+import snowplot
+from snowplot.figure import make_vertical_plot
+from snowplot.utilities import get_logger
+
+
+def expand_paths(paths, pattern='*'):
+    """
+    Expands a list of directories, globs and filenames into a sorted list of
+    unique files.
+
+    Args:
+        paths: List of paths which can be directories, globs or files
+        pattern: Glob pattern to use when searching a directory
+    Returns:
+        files: sorted list of absolute file paths
+    """
+    files = []
+    for p in paths:
+        if isdir(p):
+            found = glob(join(p, pattern))
+        else:
+            found = glob(p)
+
+        for f in found:
+            f = abspath(f)
+            if f not in files and not isdir(f):
+                files.append(f)
+
+    return sorted(files)
+
+
+def get_output_dir(config_file, raw):
+    """
+    Returns:
+        output_dir: Absolute path to the directory a config writes to,
+                    relative paths are relative to the config like inicheck
+    """
+    output_dir = './output'
+    if 'output' in raw.keys() and 'output_dir' in raw['output'].keys():
+        output_dir = raw['output']['output_dir'][0]
+    return abspath(join(dirname(config_file), output_dir))
+
+
+def get_figure_names(files):
+    """
+    Names a figure after each data file. Files with the same name in
+    different directories are named after their path below the directory
+    common to all the files, and the extension is kept if that still isn't
+    unique, e.g. site_a/pit.csv becomes site_a_pit.
+
+    Args:
+        files: List of absolute paths to data files
+    Returns:
+        names: List of unique names without an extension
+    """
+    names = [splitext(basename(f))[0] for f in files]
+    if len(files) < 2:
+        return names
+
+    root = commonpath([dirname(f) for f in files])
+    relative = [relpath(f, root).replace(os.sep, '_') for f in files]
+
+    counts = Counter(names)
+    names = [splitext(r)[0] if counts[n] > 1 else n
+             for n, r in zip(names, relative)]
+
+    counts = Counter(names)
+    return [r.replace('.', '_') if counts[n] > 1 else n
+            for n, r in zip(names, relative)]
+
+
+def get_config_jobs(paths):
+    """
+    Builds a job for each config file found in paths. Only the first config
+    writing to each output directory writes its config_full.ini so
+    concurrent jobs never write the same file.
+
+    Args:
+        paths: List of config files, directories or globs of config files
+    Returns:
+        jobs: List of tuples of (name, config_file, overrides)
+    """
+    jobs = []
+    output_dirs = set()
+    for f in expand_paths(paths, pattern='*.ini'):
+        # Avoid rendering configs snowplot wrote out itself
+        if basename(f) == 'config_full.ini':
+            continue
+
+        overrides = {'output': {'show_plot': False}}
+        output_dir = get_output_dir(f, read_config(f))
+        if output_dir in output_dirs:
+            overrides['output']['write_full_config'] = False
+        output_dirs.add(output_dir)
+
+        jobs.append((f, f, overrides))
+    return jobs
+
+
+def get_template_jobs(template, data_files, section=None):
+    """
+    Builds a job for each data file using a single config as the template.
+    Each data file replaces the filename of the data section in the template
+    and is written to a figure named after the data file, see
+    get_figure_names. Only the first job writes config_full.ini.
+
+    Args:
+        template: Path to a config file with a single data section
+        data_files: List of data files, directories or globs of data files
+        section: Name of the data section to swap filenames in, if None the
+                 first data section in the template is used
+    Returns:
+        jobs: List of tuples of (name, config_file, overrides)
+    """
+    template = abspath(template)
+    raw = read_config(template)
+
+    if section is None:
+        sections = [s for s in raw.keys()
+                    if s not in snowplot.__non_data_sections__]
+        if not sections:
+            raise ValueError(f'No data sections found in template {template}')
+        section = sections[0]
+
+    # Use the same figure type as requested in the template
+    ext = '.png'
+    if 'output' in raw.keys() and 'filename' in raw['output'].keys():
+        ext = splitext(raw['output']['filename'][0])[-1] or ext
+
+    jobs = []
+    files = expand_paths(data_files)
+    for i, (f, name) in enumerate(zip(files, get_figure_names(files))):
+        overrides = {section: {'filename': f},
+                     'output': {'filename': name + ext,
+                                'show_plot': False}}
+        if i > 0:
+            overrides['output']['write_full_config'] = False
+        jobs.append((f, template, overrides))
+
+    return jobs
+
+
+def render_job(job):
+    """
+    Renders a single figure and reports back instead of raising so a single
+    bad job doesn't stop the rest of a batch.
+
+    Args:
+        job: Tuple of (name, config_file, overrides)
+    Returns:
+        tuple: **name** - job name, **error** - None if successful otherwise
+               a string describing the failure
+    """
+    name, config_file, overrides = job
+    error = None
+    try:
+        make_vertical_plot(config_file, overrides=overrides)
+
+    # make_vertical_plot exits on bad configs
+    except (Exception, SystemExit):
+        error = traceback.format_exc()
+
+    return name, error
+
+
+def _init_worker():
+    """
+    Workers never show plots, so avoid any interactive backends
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def run_pool(jobs, n_workers, job_fn, report):
+    """
+    Runs jobs across a pool keeping no more jobs submitted than workers, so
+    when a worker dies only the jobs running at the time are suspect
+
+    Args:
+        jobs: deque of jobs to run, jobs are removed as they are submitted
+        n_workers: Number of processes to use
+        job_fn: Function run on each job, see run_batch
+        report: Function called with the name and error of each finished job
+    Returns:
+        suspects: List of the jobs running when a worker died, empty if none
+                  did. Jobs never submitted are left in jobs
+    """
+    suspects = []
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             initializer=_init_worker) as pool:
+        running = {}
+        while jobs or running:
+            while jobs and len(running) < n_workers:
+                job = jobs.popleft()
+                running[pool.submit(job_fn, job)] = job
+
+            done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                try:
+                    report(*future.result())
+                except BrokenProcessPool:
+                    suspects.append(job)
+
+            # Every job still running fails with the pool
+            if suspects:
+                suspects.extend(running.values())
+                break
+
+    return suspects
+
+
+def run_batch(jobs, n_workers=None, job_fn=render_job):
+    """
+    Renders all the jobs across a pool of processes. If a worker process
+    dies, e.g. killed for running out of memory, each job running at the
+    time is run again on its own so only the job that killed it fails and
+    the rest of the batch continues in a new pool.
+
+    Args:
+        jobs: List of tuples of (name, config_file, overrides)
+        n_workers: Number of processes to use, defaults to the cpu count.
+                   When 1 the jobs are rendered in this process.
+        job_fn: Function run on each job returning a tuple of the job name
+                and the error or None, defaults to rendering the figure
+    Returns:
+        failures: Dictionary of job names to the error string for every job
+                  that failed
+    """
+    log = get_logger('snowplot.batch')
+
+    if n_workers is None:
+        n_workers = cpu_count() or 1
+    n_workers = max(1, min(n_workers, len(jobs)))
+    njobs = len(jobs)
+
+    log.info(f'Running {njobs} jobs using {n_workers} processes...')
+    failures = {}
+    finished = []
+
+    def report(name, error):
+        finished.append(name)
+        i = len(finished)
+        if error is None:
+            log.info(f'({i}/{njobs}) Finished {name}')
+        else:
+            log.error(f'({i}/{njobs}) Failed {name}:\n{error}')
+            failures[name] = error
+
+    if n_workers == 1:
+        _init_worker()
+        for job in jobs:
+            report(*job_fn(job))
+
+    else:
+        pending = deque(jobs)
+        while pending:
+            suspects = run_pool(pending, n_workers, job_fn, report)
+            if suspects:
+                log.warning(f'A worker process died, running the '
+                            f'{len(suspects)} jobs it may have been running '
+                            f'one at a time')
+
+            for job in suspects:
+                if run_pool(deque([job]), 1, job_fn, report):
+                    report(job[0], 'The worker process died running the job')
+
+    log.info(f'Batch complete, {njobs - len(failures)} succeeded and '
+             f'{len(failures)} failed.')
+    return failures
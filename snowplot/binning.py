@@ -0,0 +1,214 @@
+"""
+Statistics of dense profiles in fixed depth bins. A profile with millions of
+samples is reduced to one row per bin, far more than a figure can show but
+far less to process and draw. Bins are measured down from the top so the
+same bin size gives the same bins for every profile.
+
+Statistics per bin:
+    * mean, median, min and max of the values
+    * texture - mean of a rolling variance of the raw values over a centered
+      window set in depth, one bin high by default
+    * count - number of samples in the bin
+
+Example:
+    df = bin_statistics(depth, force, 0.1)
+"""
+import numpy as np
+import pandas as pd
+
+from .instrument import stage
+
+statistics = ['mean', 'median', 'min', 'max', 'texture', 'count']
+
+
+def _window_sums(cumulative, half_window):
+    """
+    Sums of a centered window of samples from the cumulative sum starting at
+    zero, the window shrinking at the ends
+
+    Args:
+        cumulative: numpy array of the cumulative sum with a leading zero
+        half_window: Number of samples either side of each sample
+    Returns:
+        sums: numpy array of the sum of the window around each sample
+    """
+    n = len(cumulative) - 1
+    w = 2 * half_window + 1
+    sums = np.empty(n)
+    sums[:half_window] = cumulative[half_window + 1:w]
+    np.subtract(cumulative[w:], cumulative[:n - w + 1],
+                out=sums[half_window:n - half_window])
+    sums[n - half_window:] = cumulative[n] - cumulative[n - w + 1:n -
+                                                        half_window]
+    return sums
+
+
+def rolling_variance(values, half_window):
+    """
+    Computes the variance of values in a centered window from cumulative sums
+    of the values and their squares. The window shrinks at the ends.
+
+    Args:
+        values: numpy array of the values
+        half_window: Number of samples either side of each value in its window
+    Returns:
+        variance: numpy array of the variance of the window around each value
+    """
+    n = len(values)
+    w = 2 * half_window + 1
+    if half_window == 0 or n == 0:
+        return np.zeros(n)
+
+    # Centering first keeps the sums of squares from losing precision
+    x = values - values.mean()
+    cumulative = np.zeros(n + 1)
+
+    if w <= n:
+        np.cumsum(x, out=cumulative[1:])
+        mean = _window_sums(cumulative, half_window)
+        x *= x
+        np.cumsum(x, out=cumulative[1:])
+        squares = _window_sums(cumulative, half_window)
+
+        counts = np.full(n, w, dtype=np.float64)
+        counts[:half_window] = np.arange(half_window + 1, w)
+        counts[n - half_window:] = np.arange(w - 1, half_window, -1)
+
+    # Windows reach both ends when there are fewer values than the window
+    else:
+        i = np.arange(n)
+        lo = np.maximum(i - half_window, 0)
+        hi = np.minimum(i + half_window + 1, n)
+        counts = (hi - lo).astype(np.float64)
+
+        np.cumsum(x, out=cumulative[1:])
+        mean = cumulative[hi] - cumulative[lo]
+        x *= x
+        np.cumsum(x, out=cumulative[1:])
+        squares = cumulative[hi] - cumulative[lo]
+    del x, cumulative
+
+    # Variance is the mean of the squares less the square of the mean
+    mean /= counts
+    squares /= counts
+    mean *= mean
+    squares -= mean
+    return np.maximum(squares, 0, out=squares)
+
+
+def _bin_chunk(bins, values, texture):
+    """
+    Computes the statistics of values already grouped into contiguous bins
+
+    Args:
+        bins: numpy array of the bin of each value, equal bins contiguous
+        values: numpy array of the values
+        texture: numpy array of the rolling variance at each value
+    Returns:
+        tuple: **bins** - numpy array of each bin,
+               **stats** - dictionary of the name of each statistic to a
+               numpy array with a value for each bin
+    """
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(bins)) + 1])
+    counts = np.diff(np.append(starts, len(bins)))
+
+    mean = np.add.reduceat(values, starts) / counts
+
+    # Sort within each bin then average the middle one or two values
+    segment = np.repeat(np.arange(len(starts)), counts)
+    ordered = values[np.lexsort((values, segment))]
+    median = (ordered[starts + (counts - 1) // 2] +
+              ordered[starts + counts // 2]) / 2
+
+    return bins[starts], {'mean': mean,
+                          'median': median,
+                          'min': np.minimum.reduceat(values, starts),
+                          'max': np.maximum.reduceat(values, starts),
+                          'texture': np.add.reduceat(texture, starts) / counts,
+                          'count': counts}
+
+
+def bin_statistics(depth, values, bin_size, top=0.0, chunk_size=None,
+                   texture_window=None):
+    """
+    Reduces values to statistics in bins of a fixed height in one vectorized
+    pass, or in chunks of whole bins to limit the temporary memory used.
+
+    Args:
+        depth: numpy array of the depth of each value in cm
+        values: numpy array of the values
+        bin_size: Height of each bin in cm
+        top: Depth of the top of the first bin in cm, usually the surface
+        chunk_size: Optional number of samples to bin at a time
+        texture_window: Height in cm of the rolling variance window, converted
+                        to samples with the median sample spacing. Defaults
+                        to the bin size
+    Returns:
+        df: Pandas dataframe of the statistics indexed by the depth of the
+            center of each bin, increasing like the profiles
+    """
+    if bin_size <= 0:
+        raise ValueError(f'Bin size must be positive, not {bin_size}')
+
+    depth = np.asarray(depth, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+
+    valid = np.isfinite(depth) & np.isfinite(values)
+    if not valid.all():
+        depth = depth[valid]
+        values = values[valid]
+
+    # Profiles are sorted by depth already so this rarely copies
+    if np.any(np.diff(depth) < 0):
+        order = np.argsort(depth, kind='stable')
+        depth = depth[order]
+        values = values[order]
+
+    n = len(depth)
+    chunk_size = chunk_size or max(n, 1)
+
+    half_window = 0
+    if n > 1:
+        spacing = np.median(np.diff(depth))
+        if spacing > 0:
+            half_window = int(round((texture_window or bin_size) /
+                                    spacing)) // 2
+    chunks = []
+    start = 0
+    stop = min(chunk_size, n)
+
+    with stage('bin'):
+        while start < n:
+            bins = np.floor((top - depth[start:stop]) / bin_size)
+            bins = bins.astype(np.int64)
+
+            # Leave the last bin for the next chunk so no bin is split
+            if stop < n:
+                split = np.flatnonzero(bins != bins[-1])
+                if len(split) == 0:
+                    stop = min(stop + chunk_size, n)
+                    continue
+                bins = bins[:split[-1] + 1]
+                stop = start + len(bins)
+
+            # Windows reach into the neighboring chunks
+            lo = max(start - half_window, 0)
+            hi = min(stop + half_window, n)
+            texture = rolling_variance(values[lo:hi], half_window)
+            texture = texture[start - lo:stop - lo]
+
+            chunks.append(_bin_chunk(bins, values[start:stop], texture))
+            start = stop
+            stop = min(start + chunk_size, n)
+
+    if chunks:
+        bins = np.concatenate([c[0] for c in chunks])
+        stats = {k: np.concatenate([c[1][k] for c in chunks])
+                 for k in statistics}
+    else:
+        bins = np.zeros(0, dtype=np.int64)
+        stats = {k: np.zeros(0, dtype=np.int64 if k == 'count' else None)
+                 for k in statistics}
+
+    index = pd.Index(top - (bins + 0.5) * bin_size, name='depth')
+    return pd.DataFrame(stats, index=index)
@@ -0,0 +1,177 @@
+"""
+On disk caching of processed profiles so figures can be restyled without
+reprocessing the data
+"""
+import hashlib
+import json
+import os
+import pickle
+from os.path import basename, isdir, join
+
+from . import __version__
+from .utilities import get_logger, write_file
+
+
+def get_file_hash(filename, block_size=2 ** 20):
+    """
+    Hashes the contents of a file in blocks to avoid reading it all at once
+
+    Args:
+        filename: Path to the file to hash
+        block_size: Number of bytes to read at a time
+    Returns:
+        digest: String of the sha256 hex digest of the file contents
+    """
+    h = hashlib.sha256()
+    with open(filename, 'rb') as fp:
+        for block in iter(lambda: fp.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def get_profile_key(profile):
+    """
+    Builds a key for a profile from its file contents, type and processing
+    options
+
+    Args:
+        profile: Instance of a GenericProfile
+    Returns:
+        key: String unique to the processed profile
+    """
+    options = {k: getattr(profile, k, None)
+               for k in profile.processing_keys}
+    options.update(profile.get_processing_overrides())
+    options['profile_type'] = type(profile).__name__
+    options['version'] = __version__
+    options['file_hash'] = get_file_hash(profile.filename)
+
+    s = json.dumps(options, sort_keys=True, default=str)
+    return hashlib.sha256(s.encode()).hexdigest()
+
+
+class ProfileCache(object):
+    """
+    Stores the final dataframe of processed profiles and any attributes
+    derived during processing in a directory. Entries are keyed by the content
+    of the data file and the options that change processing, so changing
+    plot styling still reuses the processed data.
+
+    Attributes:
+        cache_dir: Directory to store the cached profiles
+        max_size: Maximum size of the cache in megabytes, least recently used
+                  entries are removed beyond this
+    """
+    ext = '.pkl'
+
+    def __init__(self, cache_dir, max_size=500):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.log = get_logger('snowplot.cache')
+
+        if not isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def get_key(self, profile):
+        """
+        Builds a key for a profile, see get_profile_key
+        """
+        return get_profile_key(profile)
+
+    def get_path(self, key):
+        return join(self.cache_dir, key + self.ext)
+
+    def get(self, key, profile):
+        """
+        Retrieves a processed profile from the cache and restores the derived
+        attributes on the profile.
+
+        Args:
+            key: Key from get_key computed before the profile was opened
+            profile: Instance of a GenericProfile
+        Returns:
+            df: Processed dataframe or None if not cached
+        """
+        path = self.get_path(key)
+        name = basename(profile.filename)
+
+        # Another render may evict the entry at any point
+        try:
+            with open(path, 'rb') as fp:
+                entry = pickle.load(fp)
+
+        except FileNotFoundError:
+            self.log.info(f'Cache miss for {name}')
+            return None
+
+        except Exception as e:
+            self.log.warning(f'Unable to read cache entry for {name}, {e}')
+            self.remove(path)
+            return None
+
+        for k, v in entry['attributes'].items():
+            setattr(profile, k, v)
+
+        # Mark it as recently used for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.log.info(f'Cache hit for {name}')
+        return entry['df']
+
+    def put(self, key, profile, df):
+        """
+        Stores a processed profile dataframe and its derived attributes in
+        the cache then evicts old entries if the cache is too large.
+
+        Args:
+            key: Key from get_key computed before the profile was opened
+            profile: Instance of a GenericProfile
+            df: Processed pandas dataframe
+        """
+        path = self.get_path(key)
+        attributes = {k: getattr(profile, k) for k in profile.cached_attributes
+                      if hasattr(profile, k)}
+
+        write_file(path, lambda fp: pickle.dump(
+            {'df': df, 'attributes': attributes}, fp,
+            protocol=pickle.HIGHEST_PROTOCOL))
+
+        self.evict()
+
+    def remove(self, path):
+        """
+        Removes a file from the cache if another render hasn't already
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is under the
+        maximum size
+        """
+        entries = []
+        for f in os.listdir(self.cache_dir):
+            if not f.endswith(self.ext):
+                continue
+
+            # Entries removed by another render since listing are skipped
+            try:
+                s = os.stat(join(self.cache_dir, f))
+            except FileNotFoundError:
+                continue
+            entries.append((s.st_mtime, s.st_size, join(self.cache_dir, f)))
+
+        entries = sorted(entries)
+        total = sum([e[1] for e in entries])
+        limit = self.max_size * 1e6
+
+        while total > limit and entries:
+            mtime, size, f = entries.pop(0)
+            total -= size
+            self.remove(f)
+            self.log.debug(f'Evicted {basename(f)} from the cache')
@@ -1,14 +1,253 @@
 """Console script for snowplot."""
 import argparse
 import sys
-from snowplot.figure import make_vertical_plot
+
+
+def batch(argv):
+    """
+    Console script for rendering many figures at once with snowplot
+    """
+    from snowplot.batch import get_config_jobs, get_template_jobs, run_batch
+
+    parser = argparse.ArgumentParser(prog='snowplot batch',
+                                     description='Render many snowplot '
+                                                 'figures using a pool of '
+                                                 'processes.')
+    parser.add_argument('paths', nargs='*',
+                        help='Config files, directories or globs of config '
+                             'files. When --template is used these are the '
+                             'data files to plot instead')
+    parser.add_argument('-t', '--template', default=None,
+                        help='Config file to use as a template for every '
+                             'data file in paths')
+    parser.add_argument('-s', '--section', default=None,
+                        help='Section in the template to swap the filename '
+                             'in, defaults to the first data section')
+    parser.add_argument('-n', '--processes', type=int, default=None,
+                        help='Number of processes to use, defaults to the '
+                             'number of cpus')
+    parser.add_argument('-w', '--where', default=None,
+                        help='SQL condition selecting the data files from an '
+                             'index written by snowplot index, used with '
+                             '--template. Paths then only locate the index')
+    parser.add_argument('-i', '--index', default=None,
+                        help='Index to select data files from, defaults to '
+                             'snowplot_index.sqlite in the first directory '
+                             'in paths like snowplot index or the current '
+                             'directory')
+    args = parser.parse_args(argv)
+
+    if args.where is not None:
+        from snowplot.index import ProfileIndex, get_index_path
+
+        if args.template is None:
+            parser.error('--where selects data files and requires --template')
+        index = ProfileIndex(args.index or get_index_path(args.paths))
+        try:
+            args.paths = index.select(args.where)
+        except FileNotFoundError as e:
+            print(e)
+            return 1
+
+    if not args.paths:
+        print("No files found to render")
+        return 1
+
+    if args.template is not None:
+        jobs = get_template_jobs(args.template, args.paths,
+                                 section=args.section)
+    else:
+        jobs = get_config_jobs(args.paths)
+
+    if not jobs:
+        print("No files found to render in {}".format(', '.join(args.paths)))
+        return 1
+
+    failures = run_batch(jobs, n_workers=args.processes)
+
+    if failures:
+        print("\n{} of {} figures failed:".format(len(failures), len(jobs)))
+        for name in failures.keys():
+            print("  {}".format(name))
+        return 1
+
+    return 0
+
+
+def export(argv):
+    """
+    Console script for exporting processed profiles to a dataset
+    """
+    from snowplot.batch import get_config_jobs, get_template_jobs
+    from snowplot.export import export_profiles, list_profiles
+
+    parser = argparse.ArgumentParser(prog='snowplot export',
+                                     description='Process many profiles and '
+                                                 'write them to a single '
+                                                 'Parquet dataset. Profiles '
+                                                 'already in the dataset are '
+                                                 'skipped.')
+    parser.add_argument('paths', nargs='*',
+                        help='Config files, directories or globs of config '
+                             'files. When --template is used these are the '
+                             'data files to export instead')
+    parser.add_argument('-o', '--output', required=True,
+                        help='Directory of the dataset to add profiles to')
+    parser.add_argument('-t', '--template', default=None,
+                        help='Config file to use as a template for every '
+                             'data file in paths')
+    parser.add_argument('-s', '--section', default=None,
+                        help='Section in the template to swap the filename '
+                             'in, defaults to the first data section')
+    parser.add_argument('-n', '--processes', type=int, default=None,
+                        help='Number of processes to use, defaults to the '
+                             'number of cpus')
+    parser.add_argument('--list', action='store_true',
+                        help='List the profiles in the dataset and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        profiles = list_profiles(args.output)
+        print(profiles.to_string(index=False))
+        return 0
+
+    if args.template is not None:
+        jobs = get_template_jobs(args.template, args.paths,
+                                 section=args.section)
+    else:
+        jobs = get_config_jobs(args.paths)
+
+    if not jobs:
+        print("No files found to export in {}".format(', '.join(args.paths)))
+        return 1
+
+    failures = export_profiles(jobs, args.output, n_workers=args.processes)
+
+    if failures:
+        print("\n{} of {} exports failed:".format(len(failures), len(jobs)))
+        for name in failures.keys():
+            print("  {}".format(name))
+        return 1
+
+    return 0
+
+
+def index(argv):
+    """
+    Console script for indexing the metadata of profile files
+    """
+    from snowplot.index import ProfileIndex, get_index_path
+
+    parser = argparse.ArgumentParser(prog='snowplot index',
+                                     description='Read the headers of every '
+                                                 'profile file in directories '
+                                                 'into a SQLite index. Files '
+                                                 'unchanged since they were '
+                                                 'indexed are skipped.')
+    parser.add_argument('paths', nargs='+',
+                        help='Directories or files to index')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Path to the index, defaults to '
+                             'snowplot_index.sqlite in the first directory')
+    parser.add_argument('-w', '--where', default=None,
+                        help='SQL condition on the index columns, prints the '
+                             'paths of the matching profiles')
+    parser.add_argument('--no-update', action='store_true',
+                        help='Query the index without reading any files')
+    args = parser.parse_args(argv)
+
+    profile_index = ProfileIndex(args.output or get_index_path(args.paths))
+
+    if not args.no_update:
+        counts = profile_index.update(args.paths)
+        if args.where is None:
+            print(', '.join([f'{v} {k}' for k, v in counts.items()]))
+
+    if args.where is not None:
+        try:
+            files = profile_index.select(args.where)
+        except FileNotFoundError as e:
+            print(e)
+            return 1
+        for f in files:
+            print(f)
+
+    return 0
+
+
+def serve(argv):
+    """
+    Console script for running the snowplot render server
+    """
+    from snowplot.server import serve as run_server
+
+    parser = argparse.ArgumentParser(prog='snowplot serve',
+                                     description='Run a local HTTP server '
+                                                 'that renders snowplot '
+                                                 'figures using warm worker '
+                                                 'processes.')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Address to listen on')
+    parser.add_argument('-p', '--port', type=int, default=8000,
+                        help='Port to listen on')
+    parser.add_argument('-n', '--processes', type=int, default=None,
+                        help='Number of worker processes, defaults to the '
+                             'number of cpus')
+    parser.add_argument('-m', '--max-requests', type=int, default=None,
+                        help='Maximum renders queued or running at once, '
+                             'defaults to twice the number of processes')
+    parser.add_argument('--root', default=None,
+                        help='Directory relative data paths in posted '
+                             'configs are relative to, defaults to the '
+                             'current directory')
+    args = parser.parse_args(argv)
+
+    run_server(host=args.host, port=args.port, n_workers=args.processes,
+               max_requests=args.max_requests, root=args.root)
+    return 0
+
+
+def watch(argv):
+    """
+    Console script for re-rendering a figure when its config or data change
+    """
+    from snowplot.watch import ConfigWatcher
+
+    parser = argparse.ArgumentParser(prog='snowplot watch',
+                                     description='Render a figure and render '
+                                                 'it again each time its '
+                                                 'config file or data files '
+                                                 'change.')
+    parser.add_argument('config_file', help='path to config_file')
+    parser.add_argument('-i', '--interval', type=float, default=1.0,
+                        help='Seconds between checking the files for changes')
+    args = parser.parse_args(argv)
+
+    ConfigWatcher(args.config_file, interval=args.interval).run()
+    return 0
+
+
+# Sub commands available from snowplot
+commands = {'batch': batch, 'export': export, 'index': index,
+            'serve': serve, 'watch': watch}
 
 
 def main():
     """Console script for snowplot."""
+    if len(sys.argv) > 1 and sys.argv[1] in commands.keys():
+        return commands[sys.argv[1]](sys.argv[2:])
+
     parser = argparse.ArgumentParser(description='Generate vertical profiles'
-                                                 ' of snow data.')
+                                                 ' of snow data.',
+                                     epilog='Other commands: {}. Use '
+                                            'snowplot <command> --help for '
+                                            'more info.'
+                                            ''.format(', '.join(commands)))
     parser.add_argument('config_file', help='path to config_file')
+    parser.add_argument('--profile-report', default=None,
+                        help='Write a json report of the time and memory '
+                             'used by each stage of making the figure to '
+                             'this path')
     args = parser.parse_args()
 
     # Provide a opportunity to look at lots
@@ -16,10 +255,12 @@ def main():
         print("Please provide a config file for plots")
         sys.exit()
 
-    make_vertical_plot(args.config_file)
+    # Import after parsing so --help is fast
+    from snowplot.figure import make_vertical_plot
+    make_vertical_plot(args.config_file, profile_report=args.profile_report)
 
     return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Depth of a probe from its accelerometer using only numpy. Only the one
+acceleration axis along the probe and the time are integrated so no other
+columns are copied.
+"""
+import numpy as np
+
+# Gravity in m/s2, acceleration is recorded in g's
+g = 9.81
+
+
+def cumulative_trapezoid(values, dt, block_size=65536):
+    """
+    Cumulative integral using the trapezoid rule starting at zero. The sum is
+    carried at float64 in blocks so long float32 captures don't drift while
+    only a block at a time is held at the higher precision.
+
+    Args:
+        values: numpy array of the values to integrate
+        dt: numpy array of the time between each value, one shorter than
+            values
+        block_size: Number of samples summed at a time
+    Returns:
+        integral: numpy array the same length and dtype as values
+    """
+    integral = np.empty_like(values)
+    integral[0] = 0
+    total = 0.0
+
+    for start in range(1, len(values), block_size):
+        stop = min(start + block_size, len(values))
+        steps = values[start:stop] + values[start - 1:stop - 1]
+        steps *= dt[start - 1:stop - 1]
+        steps *= 0.5
+
+        partial = np.cumsum(steps, dtype=np.float64)
+        partial += total
+        integral[start:stop] = partial
+        total = partial[-1]
+
+    return integral
+
+
+def depth_from_acceleration(time, acceleration, percent_basis=0.05,
+                            dtype='float64'):
+    """
+    Double integrates the acceleration to the position of the probe assuming
+    it starts at rest. The mean of the first samples is removed as the local
+    gravity. Matches study_lyte.depth.get_depth_from_acceleration for a
+    single axis.
+
+    Args:
+        time: numpy array of the time of each sample in seconds
+        acceleration: numpy array of the acceleration in g's
+        percent_basis: Fraction of the samples at the start used to
+                       remove gravity
+        dtype: Precision to integrate at, float32 halves the memory
+    Returns:
+        position: numpy array of the position of each sample in meters
+    """
+    acc = np.array(acceleration, dtype=dtype)
+    if len(acc) < 2:
+        return np.zeros(len(acc), dtype=dtype)
+
+    acc *= g
+    n_basis = max(int(percent_basis * len(acc)), 1)
+    acc -= acc[0:n_basis].mean()
+
+    dt = np.diff(np.asarray(time, dtype=np.float64)).astype(dtype, copy=False)
+    velocity = cumulative_trapezoid(acc, dt)
+    return cumulative_trapezoid(velocity, dt)
@@ -0,0 +1,194 @@
+"""
+Streaming statistics of many profiles against depth. Profiles are added one
+at a time, each reduced to one value per depth bin, and only the running
+statistics are kept so memory stays fixed no matter how many profiles are
+added.
+
+Statistics per depth:
+    * count - number of profiles with data
+    * mean and variance - updated with Welford's method
+    * quantiles - approximated from a histogram of the values that widens
+      its range as needed, within one histogram bin of the sample quantile
+
+Example:
+    envelope = DepthEnvelope(spacing=1.0)
+    for profile in profiles:
+        envelope.add_profile(profile)
+    lower, median, upper = envelope.quantile([0.1, 0.5, 0.9])
+"""
+import numpy as np
+
+from .instrument import stage
+from .resample import make_grid, resample
+
+
+class DepthEnvelope(object):
+    """
+    Running statistics of profiles binned by depth
+
+    Attributes:
+        spacing: Height of each depth bin in cm
+        top: Depth of the first bin in cm, usually the surface
+        n_value_bins: Number of histogram bins used for the quantiles
+        count: numpy array of the number of profiles in each depth bin
+        mean: numpy array of the mean of each depth bin
+    """
+
+    def __init__(self, spacing=1.0, top=0.0, n_value_bins=512):
+        if n_value_bins < 2 or n_value_bins % 2 != 0:
+            raise ValueError(f'n_value_bins must be an even number above 1, '
+                             f'not {n_value_bins}')
+
+        self.spacing = spacing
+        self.top = top
+        self.n_value_bins = n_value_bins
+
+        self.count = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+
+        # Histogram of values for each depth bin, its lowest edge and width
+        self._hist = np.zeros((0, n_value_bins), dtype=np.int64)
+        self._low = None
+        self._width = None
+
+    @property
+    def grid(self):
+        return self.top - np.arange(len(self.count)) * self.spacing
+
+    @property
+    def n_profiles(self):
+        return int(self.count.max()) if len(self.count) else 0
+
+    @property
+    def variance(self):
+        """
+        Returns:
+            variance: numpy array of the sample variance of each depth bin,
+                      NaN with fewer than two profiles
+        """
+        variance = np.full(len(self.count), np.nan)
+        enough = self.count > 1
+        variance[enough] = self._m2[enough] / (self.count[enough] - 1)
+        return variance
+
+    def _grow(self, n):
+        """
+        Adds empty depth bins so there are n of them
+        """
+        extra = n - len(self.count)
+        if extra <= 0:
+            return
+        self.count = np.concatenate([self.count, np.zeros(extra, np.int64)])
+        self.mean = np.concatenate([self.mean, np.zeros(extra)])
+        self._m2 = np.concatenate([self._m2, np.zeros(extra)])
+        self._hist = np.concatenate(
+            [self._hist, np.zeros((extra, self.n_value_bins), np.int64)])
+
+    def _fit_range(self, vmin, vmax):
+        """
+        Widens the histogram until it spans vmin to vmax by merging pairs of
+        bins, keeping the number of bins fixed
+        """
+        n = self.n_value_bins
+        if self._low is None:
+            self._low = vmin
+            self._width = (vmax - vmin) / (n - 1) or max(abs(vmin), 1) * 1e-6
+            return
+
+        while vmax >= self._low + n * self._width:
+            merged = self._hist.reshape(-1, n // 2, 2).sum(axis=2)
+            self._hist[:] = 0
+            self._hist[:, :n // 2] = merged
+            self._width *= 2
+
+        while vmin < self._low:
+            merged = self._hist.reshape(-1, n // 2, 2).sum(axis=2)
+            self._hist[:] = 0
+            self._hist[:, n // 2:] = merged
+            self._low -= n * self._width
+            self._width *= 2
+
+    def update(self, values):
+        """
+        Adds one profile already on the grid of this envelope
+
+        Args:
+            values: numpy array with a value for each depth bin from the top,
+                    NaN where the profile has no data. Can be longer than the
+                    current grid.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        self._grow(len(values))
+
+        idx = np.flatnonzero(np.isfinite(values))
+        if len(idx) == 0:
+            return
+        v = values[idx]
+
+        # Welford's online mean and variance
+        self.count[idx] += 1
+        delta = v - self.mean[idx]
+        self.mean[idx] += delta / self.count[idx]
+        self._m2[idx] += delta * (v - self.mean[idx])
+
+        self._fit_range(v.min(), v.max())
+        bins = ((v - self._low) / self._width).astype(np.int64)
+        bins = np.clip(bins, 0, self.n_value_bins - 1)
+        self._hist[idx, bins] += 1
+
+    def add_profile(self, profile, column=None):
+        """
+        Adds a profile by averaging its samples in each depth bin. Profiles
+        that are not loaded yet are loaded and released afterwards.
+
+        Args:
+            profile: profile object to add
+            column: Column to add, defaults to the profile's column_to_plot
+        """
+        was_loaded = profile.is_loaded
+        df = profile.df
+        c = column or profile.column_to_plot
+        depth = df.index.values
+
+        with stage('envelope'):
+            if len(depth):
+                # Keep the bin the deepest sample falls in
+                bottom = min(np.nanmin(depth) - self.spacing / 2, self.top)
+                grid = make_grid(self.spacing, bottom, top=self.top)
+                self.update(resample(depth, df[c].values, grid,
+                                     method='mean'))
+
+        if not was_loaded:
+            profile.release()
+
+    def quantile(self, q):
+        """
+        Approximates quantiles of each depth bin from the histograms
+
+        Args:
+            q: Quantile or list of quantiles between 0 and 1
+        Returns:
+            quantiles: numpy array for each depth bin, or a list of them when
+                       q is a list. NaN where no profile has data.
+        """
+        if np.ndim(q) > 0:
+            return [self.quantile(qq) for qq in q]
+
+        result = np.full(len(self.count), np.nan)
+        if self._low is None:
+            return result
+
+        cdf = np.cumsum(self._hist, axis=1)
+        total = cdf[:, -1]
+        rows = np.flatnonzero(total > 0)
+        target = q * total[rows]
+
+        # First bin reaching the target then interpolate within it
+        i = (cdf[rows] < target[:, None]).sum(axis=1)
+        i = np.minimum(i, self.n_value_bins - 1)
+        before = np.where(i > 0, cdf[rows, np.maximum(i - 1, 0)], 0)
+        frac = (target - before) / np.maximum(self._hist[rows, i], 1)
+
+        result[rows] = self._low + (i + np.clip(frac, 0, 1)) * self._width
+        return result
@@ -0,0 +1,174 @@
+"""
+Sidecar files storing the events detected in a Lyte probe capture, the start
+and stop of the motion and the snow surface. Events are fixed for a raw file
+so they are stored next to it and reused until the file changes. Events can
+be set by hand in the manual section of the sidecar and are kept when the
+file changes, e.g.
+
+    {"file_hash": "...",
+     "detected": {"start": 1203, "stop": 25312, "surface": 1530},
+     "parameters": {"n_points_for_basis": 281, ...},
+     "manual": {"start": null, "stop": null, "surface": 1600}}
+"""
+import json
+import os
+from os.path import basename, isfile
+
+from .cache import get_file_hash
+from .utilities import get_logger, write_file
+
+events = ['start', 'stop', 'surface']
+
+
+class EventSidecar(object):
+    """
+    Reads and writes the events of a data file to <filename>.events.json.
+    Entries are keyed by the hash of the data file. The size and modified
+    time of the file are stored as well so the file is only hashed again
+    when either changes.
+
+    Attributes:
+        filename: Path to the data file the events belong to
+        path: Path to the sidecar file
+    """
+    ext = '.events.json'
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.path = filename + self.ext
+        self.log = get_logger('snowplot.events')
+        self._entry = None
+
+    def get_stat(self):
+        s = os.stat(self.filename)
+        return {'size': s.st_size, 'mtime_ns': s.st_mtime_ns}
+
+    def read_raw(self):
+        """
+        Reads the sidecar whether or not it belongs to the current contents
+        of the data file
+
+        Returns:
+            entry: Dictionary of the sidecar or None if missing or invalid
+        """
+        if not isfile(self.path):
+            return None
+
+        try:
+            with open(self.path) as fp:
+                return json.load(fp)
+
+        except Exception as e:
+            self.log.warning(f'Unable to read the events for '
+                             f'{basename(self.filename)}, {e}')
+            return None
+
+    def read(self):
+        """
+        Reads the sidecar if it belongs to the current contents of the data
+        file
+
+        Returns:
+            entry: Dictionary of the sidecar or None if missing or outdated
+        """
+        if self._entry is not None:
+            return self._entry
+
+        entry = self.read_raw()
+        if entry is None:
+            return None
+
+        name = basename(self.filename)
+
+        # Written by hand, the rest is filled in once events are detected
+        if entry.get('file_hash') is None:
+            self._entry = entry
+            return entry
+
+        stat = self.get_stat()
+        if any([entry.get(k) != v for k, v in stat.items()]):
+            if entry.get('file_hash') != get_file_hash(self.filename):
+                self.log.warning(f'{name} changed since its events were '
+                                 f'stored, detecting them again')
+                return None
+
+            # Same contents with a new modified time
+            entry.update(stat)
+            self.write(entry)
+
+        self._entry = entry
+        return entry
+
+    def get_manual(self):
+        """
+        Returns:
+            manual: Dictionary of the events set by hand, empty if none are.
+                    They apply even if the data file changed since
+        """
+        entry = self._entry or self.read_raw()
+        if entry is None:
+            return {}
+        manual = entry.get('manual') or {}
+        return {k: manual[k] for k in events if manual.get(k) is not None}
+
+    def get(self, parameters):
+        """
+        Retrieves the events detected with the same parameters with any set
+        by hand replacing them. When every event is set by hand they are
+        returned without needing any detected.
+
+        Args:
+            parameters: Dictionary of the thresholds and number of points
+                        used to detect the events
+        Returns:
+            events: Dictionary of start, stop and surface or None if they
+                    need detecting
+        """
+        manual = self.get_manual()
+        if len(manual) == len(events):
+            return manual
+
+        entry = self.read()
+        if entry is None or entry.get('parameters') != parameters:
+            return None
+
+        detected = dict(entry['detected'])
+        detected.update(manual)
+        return detected
+
+    def put(self, detected, parameters):
+        """
+        Stores detected events, keeping any set by hand even if the data
+        file changed since they were set
+
+        Args:
+            detected: Dictionary of start, stop and surface indices
+            parameters: Dictionary of the thresholds and number of points
+                        used to detect the events
+        """
+        file_hash = get_file_hash(self.filename)
+        previous = self.read_raw() or {}
+        manual = previous.get('manual') or {k: None for k in events}
+
+        if previous.get('file_hash') not in [None, file_hash] and \
+                any([manual.get(k) is not None for k in events]):
+            self.log.warning(f'{basename(self.filename)} changed since its '
+                             f'events were set by hand, keeping them. Check '
+                             f'the manual section of {basename(self.path)}')
+
+        entry = {'file_hash': file_hash,
+                 'detected': {k: int(v) for k, v in detected.items()},
+                 'parameters': parameters,
+                 'manual': manual}
+        entry.update(self.get_stat())
+        self.write(entry)
+        self._entry = entry
+
+    def write(self, entry):
+        try:
+            write_file(self.path, lambda fp: json.dump(entry, fp, indent=2),
+                       mode='w')
+
+        except OSError as e:
+            self.log.warning(f'Unable to store the events for '
+                             f'{basename(self.filename)}, {e}')
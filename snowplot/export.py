@@ -0,0 +1,221 @@
+"""
+Export of processed profiles to a single Parquet dataset partitioned by the
+type of profile. Each profile is written once to its own file so exporting
+more profiles only adds files and never rewrites existing ones.
+
+Layout:
+    dataset/profile_type=LyteProbe/<profile_id>.parquet
+    dataset/profile_type=HandHardness/<profile_id>.parquet
+
+Columns:
+    * profile_id - key of the data file contents and processing options
+    * profile_type - profile class without Profile, e.g. LyteProbe
+    * filename - path to the data file exported
+    * column - name of the column plotted
+    * depth - depth in cm
+    * value - value of the plotted column
+    * layer_number - layer of each value in layered data, null otherwise
+    * header - json of the metadata in the file header
+"""
+import json
+import os
+import traceback
+from functools import partial
+from glob import escape, glob
+from os.path import basename, dirname, isdir, isfile, join
+
+import numpy as np
+import pandas as pd
+
+from .batch import run_batch
+from .cache import get_profile_key
+from .figure import build_profiles, read_user_config
+from .utilities import get_logger, write_file
+
+engine = 'pyarrow'
+
+
+def get_profile_id(profile):
+    """
+    Returns:
+        profile_id: Short key of the data file contents, type and processing
+                    options of a profile
+    """
+    return get_profile_key(profile)[:16]
+
+
+def get_path(dataset, profile_type, profile_id):
+    """
+    Returns:
+        path: Path to the file in the dataset storing a profile
+    """
+    return join(dataset, f'profile_type={profile_type}',
+                f'{profile_id}.parquet')
+
+
+def profile_to_frame(profile, profile_id):
+    """
+    Converts a processed profile to the rows stored in the dataset
+
+    Args:
+        profile: Instance of a GenericProfile
+        profile_id: Id of the profile in the dataset
+    Returns:
+        frame: Pandas dataframe of the dataset columns except profile_type
+    """
+    df = profile.df
+    c = profile.column_to_plot
+    n = len(df.index)
+
+    # Layered and sampled data share one schema
+    if profile.is_layered_data:
+        layers = pd.array(df['layer_number'].values, dtype='Int64')
+    else:
+        layers = pd.array([None] * n, dtype='Int64')
+
+    return pd.DataFrame({
+        'profile_id': [profile_id] * n,
+        'filename': [profile.filename] * n,
+        'column': [c] * n,
+        'depth': df.index.values.astype(np.float64),
+        'value': df[c].values.astype(np.float64),
+        'layer_number': layers,
+        'header': [json.dumps(profile.header_info, sort_keys=True,
+                              default=str)] * n})
+
+
+def write_profile(dataset, profile):
+    """
+    Loads a profile and writes it to the dataset unless it is already in it
+
+    Args:
+        dataset: Directory of the dataset
+        profile: Instance of a GenericProfile
+    Returns:
+        path: Path to the file storing the profile
+    """
+    log = get_logger('snowplot.export')
+
+    # Key before opening since opening can adjust attributes
+    profile_id = get_profile_id(profile)
+    path = get_path(dataset, profile.name, profile_id)
+    name = basename(profile.filename)
+
+    if isfile(path):
+        log.info(f'{name} is already exported as {profile_id}')
+        return path
+
+    was_loaded = profile.is_loaded
+    frame = profile_to_frame(profile, profile_id)
+    if not was_loaded:
+        profile.release()
+
+    # Hidden temp files are skipped by readers of the dataset
+    if not isdir(dirname(path)):
+        os.makedirs(dirname(path), exist_ok=True)
+    write_file(path, lambda fp: frame.to_parquet(fp, engine=engine,
+                                                 index=False))
+
+    log.info(f'Exported {name} as {profile_id}')
+    return path
+
+
+def export_job(job, dataset):
+    """
+    Exports every profile in a config and reports back instead of raising so
+    a single bad job doesn't stop the rest of an export.
+
+    Args:
+        job: Tuple of (name, config_file, overrides)
+        dataset: Directory of the dataset
+    Returns:
+        tuple: **name** - job name, **error** - None if successful otherwise
+               a string describing the failure
+    """
+    name, config_file, overrides = job
+    error = None
+    try:
+        ucfg, errors = read_user_config(config_file, overrides=overrides)
+        if len(errors) > 0:
+            raise ValueError(f'Errors in config file {config_file}. Check '
+                             f'report above.')
+
+        for profile in build_profiles(ucfg.cfg).values():
+            write_profile(dataset, profile)
+
+    except Exception:
+        error = traceback.format_exc()
+
+    return name, error
+
+
+def export_profiles(jobs, dataset, n_workers=None):
+    """
+    Exports the profiles of all the jobs across a pool of processes
+
+    Args:
+        jobs: List of tuples of (name, config_file, overrides)
+        dataset: Directory of the dataset, created if it doesn't exist
+        n_workers: Number of processes to use, defaults to the cpu count
+    Returns:
+        failures: Dictionary of job names to the error string for every job
+                  that failed
+    """
+    # Fail before processing anything if parquet can't be written
+    try:
+        __import__(engine)
+    except ImportError:
+        raise ImportError(f'Exporting profiles requires {engine}, install it '
+                          f'with pip install {engine}')
+
+    if not isdir(dataset):
+        os.makedirs(dataset)
+
+    return run_batch(jobs, n_workers=n_workers,
+                     job_fn=partial(export_job, dataset=dataset))
+
+
+def list_profiles(dataset):
+    """
+    Lists the profiles in a dataset reading only the columns needed
+
+    Args:
+        dataset: Directory of the dataset
+    Returns:
+        profiles: Pandas dataframe of the profile_id, profile_type, filename
+                  and column of each profile
+    """
+    df = pd.read_parquet(dataset, engine=engine,
+                         columns=['profile_id', 'profile_type', 'filename',
+                                  'column'])
+    df['profile_type'] = df['profile_type'].astype(str)
+    return df.drop_duplicates('profile_id').reset_index(drop=True)
+
+
+def read_profile(dataset, profile_id, columns=None):
+    """
+    Reads the rows of a single profile from the dataset. Only the file of
+    the profile is opened, the type comes from its partition directory.
+
+    Args:
+        dataset: Directory of the dataset
+        profile_id: Id of the profile to read
+        columns: Optional list of columns to read
+    Returns:
+        df: Pandas dataframe of the rows of the profile
+    """
+    found = glob(get_path(escape(dataset), '*', escape(profile_id)))
+    if len(found) == 0:
+        raise ValueError(f'No profile {profile_id} found in {dataset}')
+
+    path = found[0]
+    profile_type = basename(dirname(path)).split('=', 1)[-1]
+
+    read_columns = columns
+    if columns is not None:
+        read_columns = [c for c in columns if c != 'profile_type']
+
+    df = pd.read_parquet(path, engine=engine, columns=read_columns)
+    if columns is None or 'profile_type' in columns:
+        df['profile_type'] = profile_type
+    return df
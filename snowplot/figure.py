@@ -1,46 +1,189 @@
+import copy
 import sys
+import threading
+import traceback
 from collections import OrderedDict
-from os import mkdir
-from os.path import join, isdir, dirname
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import copy_context
+from os import mkdir, stat
+from os.path import abspath, join, isdir, dirname
 
 from inicheck.output import generate_config, print_config_report
-from inicheck.tools import check_config, get_checkers, get_user_config
+from inicheck.tools import (cast_all_variables, check_config, get_checkers,
+                            get_user_config)
 
 # required for inicheck
 import snowplot.utilities
 import snowplot.profiles
-import snowplot.plotting
+from snowplot.cache import ProfileCache
+from snowplot.instrument import StageRecorder, stage
 
 """Main module."""
 
+# Validated user configs kept by read_user_config, most recently used last
+_user_configs = OrderedDict()
+_user_configs_lock = threading.Lock()
+user_config_cache_size = 64
 
-def make_vertical_plot(config_file):
+
+def apply_overrides(ucfg, overrides):
     """
-    Main function in snowplot to interpret config files and piece together the
-    plot users describe in the config file
+    Replaces items in a user config before it is checked. Useful for reusing
+    a single config file as a template for many figures.
+
+    Args:
+        ucfg: inicheck UserConfig object
+        overrides: Dictionary of dictionaries in the form of
+                   {section: {item: value}} to set in the config
+    Returns:
+        ucfg: inicheck UserConfig object with the overrides applied and cast
+    """
+    for section, items in overrides.items():
+        if section not in ucfg.raw_cfg.keys():
+            ucfg.raw_cfg[section] = OrderedDict()
+
+        for item, value in items.items():
+            if isinstance(value, (list, tuple)):
+                value = [str(v) for v in value]
+            else:
+                value = [str(value)]
+            ucfg.raw_cfg[section][item] = value
+
+    ucfg.apply_recipes()
+    ucfg = cast_all_variables(ucfg, ucfg.mcfg)
+    return ucfg
+
+
+def copy_user_config(ucfg):
+    """
+    Copies a user config so changing its items doesn't change the original.
+    The master config is shared.
+
+    Args:
+        ucfg: inicheck UserConfig object
+    Returns:
+        ucfg: inicheck UserConfig object
+    """
+    result = copy.copy(ucfg)
+    result.cfg = copy.deepcopy(ucfg.cfg)
+    result.raw_cfg = copy.deepcopy(ucfg.raw_cfg)
+    return result
+
+
+def get_config_key(config_file):
+    """
+    Builds a key for a user config from its path, modified time, size and
+    the snowplot version
+
+    Returns:
+        key: Tuple unique to the contents of the config
+    """
+    s = stat(config_file)
+    return (abspath(config_file), s.st_mtime_ns, s.st_size,
+            snowplot.__version__)
+
+
+def check_overrides(ucfg, overrides):
+    """
+    Checks only the items replaced by overrides in a config whose other
+    items were already checked
+
+    Args:
+        ucfg: inicheck UserConfig object with the overrides applied
+        overrides: Dictionary of {section: {item: value}} applied to it
+    Returns:
+        tuple: **warnings** - list of warnings for the items,
+               **errors** - list of errors for the items
+    """
+    checked = copy.copy(ucfg)
+    checked.cfg = OrderedDict()
+    for section, items in overrides.items():
+        configured = ucfg.cfg.get(section, {})
+        checked.cfg[section] = OrderedDict(
+            [(i, configured[i]) for i in items.keys() if i in configured])
+    return check_config(checked)
+
+
+def read_user_config(config_file, overrides=None):
+    """
+    Reads and checks a config file, printing the report of any issues. The
+    master config is parsed once per process and configs without errors are
+    kept so reading the same unchanged config again skips checking it. Only
+    the items replaced by overrides are checked on each read.
 
     Args:
         config_file: config file in .ini format and can be checked with inicheck
+        overrides: Optional dictionary of {section: {item: value}} to replace
+                   in the config file before it is checked
+    Returns:
+        tuple: **ucfg** - inicheck UserConfig object,
+               **errors** - list of errors found checking the config
     """
-    # Get the cfg
-    log = snowplot.utilities.get_logger("snowplot")
-    ucfg = get_user_config(config_file, modules='snowplot', cli=True)
-    warnings, errors = check_config(ucfg)
-    print(warnings, errors)
-    print_config_report(warnings, errors)
-    if len(errors) > 0:
-        print("Errors in config file. Check report above.")
-        sys.exit()
+    key = get_config_key(config_file)
+    with _user_configs_lock:
+        cached = _user_configs.get(key)
+        if cached is not None:
+            _user_configs.move_to_end(key)
 
-    # outut a config file
-    out = ucfg.cfg['output']['output_dir']
+    if cached is None:
+        with stage('read_config'):
+            ucfg = get_user_config(config_file,
+                                   mcfg=snowplot.utilities.get_master_config(),
+                                   cli=True)
+        with stage('check_config'):
+            warnings, errors = check_config(ucfg)
 
-    if not isdir(out):
-        mkdir(out)
-    generate_config(ucfg, join(out, 'config_full.ini'))
+        if len(errors) == 0:
+            _keep_user_config(key, ucfg)
 
-    # Grab a copy of the config dictionary
-    cfg = ucfg.cfg
+        # Overrides can fix errors in a template so check them all together
+        elif overrides is not None:
+            ucfg = apply_overrides(ucfg, overrides)
+            with stage('check_config'):
+                warnings, errors = check_config(ucfg)
+            overrides = None
+
+        print(warnings, errors)
+        print_config_report(warnings, errors)
+        if len(errors) > 0 or overrides is None:
+            return ucfg, errors
+
+    else:
+        ucfg = copy_user_config(cached)
+        if overrides is None:
+            return ucfg, []
+
+    ucfg = apply_overrides(ucfg, overrides)
+    with stage('check_config'):
+        warnings, errors = check_overrides(ucfg, overrides)
+
+    if len(warnings) > 0 or len(errors) > 0:
+        print_config_report(warnings, errors)
+    return ucfg, errors
+
+
+def _keep_user_config(key, ucfg):
+    """
+    Keeps a copy of a config without errors for read_user_config
+    """
+    with _user_configs_lock:
+        _user_configs[key] = copy_user_config(ucfg)
+        while len(_user_configs) > user_config_cache_size:
+            _user_configs.popitem(last=False)
+
+
+def build_profiles(cfg, cache=None):
+    """
+    Creates the profile objects requested in the config. Their data is loaded
+    when it is first used.
+
+    Args:
+        cfg: Dictionary of the cast config
+        cache: Optional ProfileCache to reuse processed profiles from
+    Returns:
+        data: Dictionary of profile names to profile objects
+    """
+    log = snowplot.utilities.get_logger("snowplot")
     data = {}
 
     # gather all the templates for creating profiles
@@ -54,14 +197,163 @@ def make_vertical_plot(config_file):
             k = v.replace('_', '').lower()
             requested_profiles[k] = v
 
-    # Create the profile objects and prerpare to add them to the figure
+    # Create the profile objects, their data is loaded when it is drawn
     for profile_name, cls in profile_classes.items():
 
         if profile_name in requested_profiles.keys():
             name = requested_profiles[profile_name]
             log.info("Building {} profile".format(name))
             # Add it to the dictionary of data
-            data[profile_name] = cls(**cfg[name])
+            data[profile_name] = cls(cache=cache, **cfg[name])
+
+    return data
+
+
+def _load_profile(name, profile):
+    """
+    Loads a single profile and reports back instead of raising so each panel
+    reports its own errors.
+
+    Args:
+        name: Name of the profile used for recording its stages
+        profile: Instance of a GenericProfile
+    Returns:
+        tuple: **df** - processed dataframe or None if it failed,
+               **attributes** - dictionary of the attributes set loading it,
+               **error** - None if successful otherwise the traceback
+    """
+    try:
+        with stage(name):
+            df = profile.load()
+        attributes = {k: getattr(profile, k)
+                      for k in profile.cached_attributes}
+        return df, attributes, None
+
+    except Exception:
+        return None, {}, traceback.format_exc()
+
+
+def load_profiles(data, n_workers=None, executor='thread'):
+    """
+    Loads every profile of a figure at the same time so the figure waits on
+    the slowest profile instead of all of them.
+
+    Args:
+        data: Dictionary of profile names to profile objects
+        n_workers: Number of threads or processes, defaults to one per profile
+        executor: Either thread or process. Threads suit profiles limited by
+                  reading files, processes suit those limited by processing
+    Raises:
+        RuntimeError: Listing every panel that failed after each is logged
+    """
+    log = snowplot.utilities.get_logger("snowplot")
+
+    if executor not in ['thread', 'process']:
+        raise ValueError(f'Unknown executor {executor}, use thread or process')
+
+    if n_workers is None:
+        n_workers = len(data)
+    n_workers = max(1, min(n_workers, len(data)))
+
+    log.info(f'Loading {len(data)} profiles using {n_workers} {executor}s...')
+
+    if executor == 'thread':
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            # Copy the context so stages are recorded under this one
+            futures = {name: pool.submit(copy_context().run, _load_profile,
+                                         name, p)
+                       for name, p in data.items()}
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = {name: pool.submit(_load_profile, name, p)
+                       for name, p in data.items()}
+
+    # Gather in the order of the panels
+    failures = []
+    for name in sorted(data.keys(), key=lambda n: data[n].plot_id):
+        profile = data[name]
+        df, attributes, error = futures[name].result()
+
+        if error is not None:
+            log.error(f'Panel {profile.plot_id + 1} ({name}) failed to '
+                      f'load:\n{error}')
+            failures.append(f'{profile.plot_id + 1} ({name})')
+            continue
+
+        # Processes load a copy of the profile
+        if executor == 'process':
+            for k, v in attributes.items():
+                setattr(profile, k, v)
+            profile.df = df
+            profile.set_xlimits(df)
+
+    if failures:
+        raise RuntimeError(f'Unable to load {len(failures)} of {len(data)} '
+                           f'panels: {", ".join(failures)}')
+
+
+def make_vertical_plot(config_file, overrides=None, profile_report=None):
+    """
+    Main function in snowplot to interpret config files and piece together the
+    plot users describe in the config file
+
+    Args:
+        config_file: config file in .ini format and can be checked with inicheck
+        overrides: Optional dictionary of {section: {item: value}} to replace
+                   in the config file before it is checked
+        profile_report: Optional path to write a json report of the time and
+                        memory used by each stage of making the figure
+    """
+    if profile_report is None:
+        _make_vertical_plot(config_file, overrides=overrides)
+        return
+
+    recorder = StageRecorder()
+    with recorder.recording():
+        with stage('make_vertical_plot'):
+            _make_vertical_plot(config_file, overrides=overrides)
+
+    recorder.write(profile_report, version=snowplot.__version__,
+                   config_file=abspath(config_file))
+
+
+def _make_vertical_plot(config_file, overrides=None):
+    """
+    Makes the figure, see make_vertical_plot
+    """
+    # Get the cfg
+    ucfg, errors = read_user_config(config_file, overrides=overrides)
+    if len(errors) > 0:
+        print("Errors in config file. Check report above.")
+        sys.exit()
+
+    # outut a config file
+    out = ucfg.cfg['output']['output_dir']
+
+    if not isdir(out):
+        mkdir(out)
+    if ucfg.cfg['output']['write_full_config']:
+        with stage('generate_config'):
+            generate_config(ucfg, join(out, 'config_full.ini'))
+
+    # Grab a copy of the config dictionary
+    cfg = ucfg.cfg
+
+    # Optionally reuse processed profiles
+    cache = None
+    if cfg['output']['cache_dir'] is not None:
+        cache = ProfileCache(cfg['output']['cache_dir'],
+                             max_size=cfg['output']['cache_size'])
+
+    data = build_profiles(cfg, cache=cache)
+
+    # Optionally load the profiles at the same time
+    if cfg['output']['load_workers'] > 1 and len(data) > 1:
+        with stage('load_profiles'):
+            load_profiles(data, n_workers=cfg['output']['load_workers'],
+                          executor=cfg['output']['load_executor'])
 
-    # Build the final figure
-    snowplot.plotting.build_figure(data, cfg)
+    # Build the final figure, matplotlib is only imported once it is needed
+    from snowplot.plotting import build_figure
+    with stage('build_figure'):
+        build_figure(data, cfg, reuse=True)
@@ -0,0 +1,378 @@
+"""
+Local SQLite index of the metadata of profile files so profiles can be
+selected by type, time or place without opening them. Only the header of
+each file is read. Files are indexed again only when their size or modified
+time change and their contents differ.
+
+Columns:
+    * path - absolute path to the data file
+    * file_hash - sha256 of the file contents
+    * size and mtime_ns - size and modified time when it was indexed
+    * profile_type - profile class without Profile, e.g. LyteProbe or
+      Layered for hand hardness and SnowEx pit files
+    * flavor - radicl or rad_app for Lyte probes, pnt for SMPs and snowex
+      or text for layered files
+    * timestamp - ISO 8601 time the profile was recorded
+    * latitude and longitude - WGS 84 coordinates
+    * samples_count - number of samples
+    * depth_top and depth_bottom - depth range in cm
+    * header - json of the metadata in the file header
+
+Values a header doesn't hold are NULL.
+
+Example:
+    index = ProfileIndex('data/snowplot_index.sqlite')
+    index.update(['data'])
+    files = index.select("profile_type = 'LyteProbe' AND "
+                         "timestamp >= '2022-01-01'")
+"""
+import json
+import os
+import sqlite3
+from datetime import datetime
+from os.path import abspath, basename, isdir, isfile, join
+
+from .cache import get_file_hash
+from .events import EventSidecar
+from .profiles import LayeredProfile, LyteProbeProfile, _depth_range
+from .utilities import get_logger
+
+# Name of the index written in an indexed directory by default
+filename = 'snowplot_index.sqlite'
+
+# Bump when the columns change to rebuild older indexes
+schema_version = 1
+
+columns = ['path', 'file_hash', 'size', 'mtime_ns', 'profile_type', 'flavor',
+           'timestamp', 'latitude', 'longitude', 'samples_count', 'depth_top',
+           'depth_bottom', 'header']
+
+_schema = """
+CREATE TABLE IF NOT EXISTS profiles (
+    path TEXT PRIMARY KEY,
+    file_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    profile_type TEXT NOT NULL,
+    flavor TEXT,
+    timestamp TEXT,
+    latitude REAL,
+    longitude REAL,
+    samples_count INTEGER,
+    depth_top REAL,
+    depth_bottom REAL,
+    header TEXT
+)
+"""
+
+# Header keys holding the time and coordinates, compared in lower case
+_timestamp_keys = ['recorded', 'date/local time', 'date', 'timestamp']
+_latitude_keys = ['latitude', 'lat']
+_longitude_keys = ['longitude', 'lon', 'long']
+_timestamp_formats = ['%Y-%m-%d--%H:%M:%S', '%Y-%m-%dT%H:%M',
+                      '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d']
+
+
+def parse_timestamp(value):
+    """
+    Returns:
+        timestamp: ISO 8601 string of a header time or None if it isn't one
+                   of the known formats
+    """
+    for fmt in _timestamp_formats:
+        try:
+            return datetime.strptime(value.strip(), fmt).isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def get_header_entry(header_info, keys, cast=str):
+    """
+    Finds the first of the keys in a header ignoring case
+
+    Returns:
+        value: Value of the entry cast or None if missing or invalid
+    """
+    lowered = {k.strip().lower(): v for k, v in header_info.items()}
+    for k in keys:
+        if lowered.get(k) not in [None, '']:
+            try:
+                return cast(lowered[k])
+            except ValueError:
+                return None
+    return None
+
+
+def read_lyte(path):
+    header_info = LyteProbeProfile.read_header(path)[0]
+    flavor = 'radicl' if 'radicl VERSION' in header_info.keys() \
+        else 'rad_app'
+    timestamp = get_header_entry(header_info, _timestamp_keys)
+    return {'profile_type': 'LyteProbe',
+            'flavor': flavor,
+            'timestamp': parse_timestamp(timestamp) if timestamp else None,
+            'latitude': get_header_entry(header_info, _latitude_keys, float),
+            'longitude': get_header_entry(header_info, _longitude_keys,
+                                          float),
+            'header': header_info}
+
+
+def read_smp(path):
+    from .pnt import read_header
+
+    header = read_header(path)
+    coordinates = header['coordinates'] or (None, None)
+    n = header['samples_count']
+    return {'profile_type': 'SnowMicroPen',
+            'flavor': 'pnt',
+            'timestamp': header['timestamp'].isoformat()
+            if header['timestamp'] is not None else None,
+            'latitude': coordinates[0],
+            'longitude': coordinates[1],
+            'samples_count': n,
+            'depth_top': 0.0,
+            'depth_bottom': -max(n - 1, 0) * header['spatial_resolution'] / 10,
+            'header': {k: header[k] for k in ['samples_count',
+                                              'spatial_resolution']}}
+
+
+def read_snowex(path):
+    with open(path) as fp:
+        header_info = LayeredProfile.read_snowex_header(fp)[0]
+    timestamp = get_header_entry(header_info, _timestamp_keys)
+    return {'profile_type': 'Layered',
+            'flavor': 'snowex',
+            'timestamp': parse_timestamp(timestamp) if timestamp else None,
+            'latitude': get_header_entry(header_info, _latitude_keys, float),
+            'longitude': get_header_entry(header_info, _longitude_keys,
+                                          float),
+            'header': header_info}
+
+
+def read_text(path):
+    return {'profile_type': 'Layered', 'flavor': 'text', 'header': {}}
+
+
+def get_reader(path):
+    """
+    Picks the header reader for a file from its extension and first line
+
+    Returns:
+        reader: Function reading the metadata of the file or None if the
+                file isn't a supported profile
+    """
+    ext = path.split('.')[-1].lower()
+    if ext == 'pnt':
+        return read_smp
+
+    if ext not in ['csv', 'txt']:
+        return None
+
+    with open(path, errors='ignore') as fp:
+        line = fp.readline()
+
+    if ext == 'csv' and line.startswith('#'):
+        return read_snowex
+    elif ext == 'csv' and '=' in line:
+        return read_lyte
+    elif ext == 'txt' and _depth_range.match(line.split('=')[0]):
+        return read_text
+    return None
+
+
+def get_index_path(paths):
+    """
+    Returns:
+        path: Path to the index of paths by default, snowplot_index.sqlite in
+              the first directory or the current directory if there is none
+    """
+    if paths and isdir(paths[0]):
+        return join(paths[0], filename)
+    return filename
+
+
+def find_files(paths, exclude=None):
+    """
+    Lists every file in directories and their subdirectories, skipping
+    hidden files and event sidecars
+
+    Args:
+        paths: List of directories or files
+        exclude: Optional path to leave out, usually the index itself
+    Returns:
+        files: Sorted list of absolute file paths
+    """
+    files = set()
+    for p in paths:
+        if not isdir(p):
+            files.add(abspath(p))
+            continue
+
+        for root, dirs, names in os.walk(p):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in names:
+                if name.startswith('.') or name.endswith(EventSidecar.ext):
+                    continue
+                files.add(abspath(join(root, name)))
+
+    if exclude is not None:
+        files.discard(abspath(exclude))
+    return sorted(files)
+
+
+class ProfileIndex(object):
+    """
+    Reads and writes the metadata of profile files in a SQLite database
+
+    Attributes:
+        path: Path to the SQLite database, created if it doesn't exist
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.log = get_logger('snowplot.index')
+
+    def connect(self, create=True):
+        """
+        Args:
+            create: Create the index if it doesn't exist, otherwise raise
+        Returns:
+            connection: sqlite3 connection with the profiles table created
+        """
+        if not create and not isfile(self.path):
+            raise FileNotFoundError(f'No index found at {self.path}, create '
+                                    f'one with snowplot index')
+
+        connection = sqlite3.connect(self.path)
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != schema_version:
+            connection.execute('DROP TABLE IF EXISTS profiles')
+            connection.execute(f'PRAGMA user_version = {schema_version}')
+        connection.execute(_schema)
+        return connection
+
+    def update(self, paths):
+        """
+        Indexes the profile files in directories, skipping files unchanged
+        since they were indexed and removing files that no longer exist,
+        including files removed while indexing
+
+        Args:
+            paths: List of directories or files to index
+        Returns:
+            counts: Dictionary of the number of files added, updated,
+                    unchanged, removed and skipped as unsupported or failed
+        """
+        counts = {k: 0 for k in ['added', 'updated', 'unchanged', 'removed',
+                                 'skipped']}
+        files = find_files(paths, exclude=self.path)
+        dirs = [abspath(p) for p in paths if isdir(p)]
+
+        with self.connect() as connection:
+            known = {row[0]: row[1:] for row in connection.execute(
+                'SELECT path, size, mtime_ns, file_hash FROM profiles')}
+
+            for f in files:
+                entry = known.get(f)
+                try:
+                    s = os.stat(f)
+                    if entry is not None and entry[:2] == (s.st_size,
+                                                           s.st_mtime_ns):
+                        counts['unchanged'] += 1
+                        continue
+
+                    reader = get_reader(f)
+                    if reader is None:
+                        counts['skipped'] += 1
+                        continue
+
+                    file_hash = get_file_hash(f)
+
+                # Removed since the directories were listed
+                except FileNotFoundError:
+                    if entry is not None:
+                        connection.execute(
+                            'DELETE FROM profiles WHERE path = ?', (f,))
+                        counts['removed'] += 1
+                    else:
+                        counts['skipped'] += 1
+                    continue
+
+                # Same contents with a new modified time
+                if entry is not None and entry[2] == file_hash:
+                    connection.execute(
+                        'UPDATE profiles SET size = ?, mtime_ns = ? '
+                        'WHERE path = ?', (s.st_size, s.st_mtime_ns, f))
+                    counts['unchanged'] += 1
+                    continue
+
+                try:
+                    row = reader(f)
+                except Exception as e:
+                    self.log.warning(f'Unable to index {basename(f)}, {e}')
+                    counts['skipped'] += 1
+                    continue
+
+                row.update({'path': f, 'file_hash': file_hash,
+                            'size': s.st_size, 'mtime_ns': s.st_mtime_ns,
+                            'header': json.dumps(row.get('header', {}),
+                                                 sort_keys=True,
+                                                 default=str)})
+                values = [row.get(c) for c in columns]
+                connection.execute(
+                    f'INSERT OR REPLACE INTO profiles ({", ".join(columns)}) '
+                    f'VALUES ({", ".join(["?"] * len(columns))})', values)
+                counts['updated' if entry is not None else 'added'] += 1
+
+            # Files removed from the directories indexed
+            found = set(files)
+            for f in known.keys():
+                inside = any([f.startswith(d + os.sep) for d in dirs])
+                if inside and f not in found:
+                    connection.execute('DELETE FROM profiles WHERE path = ?',
+                                       (f,))
+                    counts['removed'] += 1
+
+        connection.close()
+        self.log.info(', '.join([f'{v} {k}' for k, v in counts.items()]))
+        return counts
+
+    def query(self, where=None, params=()):
+        """
+        Reads the rows of the index matching a condition
+
+        Args:
+            where: Optional SQL condition on the columns, e.g.
+                   "profile_type = 'LyteProbe' AND timestamp >= ?". It is
+                   run as written so it must be trusted, pass any values
+                   from elsewhere in params instead of formatting them in
+            params: Values for any ? placeholders in where
+        Returns:
+            rows: List of dictionaries of the columns ordered by timestamp
+        Raises:
+            FileNotFoundError: When the index doesn't exist
+        """
+        sql = 'SELECT * FROM profiles'
+        if where:
+            sql += f' WHERE {where}'
+        sql += ' ORDER BY timestamp, path'
+
+        connection = self.connect(create=False)
+        try:
+            connection.row_factory = sqlite3.Row
+            rows = [dict(r) for r in connection.execute(sql, params)]
+        finally:
+            connection.close()
+
+        for r in rows:
+            r['header'] = json.loads(r['header']) if r['header'] else {}
+        return rows
+
+    def select(self, where=None, params=()):
+        """
+        Returns:
+            files: List of the paths of the profiles matching a condition,
+                   see query
+        """
+        return [r['path'] for r in self.query(where=where, params=params)]
@@ -0,0 +1,141 @@
+"""
+Records the wall time and memory allocated in each stage of making a figure.
+Code marks a stage with the stage context manager which does nothing unless a
+StageRecorder is recording, keeping the overhead near zero otherwise.
+
+Example:
+    recorder = StageRecorder()
+    with recorder.recording():
+        with stage('open'):
+            ...
+    recorder.write('report.json')
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+# Recorder stages are recorded to, None when not recording
+_recorder = ContextVar('snowplot_recorder', default=None)
+# Stages currently running, threads started with a copy of the context nest
+# their stages under the stage that started them
+_stack = ContextVar('snowplot_stages', default=())
+_null = nullcontext()
+
+
+def stage(name):
+    """
+    Marks a block of code as a stage in the active recorder. Stages inside
+    other stages are recorded with the path to them, e.g. build_figure/open.
+
+    Args:
+        name: Name of the stage
+    Returns:
+        context manager recording the stage or doing nothing if not recording
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        return _null
+    return recorder.stage(name)
+
+
+class StageRecorder(object):
+    """
+    Collects the time and memory of stages in the order they start. Memory is
+    tracked for the whole process so the memory of stages running at the same
+    time in different threads overlaps.
+
+    Attributes:
+        memory: Track memory allocations with tracemalloc
+        stages: List of dictionaries of each stage recorded
+    """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.stages = []
+        self._started_tracing = False
+
+    @contextmanager
+    def recording(self):
+        """
+        Records any stages run inside this context to this recorder
+        """
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        token = _recorder.set(self)
+        try:
+            yield self
+        finally:
+            _recorder.reset(token)
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Records the wall time, memory still allocated at the end and the peak
+        memory above the start of the stage. Memory is in MB.
+
+        Args:
+            name: Name of the stage
+        """
+        stack = _stack.get()
+        parent = stack[-1] if stack else None
+        path = '/'.join([s['stage'] for s in stack] + [name])
+        entry = {'stage': path, 'seconds': None}
+        self.stages.append(entry)
+
+        if self.memory:
+            # tracemalloc has a single peak so nested stages reset it and
+            # pass the highest value seen back up to their parent
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent['peak'] = max(parent['peak'], peak)
+            tracemalloc.reset_peak()
+            frame = {'stage': name, 'start': current, 'peak': current}
+        else:
+            frame = {'stage': name}
+
+        token = _stack.set(stack + (frame,))
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['seconds'] = time.perf_counter() - start
+            _stack.reset(token)
+
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame['peak'])
+                entry['allocated_mb'] = (current - frame['start']) / 1e6
+                entry['peak_mb'] = (peak - frame['start']) / 1e6
+
+                if parent is not None:
+                    parent['peak'] = max(parent['peak'], peak)
+
+    def report(self, **info):
+        """
+        Args:
+            info: Any additional items to add to the report
+        Returns:
+            report: Dictionary of the info and the stages recorded
+        """
+        report = dict(info)
+        report['memory'] = self.memory
+        report['stages'] = self.stages
+        return report
+
+    def write(self, filename, **info):
+        """
+        Writes the report to a json file
+
+        Args:
+            filename: Path to write the report to
+            info: Any additional items to add to the report
+        """
+        with open(filename, 'w') as fp:
+            json.dump(self.report(**info), fp, indent=2)
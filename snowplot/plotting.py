@@ -1,9 +1,12 @@
+import threading
+from collections import OrderedDict
 from os.path import join
 
-import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
+from snowplot.instrument import stage
 from snowplot.utilities import get_logger, titlize
 
 
@@ -39,106 +42,341 @@ def add_problem_layer(ax, depth):
     ax.axhline(y=depth, color='r')
 
 
-def build_figure(data, cfg):
+def minmax_decimate(depth, values, n_bins):
     """
-    Builds the final figure using the config and a dictionary of data profiles
+    Reduces a profile to the minimum and maximum value in each of n_bins
+    evenly spaced depth bins. This keeps the visual envelope of the profile
+    when each bin is no larger than a pixel.
+
+    Args:
+        depth: Numpy array of depths sorted in ascending order
+        values: Numpy array of values at each depth
+        n_bins: Number of bins to split the depth range into
+    Returns:
+        tuple: **depth** - decimated depths, **values** - decimated values
+    """
+    n = len(depth)
+    if n <= 2 * n_bins:
+        return depth, values
+
+    dmin, dmax = depth[0], depth[-1]
+    if dmax == dmin:
+        return depth, values
+
+    # Bins are contiguous since the depth is sorted
+    bins = ((depth - dmin) / (dmax - dmin) * n_bins).astype(int)
+    bins = np.clip(bins, 0, n_bins - 1)
+    starts = np.flatnonzero(np.diff(bins, prepend=-1))
+    bins = np.repeat(np.arange(len(starts)), np.diff(starts, append=n))
+
+    # Find the first position of the min and max in each bin
+    idx = np.arange(n)
+    vmin = np.minimum.reduceat(values, starts)
+    vmax = np.maximum.reduceat(values, starts)
+    imin = np.minimum.reduceat(np.where(values == vmin[bins], idx, n), starts)
+    imax = np.minimum.reduceat(np.where(values == vmax[bins], idx, n), starts)
+
+    # Keep the end points and the extremes in order of depth
+    keep = np.unique(np.concatenate([[0, n - 1], imin, imax]))
+    return depth[keep], values[keep]
+
+
+def lttb_decimate(depth, values, n_out):
+    """
+    Reduces a profile to n_out points using the largest triangle three
+    buckets algorithm which picks the point in each bucket that forms the
+    largest triangle with its neighbors.
+
+    Args:
+        depth: Numpy array of depths sorted in ascending order
+        values: Numpy array of values at each depth
+        n_out: Number of points to keep
+    Returns:
+        tuple: **depth** - decimated depths, **values** - decimated values
+    """
+    n = len(depth)
+    if n_out >= n or n_out < 3:
+        return depth, values
+
+    # Buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.zeros(n_out, dtype=int)
+    keep[-1] = n - 1
+    a = 0
+
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+
+        # Average of the next bucket is the third triangle point
+        if i < n_out - 3:
+            nstart, nstop = edges[i + 1], edges[i + 2]
+        else:
+            nstart, nstop = n - 1, n
+        cx = depth[nstart:nstop].mean()
+        cy = values[nstart:nstop].mean()
+
+        x = depth[start:stop]
+        y = values[start:stop]
+        area = np.abs((depth[a] - cx) * (y - values[a]) -
+                      (depth[a] - x) * (cy - values[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+
+    return depth[keep], values[keep]
+
+
+def decimate(depth, values, n_pixels, method='minmax', limits=None):
+    """
+    Reduces a dense profile to about as many points as can be displayed in
+    n_pixels. Only the data inside the depth limits is kept along with a
+    single point beyond each limit so lines still reach the edges.
+
+    Args:
+        depth: Numpy array of depths
+        values: Numpy array of values at each depth
+        n_pixels: Height in pixels the profile is drawn in
+        method: Decimation method either minmax or lttb
+        limits: Optional list of the depth limits to be displayed
+    Returns:
+        tuple: **depth** - decimated depths, **values** - decimated values
+    """
+    # Sort by depth for binning
+    if np.any(np.diff(depth) < 0):
+        order = np.argsort(depth, kind='stable')
+        depth = depth[order]
+        values = values[order]
+
+    # Drop NaNs e.g. from smoothing
+    valid = ~np.isnan(values)
+    depth = depth[valid]
+    values = values[valid]
+
+    if limits is not None:
+        lo, hi = sorted(limits)
+        start = max(np.searchsorted(depth, lo, side='left') - 1, 0)
+        stop = np.searchsorted(depth, hi, side='right') + 1
+        depth = depth[start:stop]
+        values = values[start:stop]
+
+    n_pixels = max(int(n_pixels), 1)
+
+    if method == 'minmax':
+        depth, values = minmax_decimate(depth, values, n_pixels)
+
+    elif method == 'lttb':
+        depth, values = lttb_decimate(depth, values, 2 * n_pixels)
+
+    else:
+        raise ValueError(f'Unknown decimation method {method}')
+
+    return depth, values
+
+
+def draw_profile(ax, name, profile, cfg):
+    """
+    Draws a single profile on its axes. Profiles that are not loaded yet are
+    loaded and released afterwards.
+
+    Args:
+            ax: matplotlib axes to draw on
+            name: Name of the profile used in logging
+            profile: data.profiles object to be plotted
+            cfg: dictionary of config options
+    """
+    log = get_logger(__name__)
+
+    # Plot up the data
+    was_loaded = profile.is_loaded
+    with stage('load'):
+        df = profile.df
+
+    # Add colums
+    c = profile.column_to_plot
+    log.debug("Adding {}.{}".format(name, c))
+    if profile.is_layered_data:
+        plot_data = profile.get_layered_profile()
+    else:
+        plot_data = df
+    plot_data = plot_data.reset_index()
+    depth = plot_data['depth'].values
+    values = plot_data[c].values
+
+    # Reduce dense profiles to what the axes can display
+    method = cfg['output']['decimate']
+    if method is not None and not profile.is_layered_data:
+        n_pixels = ax.get_window_extent().height
+        n = len(depth)
+        with stage('decimate'):
+            depth, values = decimate(depth, values, n_pixels, method=method,
+                                     limits=profile.ylimits)
+        log.debug('Decimated {}.{} from {} to {} points using {}'
+                  ''.format(name, c, n, len(depth), method))
+
+    # Shade a range under the line, e.g. quantiles or the min and max of bins
+    if profile.is_envelope_data:
+        lower, upper = profile.envelope_columns
+        with stage('fill'):
+            ax.fill_betweenx(plot_data['depth'].values,
+                             plot_data[lower].values,
+                             plot_data[upper].values,
+                             facecolor=profile.fill_color)
+
+    with stage('plot'):
+        ax.plot(values, depth, c=profile.line_color, label=c, linewidth=0.1)
+
+    # Fill the plot
+    if profile.fill_solid:
+        log.debug('Applying horizontal fill to {}.{}'
+                  ''.format(name, c))
+        with stage('fill'):
+            ax.fill_betweenx(depth, values,
+                             np.ones_like(df[c].shape) * profile.xlimits[0],
+                             facecolor=profile.fill_color,
+                             interpolate=True)
+    # Add_plot_labels
+    if profile.plot_labels is not None:
+        log.info("Adding {} annotations...".format(len(profile.plot_labels)))
+        add_plot_annotations(ax, df[c], profile.plot_labels)
+
+    # Create a problem layer
+    if profile.problem_layer is not None:
+        depth = profile.problem_layer
+        log.info("Adding a problem layer to plot at {}...".format(depth))
+        ax.axhline(y=depth, color='r')
+
+    # Custom titles
+    if profile.title is not None:
+        ax.set_title(profile.title)
+
+    # X axis label
+    if profile.xlabel is not None:
+        ax.set_xlabel(titlize(profile.xlabel))
+
+    # handle xticks
+    if profile.is_layered_data:
+        ax.set_xticks([profile.scale[ll] for ll in profile.xtick_labels])
+        ax.set_xticklabels(profile.xtick_labels)
+
+    if profile.remove_xticks:
+        ax.set_xticklabels([])
+
+    # Y axis label
+    if profile.ylabel is not None:
+        ax.set_ylabel(titlize(profile.ylabel))
+
+    # Set X limits
+    if profile.xlimits is not None:
+        lims = sorted(profile.xlimits)
+        log.debug("Setting x limits to {}:{}".format(*lims))
+        ax.set_xlim(*lims)
+
+    # Set y limits
+    if profile.ylimits is not None:
+        lims = sorted(profile.ylimits)
+        log.debug("Setting y limits to {}:{}".format(*lims))
+        ax.set_ylim(*lims)
+
+    ax.grid(visible=True)
+    ax.set_axisbelow(True)
+
+    # Free data that was only loaded to be drawn
+    if not was_loaded:
+        profile.release()
+
+
+# Figures kept for reuse by each thread keyed by their layout
+_figures = threading.local()
+
+
+def get_figure(figsize, dpi, nplots, reuse=False):
+    """
+    Creates a figure with an Agg canvas and a row of axes without using
+    pyplot, so nothing is kept in global state and figures can be made from
+    several threads. When reusing, the last figure this thread made with the
+    same layout is cleared and returned which keeps its canvas and memory
+    flat over many renders.
+
+    Args:
+            figsize: Width and height of the figure in inches
+            dpi: Dots per inch of the figure
+            nplots: Number of axes in the row
+            reuse: Reuse the figure of the last render with the same layout
+    Returns:
+            tuple: **fig** - matplotlib Figure, **axes** - list of axes
+    """
+    key = (tuple(figsize), dpi, nplots)
+
+    if reuse:
+        if not hasattr(_figures, 'cache'):
+            _figures.cache = OrderedDict()
+
+        fig = _figures.cache.pop(key, None)
+        if fig is not None:
+            fig.clear()
+        else:
+            fig = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(fig)
+
+        # Only keep the most recent layouts
+        _figures.cache[key] = fig
+        while len(_figures.cache) > 4:
+            _figures.cache.popitem(last=False)
+
+    else:
+        fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(fig)
+
+    axes = list(fig.subplots(1, nplots, squeeze=False)[0])
+    return fig, axes
+
+
+def build_figure(data, cfg, reuse=False):
+    """
+    Builds the final figure using the config and a dictionary of data profiles.
+    Profiles that are not loaded yet are loaded only when they are drawn and
+    released afterwards so only one is held in memory at a time. Pyplot is
+    only used when showing the figure.
 
     Args:
             data: Dictionary of data.profiles object to be plotted
             cfg: dictionary of config options containing at least one profile,
                     output, and labeling sections
-
+            reuse: Reuse the figure of the last render with the same layout,
+                   the figure returned is then cleared by the next render
+    Returns:
+            fig: The matplotlib figure built
     """
     log = get_logger(__name__)
 
     # the size of a single plot
     fsize = np.array(cfg['output']['figure_size'])
-    matplotlib.rcParams['figure.dpi'] = cfg['output']['dpi']
+    dpi = cfg['output']['dpi']
     nplots = len(data.keys())
     fsize[0] = fsize[0] * nplots
 
     # Build (sub)plots
-    fig, axes = plt.subplots(1, nplots, figsize=fsize)
-    if nplots == 1:
-        axes = [axes]
+    if cfg['output']['show_plot']:
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=fsize, dpi=dpi)
+        axes = list(fig.subplots(1, nplots, squeeze=False)[0])
+    else:
+        fig, axes = get_figure(fsize, dpi, nplots, reuse=reuse)
 
     log.info("Generating {} subplots...".format(nplots))
     for name, profile in data.items():
-        ax = axes[profile.plot_id]
-
-        # Plot up the data
-        df = profile.df
-
-        # Add colums
-        c = profile.column_to_plot
-        log.debug("Adding {}.{}".format(name, c))
-        if profile.is_layered_data:
-            plot_data = profile.get_layered_profile()
-        else:
-            plot_data = df
-        plot_data = plot_data.reset_index()
-        ax.plot(plot_data[c], plot_data['depth'], c=profile.line_color, label=c, linewidth=0.1)
-
-        # Fill the plot
-        if profile.fill_solid:
-            log.debug('Applying horizontal fill to {}.{}'
-                      ''.format(name, c))
-            ax.fill_betweenx(plot_data['depth'], plot_data[c],
-                             np.ones_like(df[c].shape) * profile.xlimits[0],
-                             facecolor=profile.fill_color,
-                             interpolate=True)
-        # Add_plot_labels
-        if profile.plot_labels is not None:
-            log.info("Adding {} annotations...".format(len(profile.plot_labels)))
-            add_plot_annotations(ax, df[c], profile.plot_labels)
-
-        # Create a problem layer
-        if profile.problem_layer is not None:
-            depth = profile.problem_layer
-            log.info("Adding a problem layer to plot at {}...".format(depth))
-            ax.axhline(y=depth, color='r')
-
-        # Custom titles
-        if profile.title is not None:
-            ax.set_title(profile.title)
-
-        # X axis label
-        if profile.xlabel is not None:
-            ax.set_xlabel(titlize(profile.xlabel))
-
-        # handle xticks
-        if profile.is_layered_data:
-            ax.set_xticks([profile.scale[ll] for ll in profile.xtick_labels])
-            ax.set_xticklabels(profile.xtick_labels)
-
-        if profile.remove_xticks:
-            ax.set_xticklabels([])
-
-        # Y axis label
-        if profile.ylabel is not None:
-            ax.set_ylabel(titlize(profile.ylabel))
-
-        # Set X limits
-        if profile.xlimits is not None:
-            lims = sorted(profile.xlimits)
-            log.debug("Setting x limits to {}:{}".format(*lims))
-            ax.set_xlim(*lims)
-
-        # Set y limits
-        if profile.ylimits is not None:
-            lims = sorted(profile.ylimits)
-            log.debug("Setting y limits to {}:{}".format(*lims))
-            ax.set_ylim(*lims)
-
-        ax.grid(visible=True)
-        ax.set_axisbelow(True)
+        with stage(name):
+            draw_profile(axes[profile.plot_id], name, profile, cfg)
 
     if cfg['output']['suptitle'] is not None:
-        plt.suptitle(cfg['output']['suptitle'].title())
+        fig.suptitle(cfg['output']['suptitle'].title())
 
     if cfg['output']['filename'] is not None:
         log.info(f"Saving figure to {cfg['output']['filename']}")
-        plt.savefig(join(cfg['output']['output_dir'], cfg['output']['filename']))
+        with stage('savefig'):
+            fig.savefig(join(cfg['output']['output_dir'], cfg['output']['filename']))
 
     if cfg['output']['show_plot']:
         plt.show()
+        plt.close(fig)
+
+    return fig
@@ -0,0 +1,132 @@
+"""
+Native reader of SnowMicroPen .pnt files using only numpy. A pnt file is a
+512 byte big endian header followed by the raw force samples as 16 bit
+integers. Only the header fields needed to plot a profile are read and the
+samples are mapped from the file and scaled straight to mN so no other copy
+of the data is made. Matches snowmicropyn.Profile for the fields it reads.
+
+Header fields used:
+    * samples.spatialres - distance between samples in mm
+    * samples.conv.force - conversion of the raw samples to N
+    * timestamp - year, month, day, hour, minute and second in UTC
+    * gps.wgs84 - latitude and longitude with their hemispheres
+    * samples.force.count - number of force samples
+"""
+import struct
+from datetime import datetime, timezone
+from os.path import getsize
+
+import numpy as np
+import pandas as pd
+
+header_size = 512
+
+# Offset from the start of the file and format for struct.unpack
+_fields = {'spatial_resolution': (6, '>f'),
+           'force_factor': (10, '>f'),
+           'timestamp': (20, '>6h'),
+           'latitude': (264, '>f'),
+           'longitude': (268, '>f'),
+           'north': (280, '>c'),
+           'east': (281, '>c'),
+           'samples_count': (358, '>l')}
+
+
+def get_coordinates(latitude, longitude, north, east):
+    """
+    Signs the WGS 84 coordinates by their hemispheres the way snowmicropyn
+    does, dropping values that were not measured or are invalid
+
+    Returns:
+        coordinates: Tuple of (latitude, longitude) or None
+    """
+    if north.upper() != 'N':
+        latitude = -latitude
+    if east.upper() != 'E':
+        longitude = -longitude
+
+    if latitude == -99999 or abs(latitude) > 90:
+        latitude = None
+    if longitude == -99999 or abs(longitude) > 180:
+        longitude = None
+
+    if latitude and longitude:
+        return latitude, longitude
+    return None
+
+
+def read_header(filename):
+    """
+    Reads only the header of a pnt file
+
+    Args:
+        filename: Path to the pnt file
+    Returns:
+        header: Dictionary of the timestamp, coordinates, samples_count,
+                spatial_resolution in mm and force_factor to N
+    """
+    with open(filename, 'rb') as fp:
+        raw = fp.read(header_size)
+
+    if len(raw) < header_size:
+        raise ValueError(f'{filename} is too short to be a pnt file')
+
+    values = {k: struct.unpack_from(fmt, raw, offset)
+              for k, (offset, fmt) in _fields.items()}
+    values = {k: v[0] if len(v) == 1 else v for k, v in values.items()}
+
+    try:
+        timestamp = datetime(*values['timestamp'], tzinfo=timezone.utc)
+    except ValueError:
+        timestamp = None
+
+    coordinates = get_coordinates(
+        values['latitude'], values['longitude'],
+        values['north'].decode('utf-8', errors='ignore'),
+        values['east'].decode('utf-8', errors='ignore'))
+
+    return {'timestamp': timestamp,
+            'coordinates': coordinates,
+            'samples_count': values['samples_count'],
+            'spatial_resolution': values['spatial_resolution'],
+            'force_factor': values['force_factor']}
+
+
+def read_pnt(filename, header=None):
+    """
+    Reads the force of a pnt file against depth. The samples are mapped from
+    the file and converted to mN in a single pass.
+
+    Args:
+        filename: Path to the pnt file
+        header: Optional header already read with read_header
+    Returns:
+        tuple: **header** - dictionary from read_header,
+               **df** - Pandas dataframe of the force in mN indexed by the
+               depth in cm, increasing from the bottom to the surface at 0
+    """
+    if header is None:
+        header = read_header(filename)
+
+    n = header['samples_count']
+    if n < 0 or getsize(filename) < header_size + 2 * n:
+        raise ValueError(f'{filename} is shorter than the {n} samples in its '
+                         f'header')
+
+    depth = np.arange(n - 1, -1, -1, dtype=np.float64)
+    depth *= -header['spatial_resolution'] / 10
+
+    if n > 0:
+        samples = np.memmap(filename, dtype='>i2', mode='r',
+                            offset=header_size, shape=(n,))
+
+        # Bottom first so the depth increases without sorting
+        force = np.multiply(samples[::-1], 1000 * header['force_factor'],
+                            dtype=np.float64)
+        del samples
+    else:
+        force = np.zeros(0)
+
+    df = pd.DataFrame({'force': force}, index=pd.Index(depth, name='depth'),
+                      copy=False)
+    return header, df
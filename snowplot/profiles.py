@@ -1,27 +1,47 @@
+import csv
+import json
+import re
 from os.path import abspath, basename, expanduser
 
 import numpy as np
 import pandas as pd
 #from PIL import Image
 from numpy import poly1d
-from snowmicropyn import Profile as SMP
-from study_lyte.depth import get_depth_from_acceleration
-from study_lyte.detect import get_acceleration_stop, get_nir_surface, get_acceleration_start
-from study_lyte.io import read_csv
 
+from .depth import depth_from_acceleration
+from .events import EventSidecar
+from .instrument import stage
 from .utilities import get_logger, titlize
 
+# Depth ranges in simple text files e.g. 140-120 or -10--20
+_depth_range = re.compile(r'^\s*(-?[0-9.]+)\s*-\s*(-?[0-9.]+)\s*$')
+
 
 class GenericProfile(object):
     """
     Generic Class for plotting vertical profiles. Is used to standardize a lot
-    of data but can be used independently
+    of data but can be used independently. The data is not opened until it is
+    first used or load is called.
 
     Attributes:
-        filename:
+        filename: Path to the data file
+        df: Processed pandas dataframe, loaded on first access
+        header_info: Dictionary of metadata from the file header, read on
+                     first access without loading the data
     """
+    # Options that change the processed data, used for caching
+    processing_keys = ['column_to_plot', 'smoothing', 'smoothing_depth',
+                       'smoothing_method', 'average_columns']
+    # Attributes derived from the data during open and processing
+    cached_attributes = ['column_to_plot']
 
     def __init__(self, **kwargs):
+        self.cache = None
+        self._df = None
+        self._header_info = None
+
+        # Data derived from df that is kept until df changes
+        self._derived = {}
 
         # Set Tick labels
         self.x_ticks = None
@@ -31,6 +51,9 @@ class GenericProfile(object):
         # Use for density profiles, hand hardness profiles any data with distinguished layers
         self.is_layered_data = False
 
+        # Use for profiles summarizing many others with a shaded range
+        self.is_envelope_data = False
+
         # Add config items as attributes
         for k, v in kwargs.items():
             setattr(self, k, v)
@@ -49,17 +72,96 @@ class GenericProfile(object):
         # Number of lines to ignore in a csv
         self.header = 0
 
-        df = self.open()
-        process_kw = {}
+        # Zero base the plot id
+        self.plot_id -= 1
+
+    @property
+    def df(self):
+        if self._df is None:
+            self.load()
+        return self._df
 
-        for kw in ['smoothing', 'average_columns']:
-            if hasattr(self, kw):
-                process_kw[kw] = getattr(self, kw)
+    @df.setter
+    def df(self, df):
+        # Any new data invalidates data derived from it
+        self._df = df
+        self._derived = {}
 
-        self.df = self.processing(df, **process_kw)
+    @property
+    def is_loaded(self):
+        return self._df is not None
 
-        # Zero base the plot id
-        self.plot_id -= 1
+    @property
+    def header_info(self):
+        if self._header_info is None:
+            self._header_info = self.read_metadata()
+        return self._header_info
+
+    @header_info.setter
+    def header_info(self, header_info):
+        self._header_info = header_info
+
+    def load(self):
+        """
+        Opens and processes the data or retrieves it from the cache when one
+        is used.
+
+        Returns:
+            df: Processed pandas dataframe
+        """
+        df = None
+        if self.cache is not None:
+            # Key before opening since opening can adjust attributes
+            with stage('cache_get'):
+                key = self.cache.get_key(self)
+                df = self.cache.get(key, self)
+
+        if df is None:
+            with stage('open'):
+                df = self.open()
+            process_kw = {}
+
+            for kw in ['smoothing', 'smoothing_depth', 'smoothing_method',
+                       'average_columns']:
+                if hasattr(self, kw):
+                    process_kw[kw] = getattr(self, kw)
+
+            with stage('processing'):
+                df = self.processing(df, **process_kw)
+
+            if self.cache is not None:
+                with stage('cache_put'):
+                    self.cache.put(key, self, df)
+        else:
+            self.set_xlimits(df)
+
+        self.df = df
+        return df
+
+    def get_processing_overrides(self):
+        """
+        Returns:
+            overrides: Dictionary of anything besides the processing keys
+                       that changes the processed data, used for caching
+        """
+        return {}
+
+    def release(self):
+        """
+        Frees the data and anything derived from it. The data is loaded again
+        on the next access.
+        """
+        self.df = None
+
+    def read_metadata(self):
+        """
+        Reads the metadata of the data file without loading the data. Should
+        be overwritten for files with a header.
+
+        Returns:
+            header_info: Dictionary of metadata
+        """
+        return {}
 
     def open(self):
         """
@@ -71,25 +173,25 @@ class GenericProfile(object):
         """
         pass
 
-    def processing(self, df, smoothing=None, average_columns=False):
+    def processing(self, df, smoothing=None, smoothing_depth=None,
+                   smoothing_method='mean', average_columns=False):
         """
         Processing to apply to the dataframe to make it more visually appealing
         Also has a end point for users to define their own processing function
 
         Args:
             df: Pandas dataframe with an index set as the y axis of the plot
-            smoothing: Integer representing the size of the moving window to
-                       average over
+            smoothing: Integer representing the number of samples in a
+                       centered window to smooth over
+            smoothing_depth: Width in cm of a centered window to smooth over,
+                             used instead of smoothing
+            smoothing_method: Method to smooth with, one of mean, median,
+                              savgol or gaussian
             average_columns: Create an average column representing the average
                              of all the columns
         Returns:
             df: Pandas dataframe
         """
-        # Smooth profiles vertically
-        if smoothing is not None:
-            self.log.info('Smoothing with a {} point window'.format(self.smoothing))
-            df = df.rolling(window=smoothing).mean()
-
         # Check for average profile
         if average_columns:
             df['average'] = df.mean(axis=1)
@@ -97,11 +199,69 @@ class GenericProfile(object):
         # Apply user defined additional_processing
         df = self.additional_processing(df)
 
-        if self.xlimits is None and self.column_to_plot is not None:
-            self.xlimits = [df[self.column_to_plot].min(), df[self.column_to_plot].max()]
+        # Smooth profiles vertically, only the columns plotted
+        if smoothing is not None or smoothing_depth is not None:
+            df = self.smooth(df, smoothing=smoothing,
+                             smoothing_depth=smoothing_depth,
+                             method=smoothing_method,
+                             average_columns=average_columns)
+
+        self.set_xlimits(df)
+
+        return df
+
+    def smooth(self, df, smoothing=None, smoothing_depth=None, method='mean',
+               average_columns=False):
+        """
+        Smooths the column to plot and the average column using a centered
+        window. Expects the dataframe to be indexed by depth.
+
+        Args:
+            df: Pandas dataframe indexed by depth
+            smoothing: Number of samples in the window
+            smoothing_depth: Width of the window in cm, used instead of
+                             smoothing
+            method: Method to smooth with, one of mean, median, savgol or
+                    gaussian
+            average_columns: Also smooth the average column
+        Returns:
+            df: Pandas dataframe with the columns smoothed
+        """
+        from .smoothing import smooth_depth, smooth_samples
+
+        columns = [self.column_to_plot]
+        if average_columns and 'average' in df.columns:
+            columns.append('average')
+
+        for c in dict.fromkeys(columns):
+            if smoothing_depth is not None:
+                self.log.info(f'Smoothing {c} with a {smoothing_depth} cm '
+                              f'{method} window')
+                df[c] = smooth_depth(df.index.values, df[c].values,
+                                     smoothing_depth, method=method)
+            else:
+                self.log.info(f'Smoothing {c} with a {smoothing} point '
+                              f'{method} window')
+                values = df[c].values
+                valid = np.isfinite(values)
+                smoothed = np.full(len(values), np.nan)
+                smoothed[valid] = smooth_samples(values[valid], smoothing,
+                                                 method=method)
+                df[c] = smoothed
 
         return df
 
+    def set_xlimits(self, df):
+        """
+        Use the range of the data for the x limits if the user didn't
+        provide any
+
+        Args:
+            df: Processed pandas dataframe
+        """
+        if self.xlimits is None and self.column_to_plot is not None:
+            self.xlimits = [df[self.column_to_plot].min(), df[self.column_to_plot].max()]
+
     def additional_processing(self, df):
         """
         Abstract Processing function to redefine for individual datatypes. Automatically
@@ -124,27 +284,91 @@ class LyteProbeProfile(GenericProfile):
     or through the commandline using radicl.
 
     """
+    processing_keys = GenericProfile.processing_keys + [
+        'depth_method', 'autocrop', 'surface_depth', 'bottom_depth',
+        'assumed_depth', 'calibration_coefficients', 'dtype']
+    cached_attributes = GenericProfile.cached_attributes + ['data_type',
+                                                            'header_info']
+    # Columns used in processing besides the column to plot
+    _processing_columns = ['depth', 'time', 'acceleration', 'Y-Axis',
+                           'Sensor2', 'Sensor3']
 
     def __init__(self, **kwargs):
+        self.dtype = 'float64'
+        self.event_sidecar = False
         super(LyteProbeProfile, self).__init__(**kwargs)
 
+    @staticmethod
+    def read_header(filename):
+        """
+        Reads the key=value header of a Lyte probe csv and the column names
+        without reading any data.
+
+        Args:
+            filename: Path to a Lyte probe csv
+        Returns:
+            tuple:
+                **header_info** - dictionary of the header
+                **header_position** - line number of the column names
+                **columns** - list of column names
+        """
+        header_info = {}
+        header_position = 0
+        columns = []
+
+        with open(filename) as fp:
+            for i, line in enumerate(fp):
+                if '=' in line:
+                    k, v = line.split('=', 1)
+                    header_info[k.strip().strip('"')] = v.strip().strip('"')
+                else:
+                    header_position = i
+                    columns = next(csv.reader([line.rstrip('\n')]))
+                    break
+
+        return header_info, header_position, columns
+
+    def read_metadata(self):
+        """
+        Reads the key=value header without loading any data
+        """
+        return self.read_header(self.filename)[0]
+
     def open(self):
         """
-        Lyte probe specific profile opening function attempts to open it as if
-        it was from the app, if it fails tries again assuming it is from
-        radicl
+        Lyte probe specific profile opening function. Reads the header to
+        determine if the file is from the app or radicl then reads only the
+        columns needed for processing, optionally at a reduced precision to
+        limit memory.
         """
         self.log.info("Opening filename {}".format(basename(self.filename)))
 
         # Collect the header
-        self.header_info = {}
-        df, self.header_info = read_csv(self.filename)
+        self.header_info, header_position, columns = self.read_header(self.filename)
 
         # Config lower cases everything so letsd find a matching name
-        columns = list(df.columns)
-        idx = [c.lower() for c in columns].index(self.column_to_plot.lower())
+        names = [c.strip().lower() for c in columns]
+        idx = names.index(self.column_to_plot.lower())
         self.column_to_plot = columns[idx]
-        df[self.column_to_plot] = df[self.column_to_plot].astype(float)
+
+        # Averaging needs every column otherwise only read what is used
+        if getattr(self, 'average_columns', False):
+            usecols = None
+            dtype = None
+        else:
+            usecols = [c for c in columns if c == self.column_to_plot or
+                       c.strip() in self._processing_columns]
+            # Keep time at full precision for integrating acceleration
+            dtype = {c: self.dtype for c in usecols if c.strip() != 'time'}
+
+        df = pd.read_csv(self.filename, header=header_position,
+                         usecols=usecols, dtype=dtype)
+
+        # Drop any columns written with the plain index
+        df = df.drop(columns=df.filter(regex="Unname").columns)
+        df = df.rename(columns={c: c.strip() for c in df.columns})
+        self.column_to_plot = self.column_to_plot.strip()
+        df[self.column_to_plot] = df[self.column_to_plot].astype(self.dtype)
 
         if 'radicl VERSION' in self.header_info.keys():
             self.data_type = 'radicl'
@@ -153,6 +377,62 @@ class LyteProbeProfile(GenericProfile):
 
         return df
 
+    def get_processing_overrides(self):
+        """
+        Events set by hand change the cropping so are part of the cache key
+        """
+        if self.event_sidecar:
+            return {'events': EventSidecar(self.filename).get_manual()}
+        return {}
+
+    def get_events(self, df, acol):
+        """
+        Detects the start and stop of the motion and the snow surface. Events
+        are reused from the sidecar file when it is used and any set by hand
+        in it replace the detected ones.
+
+        Args:
+            df: Pandas dataframe of the capture
+            acol: Name of the acceleration column
+        Returns:
+            events: Dictionary of the start, stop and surface indices
+        """
+        parameters = {'n_points_for_basis': int(0.01 * len(df.index)),
+                      'start_threshold': 0.1,
+                      'stop_threshold': 0.7,
+                      'surface_threshold': 0.02}
+
+        sidecar = EventSidecar(self.filename) if self.event_sidecar else None
+        if sidecar is not None:
+            events = sidecar.get(parameters)
+            if events is not None:
+                self.log.info('Using events stored in {}'.format(
+                    basename(sidecar.path)))
+                return events
+
+        from study_lyte.detect import (get_acceleration_start,
+                                       get_acceleration_stop, get_nir_surface)
+
+        n_basis = parameters['n_points_for_basis']
+        with stage('detect_events'):
+            start = get_acceleration_start(
+                df[acol].values, n_points_for_basis=n_basis,
+                threshold=parameters['start_threshold'])
+            stop = get_acceleration_stop(
+                df[acol].values, n_points_for_basis=n_basis,
+                threshold=parameters['stop_threshold'])
+            surface = get_nir_surface(
+                df['Sensor2'].iloc[start:stop], df['Sensor3'].iloc[start:stop],
+                threshold=parameters['surface_threshold'])
+
+        events = {'start': int(start), 'stop': int(stop),
+                  'surface': int(surface + start)}
+
+        if sidecar is not None:
+            sidecar.put(events, parameters)
+            events.update(sidecar.get_manual())
+        return events
+
     def additional_processing(self, df):
         """
         Handles when to convert to cm
@@ -162,6 +442,7 @@ class LyteProbeProfile(GenericProfile):
                                       len(df.index))
 
         if self.data_type == 'radicl':
+
             if 'acceleration' in df.columns:
                 acol = 'acceleration'
             elif 'Y-Axis' in df.columns:
@@ -171,32 +452,37 @@ class LyteProbeProfile(GenericProfile):
             if 'time' not in df.columns:
                 df['time'] = np.linspace(0, len(df.index) * 16000, len(df.index))
             # Detect our events
-            n_basis = int(0.01 * len(df.index))
-            if acol is not None:
-                start = get_acceleration_start(df[acol].values, n_points_for_basis=n_basis, threshold=0.1)
-                stop = get_acceleration_stop(df[acol].values, n_points_for_basis=n_basis, threshold=0.7)
-                surface = get_nir_surface(df['Sensor2'].iloc[start:stop], df['Sensor3'].iloc[start:stop], threshold=0.02)
-                surface = surface + start
-            else:
-                surface = 0
+            if self.autocrop:
+                if acol is None:
+                    raise ValueError(f'Autocropping requires an acceleration '
+                                     f'or Y-Axis column in {self.filename}')
+                events = self.get_events(df, acol)
 
             if self.depth_method in ['acc', 'avg']:
+                if acol is None:
+                    raise ValueError(f'Depth method {self.depth_method} '
+                                     f'requires an acceleration or Y-Axis '
+                                     f'column in {self.filename}')
+
                 self.log.info('Calculating Depth from accelerometer...')
-                acc_depth = get_depth_from_acceleration(df)
-                acc_depth['time'] = df.index
-                acc_depth.set_index('time', inplace=True)
+                with stage('depth_from_acceleration'):
+                    acc_depth = depth_from_acceleration(df['time'].values,
+                                                        df[acol].values,
+                                                        dtype=self.dtype)
+                    acc_depth *= -100
 
-                df['acc_depth'] = acc_depth[acol].mul(-100)
+                df['acc_depth'] = acc_depth
                 if self.depth_method == 'acc':
-                    df['depth'] = df['acc_depth'].copy()
+                    df['depth'] = acc_depth
 
                 elif self.depth_method == 'avg':
-                    df['acc_depth'] = df[['depth', 'acc_depth']].mean(axis=0)
+                    df['depth'] = (df['depth'].values + acc_depth) / 2
 
             if self.column_to_plot == 'sensor1':
                 df['depth'] = df['depth'] - 4.5
-            surface_depth = df['depth'].iloc[surface]
             if self.autocrop:
+                surface, stop = events['surface'], events['stop']
+                surface_depth = df['depth'].iloc[surface]
                 bottom_depth = df['depth'].iloc[stop]
                 df = df.iloc[surface:stop]
                 self.log.info(f'Using autocropping methods, cropping data to {surface_depth:0.0f} cm to '
@@ -240,37 +526,120 @@ class LyteProbeProfile(GenericProfile):
 class SnowMicroPenProfile(GenericProfile):
     """
     A simple class reflection of the python package snowmicropyn class for
-    smp measurements
+    smp measurements. Files are read natively unless the reader is
+    snowmicropyn or the native reader fails. The force can be reduced to
+    statistics in depth bins, plotting the median of each bin.
     """
+    processing_keys = GenericProfile.processing_keys + ['reader', 'bin_size',
+                                                        'texture_window']
+    cached_attributes = GenericProfile.cached_attributes + ['header_info']
 
     def __init__(self, **kwargs):
+        self.reader = 'native'
+        self.bin_size = None
+        self.texture_window = None
+        self.chunk_size = None
+        self.fill_range = False
         super(SnowMicroPenProfile, self).__init__(**kwargs)
         self.column_to_plot = 'force'
 
+        if self.bin_size is not None:
+            self.column_to_plot = 'median'
+
+            # Shade the range of each bin instead of filling to the axis
+            if self.fill_range:
+                self.is_envelope_data = True
+                self.envelope_columns = ('min', 'max')
+                self.fill_solid = False
+
+        elif self.fill_range:
+            self.log.warning('fill_range requires bin_size, ignoring it')
+
+    def read_metadata(self):
+        """
+        Reads the timestamp and coordinates of the profile
+        """
+        if self.reader == 'native':
+            from .pnt import read_header
+            try:
+                header = read_header(self.filename)
+                return {'timestamp': header['timestamp'],
+                        'coordinates': header['coordinates']}
+
+            except ValueError as e:
+                self.log.warning(f'Unable to read the header natively, {e}. '
+                                 f'Using snowmicropyn')
+
+        from snowmicropyn import Profile as SMP
+        p = SMP.load(self.filename)
+        return {'timestamp': p.timestamp, 'coordinates': p.coordinates}
+
     def open(self):
         self.log.info("Opening filename {}".format(basename(self.filename)))
-        p = SMP.load(self.filename)
-        ts = p.timestamp
-        t_str = ts.strftime('%H:%M:%S')
-        self.log.info(f"Profile was recorded at {t_str} {ts.tzinfo}")
-        coords = p.coordinates
-        df = p.samples
+        df = None
+
+        if self.reader == 'native':
+            from .pnt import read_pnt
+            try:
+                header, df = read_pnt(self.filename)
+                self.header_info = {'timestamp': header['timestamp'],
+                                    'coordinates': header['coordinates']}
+
+            except ValueError as e:
+                self.log.warning(f'Unable to read the file natively, {e}. '
+                                 f'Using snowmicropyn')
+
+        if df is None:
+            from snowmicropyn import Profile as SMP
+            p = SMP.load(self.filename)
+            self.header_info = {'timestamp': p.timestamp,
+                                'coordinates': p.coordinates}
+            df = p.samples
+
+        ts = self.header_info['timestamp']
+        if ts is not None:
+            t_str = ts.strftime('%H:%M:%S')
+            self.log.info(f"Profile was recorded at {t_str} {ts.tzinfo}")
         return df
 
     def additional_processing(self, df):
-        # Convert into CM from MM and set 0 at the start
-        self.log.info('Converting `distance` to cm and setting top to 0...')
-        df['depth'] = df['distance'].div(-10)
-        df = df.set_index('depth')
-        df = df.sort_index()
-        self.log.info('Converting N into mN...')
-        df['force'] = df['force'].mul(1000)  # Put into millinewtons
+        # Native reads are already in cm and mN with depth increasing
+        if 'distance' in df.columns:
+            # Convert into CM from MM and set 0 at the start
+            self.log.info('Converting `distance` to cm and setting top to 0...')
+            df['depth'] = df['distance'].div(-10)
+            df = df.set_index('depth')
+            self.log.info('Converting N into mN...')
+            df['force'] = df['force'].mul(1000)  # Put into millinewtons
+
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+
+        if self.bin_size is not None:
+            from .binning import bin_statistics
+            self.log.info(f'Reducing {len(df.index)} samples to '
+                          f'{self.bin_size} cm bins...')
+            df = bin_statistics(df.index.values, df['force'].values,
+                                self.bin_size, chunk_size=self.chunk_size,
+                                texture_window=self.texture_window)
         return df
 
+    def set_xlimits(self, df):
+        """
+        Use the range of the shaded min and max for the x limits when the
+        range is filled and the user didn't provide any
+        """
+        if self.xlimits is None and self.is_envelope_data:
+            lower, upper = self.envelope_columns
+            self.xlimits = [df[lower].min(), df[upper].max()]
+        else:
+            super(SnowMicroPenProfile, self).set_xlimits(df)
+
 
 class LayeredProfile(GenericProfile):
     _text_scale = []  # Define for each class
     _snowex_column = None
+    cached_attributes = GenericProfile.cached_attributes + ['header_info']
 
     def __init__(self, **kwargs):
         super(LayeredProfile, self).__init__(**kwargs)
@@ -297,6 +666,14 @@ class LayeredProfile(GenericProfile):
 
         return df
 
+    @classmethod
+    def get_xtick_labels(cls):
+        """
+        Returns:
+            labels: List of the text values to label the x axis with
+        """
+        return list(cls._text_scale)
+
     @property
     def scale(self):
         """
@@ -311,81 +688,149 @@ class LayeredProfile(GenericProfile):
     def get_layered_profile(self):
         """
         Returns a profile with added zeros in the x to create the appearance of
-        outlined layers
+        outlined layers. Each layer is bounded by a zero at its top and bottom
+        depth. The result is kept until the profile data changes.
 
         Returns:
+            final: pandas dataframe with depth, the plotted column and the
+                   layer number
+        """
+        if 'layered_profile' not in self._derived.keys():
+            with stage('layered_profile'):
+                self._derived['layered_profile'] = self.build_layered_profile()
+        return self._derived['layered_profile']
+
+    def build_layered_profile(self):
+        """
+        Builds the outlined layer profile in a single vectorized pass ordered
+        by the first appearance of each layer.
+
+        Returns:
+            final: pandas dataframe with depth, the plotted column and the
+                   layer number
         """
         temp = self.df.reset_index()
-        final = pd.DataFrame()
-        depth = []
-        data = []
-        layers = []
-        index = []
-        d = {}
-        for i, layer in enumerate(temp['layer_number'].unique()):
-            layer_data = temp[temp['layer_number'] == layer]
-            # Create the top zero layer
-            index.append(i * 4)
-            depth.append(layer_data['depth'].max())
-            data.append(0)
-            layers.append(layer)
-
-            # Add the data
-            values = list(layer_data[self.column_to_plot].values)
-            n = len(values)
-            index += [idx + (i * 4 + 1) for idx in range(n)]
-            depth += list(layer_data['depth'].values)
-            data += values
-            layers += [layer] * n
-
-            # Add a final zero layer
-            index.append(index[-1] + 1)
-            depth.append(layer_data['depth'].min())
-            data.append(0)
-            layers.append(layer)
-
-        # Wrap it up
-        d['index'] = index
-        d[self.column_to_plot] = data
-        d['depth'] = depth
-        d['layer_number'] = layers
-        final = pd.DataFrame.from_dict(d).set_index('index')
+
+        # Sort the rows into layers while keeping their order within a layer
+        codes, layers = pd.factorize(temp['layer_number'])
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        depth = temp['depth'].values[order]
+        values = temp[self.column_to_plot].values[order]
+
+        counts = np.bincount(codes, minlength=len(layers))
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        n = len(codes) + 2 * len(layers)
+
+        # Each layer gets a zero before and after its data
+        data_idx = np.arange(len(codes)) + 1 + 2 * codes
+        top_idx = starts + 2 * np.arange(len(layers))
+        bottom_idx = top_idx + counts + 1
+
+        final_depth = np.zeros(n, dtype=float)
+        final_depth[data_idx] = depth
+        final_depth[top_idx] = np.maximum.reduceat(depth, starts)
+        final_depth[bottom_idx] = np.minimum.reduceat(depth, starts)
+
+        final_data = np.zeros(n, dtype=values.dtype)
+        final_data[data_idx] = values
+
+        final_layers = np.repeat(layers.values, counts + 2)
+
+        final = pd.DataFrame({self.column_to_plot: final_data,
+                              'depth': final_depth,
+                              'layer_number': final_layers})
+        final.index.name = 'index'
         return final
 
     def read_simple_text(self, filename):
         pass
 
+    def read_metadata(self):
+        """
+        Reads the commented header of SnowEx csvs. Simple text files have no
+        metadata.
+        """
+        header_info = {}
+        if self.filename.split('.')[-1] == 'csv':
+            with open(self.filename, 'r') as fp:
+                header_info, columns = self.read_snowex_header(fp)
+        return header_info
+
+    @staticmethod
+    def read_snowex_header(fp):
+        """
+        Reads the commented header of a SnowEx csv line by line and leaves the
+        file positioned at the first line of data.
+
+        Args:
+            fp: Open file object of a SnowEx csv
+        Returns:
+            tuple:
+                **header_info** - dictionary of # key,value header entries
+                **columns** - list of column names from the last commented
+                line or None if there is no header
+        """
+        header_info = {}
+        columns = None
+
+        pos = fp.tell()
+        line = fp.readline()
+        while line.startswith('#'):
+            columns = [c.strip() for c in line.lstrip('#').strip().split(',')]
+            if len(columns) == 2:
+                header_info[columns[0]] = columns[1]
+            pos = fp.tell()
+            line = fp.readline()
+
+        fp.seek(pos)
+        return header_info, columns
+
     def read_snowex_csv(self, filename):
         """
-        Read in a csv from snowex campaign
+        Read in a csv from snowex campaign. The commented header and the data
+        are read in a single pass over the file. Header entries in the form
+        of # key,value are stored in header_info.
+
         Args:
             filename: Path to a csv containing stratigraphy data
         Returns:
             df: pandas dataframe
         """
         with open(filename, 'r') as fp:
-            for i, line in enumerate(fp):
-                if line[0] != '#':
-                    break
+            # Read the header then hand the rest of the file to pandas
+            self.header_info, columns = self.read_snowex_header(fp)
 
-        df = pd.read_csv(filename, header=i - 1)
+            if columns is None:
+                raise ValueError(f'No commented header found in {basename(filename)}')
+
+            df = pd.read_csv(fp, header=None, names=columns)
+
+        top, bottom = 'Top (cm)', 'Bottom (cm)'
 
         # Add in the important information for plotting
-        df['layer_number'] = range(0, len(df.index))
-        df['numeric'] = df.apply(lambda row: self.scale[row[self._snowex_column]], axis=1)
+        df['layer_number'] = np.arange(len(df.index))
+        text = df[self._snowex_column].astype(str).str.strip()
+        df['numeric'] = text.map(self.scale)
+
+        # Report values that are not on the scale, missing values are allowed
+        unknown = df['numeric'].isnull() & df[self._snowex_column].notnull()
+        if unknown.any():
+            values = ', '.join(sorted(text[unknown].unique()))
+            raise ValueError(f'Unrecognized {self._snowex_column} values in '
+                             f'{basename(filename)}: {values}')
 
-        # Copy the info for top and botom depths and then merge back together
-        df_bottom = df.copy().rename(mapper={'Bottom (cm)': 'depth'}, axis=1).drop(columns=['# Top (cm)'])
-        df_top = df.rename(mapper={'# Top (cm)': 'depth'}, axis=1).drop(columns=['Bottom (cm)'])
         # Check for positive depth
-        mn = min(df_top['depth'])
-        mx = max(df_top['depth'])
+        mn = df[top].min()
+        mx = df[top].max()
         if mx > 0 and mn >= 0:
             self.log.debug('Positive snow height, inverting to negative')
-            depth = [d - mx for d in df_top['depth']]
-            df_top['depth'] = df_top['depth'] = depth
-            df_bottom['depth'] = [d - mx for d in df_bottom['depth']]
+            df[top] = df[top] - mx
+            df[bottom] = df[bottom] - mx
 
+        # Stack the top and bottom depths of each layer
+        df_top = df.drop(columns=[bottom]).rename(columns={top: 'depth'})
+        df_bottom = df.drop(columns=[top]).rename(columns={bottom: 'depth'})
         df = pd.concat([df_top, df_bottom]).set_index('depth')
 
         return df
@@ -404,7 +849,11 @@ class HandHardnessProfile(LayeredProfile):
     _snowex_column = 'Hand Hardness'
     def __init__(self, **kwargs):
         super(HandHardnessProfile, self).__init__(**kwargs)
-        self.xtick_labels = [ch for ch in self._text_scale if ch.isalnum()]
+        self.xtick_labels = self.get_xtick_labels()
+
+    @classmethod
+    def get_xtick_labels(cls):
+        return [ch for ch in cls._text_scale if ch.isalnum()]
 
     def read_snowpilot(self, filename=None, url=None):
         pass
@@ -412,69 +861,94 @@ class HandHardnessProfile(LayeredProfile):
     def read_simple_text(self, filename):
         """
         Reads in a text file containing only hardness information
-        Format is in depth1-depth2:hardness_value
+        Format is in depth1-depth2 = hardness_value or
+        depth1-depth2 = hardness_value1, hardness_value2 for a layer that
+        changes hardness. Values are gathered into columns in a single pass
+        so the time to read scales linearly with the number of layers.
+
         Args:
-            filename: path to the text file
+            filename: path to the text file, an open file object or a list of
+                      lines
         Returns:
             df: pandas dataframe
         """
         depth = []
         hardness = []
         layer_number = []
-        # open text file
-        with open(filename, 'r') as fp:
-            lines = fp.readlines()
-            fp.close()
+        line_number = []
+        errors = []
+
+        # Accept paths, open streams and lists of lines
+        if isinstance(filename, str):
+            with open(filename, 'r') as fp:
+                lines = fp.readlines()
+        else:
+            lines = filename
 
         for i, line in enumerate(lines):
 
             # Parse a line entry
-            if '=' in line:
-                data = line.split('=')
-
-                if len(data) == 2:
-                    depth_range = data[0]
-                    hardness_range = data[1]
-
-                else:
-                    raise ValueError(f"Only one '=' can be used to represent "
-                                     f"hand hardness in text file. "
-                                     f"On line #{i}.")
-                # parse depth range
-                if '-' in depth_range:
-                    d = depth_range.split('-')
-                    for dv in d:
-                        depth.append(float(dv.strip()))
-
-                # parse hardness scale when a range
-                if ',' in hardness_range:
-                    hv = hardness_range.split(',')
-
-                # Single hardness value but represents two spots
-                else:
-                    hv = [hardness_range, hardness_range]
-
-                # Parse the values and map them
-                for h in hv:
-                    hardness.append(h.upper().strip())
-                    layer_number.append(i)
-
-        df = pd.DataFrame()
+            if '=' not in line:
+                continue
+
+            data = line.split('=')
+            if len(data) != 2:
+                errors.append((i + 1, "Only one '=' can be used to represent "
+                                      "hand hardness."))
+                continue
+
+            depth_range, hardness_range = data
+
+            # parse depth range
+            match = _depth_range.match(depth_range)
+            if match is None:
+                errors.append((i + 1, f"Depth range must be in the form of "
+                                      f"depth1-depth2, not "
+                                      f"'{depth_range.strip()}'."))
+                continue
+
+            # parse hardness scale when a range
+            hv = [h.upper().strip() for h in hardness_range.split(',')]
+
+            # Single hardness value but represents two spots
+            if len(hv) == 1:
+                hv = hv * 2
+
+            elif len(hv) != 2:
+                errors.append((i + 1, "Hardness can only be a single value or a "
+                                      "pair of values."))
+                continue
+
+            depth += [float(match.group(1)), float(match.group(2))]
+            hardness += hv
+            layer_number += [i, i]
+            line_number += [i + 1, i + 1]
+
+        df = pd.DataFrame({'depth': np.array(depth, dtype=float),
+                           'hardness': hardness,
+                           'numeric': pd.Series(hardness, dtype=object).map(self.scale),
+                           'layer_number': np.array(layer_number, dtype=int)})
+
+        # Report any hardness values not on the scale
+        unknown = df['numeric'].isnull().values
+        for i in np.flatnonzero(unknown):
+            errors.append((line_number[i], f"Unrecognized hand hardness "
+                                           f"'{hardness[i]}'."))
+
+        if errors:
+            msg = '\n'.join([f'Line #{n}: {e}' for n, e in sorted(set(errors))])
+            raise ValueError(f'Unable to parse hand hardness file:\n{msg}')
+
+        if len(df.index) == 0:
+            raise ValueError('No hand hardness layers found.')
 
         # Check for positive depth
-        mn = min(depth)
-        mx = max(depth)
+        mn = df['depth'].min()
+        mx = df['depth'].max()
         if mx > 0 and mn >= 0:
             self.log.debug('Positive snow height, inverting to negative')
-            depth = [d - mx for d in depth]
+            df['depth'] = df['depth'] - mx
 
-        for d, h, l in zip(depth, hardness, layer_number):
-            data = {'depth': d, 'hardness': h, 'numeric': self.scale[h], 'layer_number': l}
-            df = df.append(data, ignore_index=True)
-
-        # Cap the data so it looks good
-        # data = {'depth': min(depth), 'hardness': '-', 'numeric': 0}
-        df = df.append(data, ignore_index=True)
         return df
 
 
@@ -484,7 +958,173 @@ class GrainSizeProfile(LayeredProfile):
     def __init__(self, **kwargs):
         super(GrainSizeProfile, self).__init__(**kwargs)
         self._scale = None
-        self.xtick_labels = self._text_scale
+        self.xtick_labels = self.get_xtick_labels()
+
+
+class DatasetProfile(LayeredProfile):
+    """
+    Plots a profile from a dataset written by snowplot export. The data is
+    already processed so only smoothing is applied. Layered profiles are
+    drawn as layers with the labels of their original type.
+    """
+    processing_keys = GenericProfile.processing_keys + ['profile_id']
+    cached_attributes = LayeredProfile.cached_attributes + [
+        'is_layered_data', 'fill_solid', 'xtick_labels', '_text_scale']
+
+    def __init__(self, **kwargs):
+        self.profile_id = None
+        fill_solid = kwargs.get('fill_solid', False)
+        super(DatasetProfile, self).__init__(**kwargs)
+
+        # Set from the dataset when opened
+        self.is_layered_data = False
+        self.fill_solid = fill_solid
+        self.column_to_plot = None
+
+        # Datasets are directories of processed data so never cached
+        self.cache = None
+
+    def read_metadata(self):
+        """
+        Reads the header of the original data file stored in the dataset
+        """
+        from .export import read_profile
+        df = read_profile(self.filename, self.profile_id, columns=['header'])
+        return json.loads(df['header'].iloc[0])
+
+    def open(self):
+        from .export import read_profile
+
+        self.log.info(f"Opening profile {self.profile_id} from "
+                      f"{basename(self.filename)}")
+        df = read_profile(self.filename, self.profile_id)
+
+        profile_type = df['profile_type'].iloc[0]
+        self.header_info = json.loads(df['header'].iloc[0])
+        self.column_to_plot = df['column'].iloc[0]
+
+        result = pd.DataFrame({self.column_to_plot: df['value'].values},
+                              index=pd.Index(df['depth'].values, name='depth'))
+
+        cls = globals().get(f'{profile_type}Profile')
+        if cls is not None and issubclass(cls, LayeredProfile):
+            self.is_layered_data = True
+            self.fill_solid = True
+            self._text_scale = cls._text_scale
+            self._scale = None
+            self.xtick_labels = cls.get_xtick_labels()
+            result['layer_number'] = df['layer_number'].values.astype(int)
+
+        return result
+
+
+class EnvelopeProfile(GenericProfile):
+    """
+    Plots the median and a shaded range of quantiles against depth of many
+    profiles. Each profile is processed as the data section of a template
+    config and streamed one at a time into running statistics so any number
+    of profiles can be summarized in fixed memory.
+    """
+    processing_keys = GenericProfile.processing_keys + [
+        'profiles', 'section', 'spacing', 'quantiles', 'n_value_bins']
+    cached_attributes = GenericProfile.cached_attributes + [
+        'envelope_columns', 'n_profiles']
+
+    def __init__(self, **kwargs):
+        self.profiles = []
+        self.section = None
+        self.spacing = 1.0
+        self.quantiles = [0.1, 0.5, 0.9]
+        self.n_value_bins = 512
+        super(EnvelopeProfile, self).__init__(**kwargs)
+        self.is_envelope_data = True
+        self.envelope_columns = None
+        self.n_profiles = 0
+
+        # Only the profiles summarized are cached so adding one to the list
+        # doesn't reprocess the rest
+        self.profile_cache = self.cache
+        self.cache = None
+
+    def get_profiles(self):
+        """
+        Builds a profile for each file using the data section of the template
+        config
+
+        Returns:
+            profiles: Generator of profile objects, not loaded
+        """
+        from inicheck.tools import get_checkers
+
+        import snowplot
+        from .batch import expand_paths
+        from .figure import read_user_config
+
+        ucfg, errors = read_user_config(self.filename)
+        if len(errors) > 0:
+            raise ValueError(f'Errors in the template {self.filename}. Check '
+                             f'report above.')
+
+        sections = [s for s in ucfg.cfg.keys()
+                    if s not in snowplot.__non_data_sections__]
+        section = self.section or (sections[0] if sections else None)
+        if section not in sections:
+            raise ValueError(f'No data section {section} in the template '
+                             f'{self.filename}')
+
+        classes = get_checkers(module='snowplot.profiles', keywords='profile')
+        cls = classes[section.replace('_', '').lower()]
+        cfg = dict(ucfg.cfg[section])
+
+        for filename in expand_paths(self.profiles):
+            # Directories can hold the event sidecars of the profiles
+            if filename.endswith(EventSidecar.ext):
+                continue
+            cfg['filename'] = filename
+            yield cls(cache=self.profile_cache, **cfg)
+
+    def open(self):
+        from .envelope import DepthEnvelope
+
+        envelope = DepthEnvelope(spacing=self.spacing,
+                                 n_value_bins=self.n_value_bins)
+        for profile in self.get_profiles():
+            try:
+                envelope.add_profile(profile)
+            except Exception as e:
+                self.log.warning(f'Skipping {basename(profile.filename)}, '
+                                 f'{e}')
+
+        self.n_profiles = envelope.n_profiles
+        if self.n_profiles == 0:
+            raise ValueError(f'No profiles found to summarize in '
+                             f'{", ".join(self.profiles)}')
+        self.log.info(f'Summarized {self.n_profiles} profiles')
+
+        # Name quantile columns by percentile, e.g. p10 p50 p90
+        quantiles = sorted(self.quantiles)
+        columns = [f'p{100 * q:g}' for q in quantiles]
+        df = pd.DataFrame(dict(zip(columns, envelope.quantile(quantiles))),
+                          index=pd.Index(envelope.grid, name='depth'))
+
+        empty = envelope.count == 0
+        df['mean'] = np.where(empty, np.nan, envelope.mean)
+        df['std'] = np.sqrt(envelope.variance)
+        df['count'] = envelope.count
+
+        self.column_to_plot = columns[len(columns) // 2]
+        self.envelope_columns = (columns[0], columns[-1])
+        return df
+
+    def set_xlimits(self, df):
+        """
+        Use the range of the shaded quantiles for the x limits if the user
+        didn't provide any
+        """
+        if self.xlimits is None and self.envelope_columns is not None:
+            lower, upper = self.envelope_columns
+            self.xlimits = [df[lower].min(), df[upper].max()]
+
 
 class NIRPhotoProfile(GenericProfile):
     """
@@ -0,0 +1,141 @@
+"""
+Resampling of processed profiles onto a shared depth grid so many profiles
+can be compared or averaged as a single 2-D array of profiles x depth.
+Grids start at the snow surface and step down at a fixed spacing so the grid
+of a shallow profile is the start of the grid of a deeper one.
+
+Methods:
+    * interp - linear interpolation between the samples, suits dense data
+    * mean - average of the samples within half a spacing of each depth,
+      suits data much denser than the grid
+
+Example:
+    grid, data = resample_profiles(profiles, spacing=0.5)
+    mean_profile = np.nanmean(data, axis=0)
+"""
+import numpy as np
+
+from .instrument import stage
+
+methods = ['interp', 'mean']
+
+
+def make_grid(spacing, bottom, top=0.0):
+    """
+    Builds depths starting at the top and stepping down to the bottom
+
+    Args:
+        spacing: Distance between depths in cm
+        bottom: Deepest depth in cm, negative below the surface
+        top: Depth of the top of the grid in cm, usually the surface
+    Returns:
+        grid: numpy array of decreasing depths
+    """
+    if spacing <= 0:
+        raise ValueError(f'Grid spacing must be positive, not {spacing}')
+
+    n = int(np.floor((top - bottom) / spacing + 1e-9)) + 1
+    return top - np.arange(max(n, 0)) * spacing
+
+
+def resample(depth, values, grid, method='interp'):
+    """
+    Projects values at any depths onto the grid. Depths outside the samples
+    or cells without samples are NaN.
+
+    Args:
+        depth: numpy array of the depth of each value
+        values: numpy array of the values to resample
+        grid: numpy array of evenly spaced decreasing depths from make_grid
+        method: Name of the resampling method, one of methods
+    Returns:
+        resampled: numpy array the same length as grid
+    """
+    if method not in methods:
+        raise ValueError(f'Unknown resampling method {method}, use one of '
+                         f'{", ".join(methods)}')
+
+    depth = np.asarray(depth, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    resampled = np.full(len(grid), np.nan)
+
+    valid = np.isfinite(depth) & np.isfinite(values)
+    if not valid.any() or len(grid) == 0:
+        return resampled
+    depth = depth[valid]
+    values = values[valid]
+
+    if method == 'interp':
+        order = np.argsort(depth, kind='stable')
+        resampled[:] = np.interp(grid, depth[order], values[order],
+                                 left=np.nan, right=np.nan)
+
+    else:
+        spacing = grid[0] - grid[1] if len(grid) > 1 else 1.0
+        cell = np.floor((grid[0] - depth) / spacing + 0.5).astype(np.int64)
+        inside = (cell >= 0) & (cell < len(grid))
+        cell = cell[inside]
+
+        counts = np.bincount(cell, minlength=len(grid))
+        sums = np.bincount(cell, weights=values[inside], minlength=len(grid))
+        filled = counts > 0
+        resampled[filled] = sums[filled] / counts[filled]
+
+    return resampled
+
+
+def resample_profiles(profiles, spacing=1.0, bottom=None, top=0.0,
+                      method='interp', column=None, dtype='float64'):
+    """
+    Resamples many profiles onto one grid. Profiles that are not loaded yet
+    are loaded and released one at a time so only the result is kept.
+
+    Args:
+        profiles: List of profile objects
+        spacing: Distance between depths in cm
+        bottom: Deepest depth of the grid in cm, defaults to the deepest
+                sample of any profile
+        top: Depth of the top of the grid in cm, usually the surface
+        method: Name of the resampling method, one of methods
+        column: Column to resample, defaults to each profile's column_to_plot
+        dtype: Precision of the array returned
+    Returns:
+        tuple: **grid** - numpy array of the depths,
+               **data** - numpy array of profiles x depth, NaN where a
+               profile has no data
+    """
+    rows = []
+    n = 0
+    if bottom is not None:
+        n = len(make_grid(spacing, bottom, top=top))
+
+    for profile in profiles:
+        was_loaded = profile.is_loaded
+        df = profile.df
+        c = column or profile.column_to_plot
+        depth = df.index.values
+
+        with stage('resample'):
+            # Grid down to this profile's deepest sample when not given
+            if bottom is None:
+                deepest = np.nanmin(depth) if len(depth) else top
+                if method == 'mean':
+                    # Keep the cell the deepest sample falls in
+                    deepest -= spacing / 2
+                grid = make_grid(spacing, min(deepest, top), top=top)
+                n = max(n, len(grid))
+            else:
+                grid = make_grid(spacing, bottom, top=top)
+
+            rows.append(resample(depth, df[c].values, grid,
+                                 method=method).astype(dtype))
+
+        if not was_loaded:
+            profile.release()
+
+    grid = top - np.arange(n) * spacing
+    data = np.full((len(rows), n), np.nan, dtype=dtype)
+    for i, row in enumerate(rows):
+        data[i, :len(row)] = row
+
+    return grid, data
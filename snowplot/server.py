@@ -0,0 +1,430 @@
+"""
+A local HTTP server that renders snowplot figures using a pool of warm
+worker processes so each figure avoids the cost of starting python and
+importing the plotting stack.
+
+Endpoints:
+    POST /render - JSON body with either a path to a config file or the
+                   config text and optionally the format (png or svg).
+                   Responds with the image bytes. Config paths and the
+                   paths in configs must be inside the server root and
+                   caching is off for every request.
+    GET /metrics - JSON of request counts and render latencies
+    GET /health - Responds with ok when the server is up
+"""
+import json
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import cpu_count, getcwd
+from os.path import abspath, commonpath, dirname, join, realpath
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from inicheck.iniparse import read_config
+
+import snowplot
+from snowplot.figure import make_vertical_plot
+from snowplot.utilities import get_logger, get_master_config
+
+content_types = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+def _init_worker():
+    """
+    Warm up a worker by loading the plotting stack before any requests
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import snowplot.profiles
+    from snowplot.plotting import get_figure
+
+    get_figure((1, 1), 10, 1)
+
+
+def get_root_path(root, path):
+    """
+    Resolves a path relative to the root
+
+    Returns:
+        path: Absolute path with any links resolved
+    Raises:
+        ValueError: When the path is outside of the root
+    """
+    root = realpath(root)
+    resolved = realpath(join(root, path))
+    if commonpath([root, resolved]) != root:
+        raise ValueError(f'{path} is outside of the server root')
+    return resolved
+
+
+def get_path_overrides(config_file, root, base=None):
+    """
+    Rebases the paths in a config so a request can only read files inside
+    the root. Caching is turned off since the cache holds pickles that would
+    run code in the worker if a request could choose where they are read
+    from.
+
+    Args:
+        config_file: Path to the config
+        root: Directory the paths must stay inside
+        base: Directory relative paths are relative to, defaults to the root
+    Returns:
+        overrides: Dictionary of {section: {item: value}} of the rebased paths
+    Raises:
+        ValueError: When a path is outside of the root
+    """
+    mcfg = get_master_config()
+    base = realpath(base or root)
+    overrides = {'output': {'cache_dir': None}}
+
+    for section, items in read_config(config_file).items():
+        if section not in mcfg.cfg.keys():
+            continue
+
+        for item, values in items.items():
+            if item not in mcfg.cfg[section].keys() or \
+                    (section, item) in [('output', 'filename'),
+                                        ('output', 'output_dir'),
+                                        ('output', 'cache_dir')]:
+                continue
+
+            item_type = mcfg.cfg[section][item].type.lower()
+            if 'filename' not in item_type and 'directory' not in item_type:
+                continue
+
+            paths = []
+            for v in values:
+                try:
+                    paths.append(get_root_path(root, join(base, v)))
+                except ValueError:
+                    raise ValueError(f'{section} {item} {v} is outside of '
+                                     f'the server root')
+
+            overrides.setdefault(section, {})
+            overrides[section][item] = paths if len(paths) > 1 else paths[0]
+
+    return overrides
+
+
+def render_figure(config=None, path=None, fmt='png', root=None):
+    """
+    Renders a single figure in a worker and returns the image bytes. Errors
+    are returned instead of raised since make_vertical_plot exits on bad
+    configs.
+
+    Args:
+        config: String of a config file to render
+        path: Path to a config file to render, used when config is None
+        fmt: Image format to render either png or svg
+        root: Directory relative config paths and paths in config strings
+              are relative to. Every path must be inside it
+    Returns:
+        tuple: **image** - bytes of the figure or None if it failed,
+               **error** - None if successful otherwise the error string
+    """
+    root = root or getcwd()
+
+    with TemporaryDirectory() as tmp:
+        try:
+            if config is not None:
+                config_file = join(tmp, 'config.ini')
+                with open(config_file, 'w') as fp:
+                    fp.write(config)
+
+                # Paths in the config are relative to the root not the temp dir
+                overrides = get_path_overrides(config_file, root)
+            else:
+                config_file = get_root_path(root, path)
+                overrides = get_path_overrides(config_file, root,
+                                               base=dirname(config_file))
+
+            overrides['output'].update({'output_dir': tmp,
+                                        'filename': f'figure.{fmt}',
+                                        'show_plot': False})
+
+            make_vertical_plot(config_file, overrides=overrides)
+
+            with open(join(tmp, f'figure.{fmt}'), 'rb') as fp:
+                return fp.read(), None
+
+        except (Exception, SystemExit):
+            return None, traceback.format_exc()
+
+
+def get_error_message(error):
+    """
+    Returns:
+        message: Last line of a render traceback to send to the client, the
+                 full traceback is only logged
+    """
+    message = error.strip().splitlines()[-1]
+    if message.startswith('SystemExit'):
+        return 'Errors in the config, check it with inicheck'
+    return message
+
+
+class RenderMetrics(object):
+    """
+    Thread safe counts and render latencies for the metrics endpoint
+
+    Attributes:
+        window: Number of the most recent latencies to keep
+    """
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.counts = {'requests': 0, 'rendered': 0, 'failed': 0,
+                       'rejected': 0}
+        self.in_flight = 0
+        self.start = time.time()
+
+    def add(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def record(self, seconds, success):
+        """
+        Records the latency of a finished render
+
+        Args:
+            seconds: Time in seconds the render took
+            success: Whether the render succeeded
+        """
+        with self.lock:
+            self.latencies.append(seconds)
+            self.counts['rendered' if success else 'failed'] += 1
+
+    def summary(self):
+        """
+        Returns:
+            summary: Dictionary of the counts and latency statistics in seconds
+        """
+        with self.lock:
+            latencies = np.array(self.latencies)
+            summary = dict(self.counts)
+            summary['in_flight'] = self.in_flight
+
+        summary['uptime'] = time.time() - self.start
+        summary['latency'] = {'count': len(latencies)}
+        if len(latencies) > 0:
+            summary['latency'].update(
+                {'mean': float(latencies.mean()),
+                 'min': float(latencies.min()),
+                 'max': float(latencies.max()),
+                 'p50': float(np.percentile(latencies, 50)),
+                 'p95': float(np.percentile(latencies, 95)),
+                 'p99': float(np.percentile(latencies, 99))})
+        return summary
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """
+    Handles requests to the render server
+    """
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        self.server.log.debug(fmt % args)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self.send_json(200, self.server.metrics.summary())
+
+        elif self.path == '/health':
+            self.send_json(200, {'status': 'ok'})
+
+        else:
+            self.send_json(404, {'error': f'Unknown endpoint {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/render':
+            self.send_json(404, {'error': f'Unknown endpoint {self.path}'})
+            return
+
+        server = self.server
+        server.metrics.add('requests')
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send_json(400, {'error': 'Request body must be JSON'})
+            return
+
+        fmt = str(request.get('format', 'png')).lower()
+        if fmt not in content_types.keys():
+            self.send_json(400, {'error': f'Format must be one of '
+                                          f'{", ".join(content_types)}'})
+            return
+
+        if request.get('config') is None and request.get('path') is None:
+            self.send_json(400, {'error': 'Provide either a config or a path'})
+            return
+
+        # Limit the number of renders queued or running at once
+        if not server.limit.acquire(timeout=server.queue_timeout):
+            server.metrics.add('rejected')
+            self.send_json(503, {'error': 'Too many requests, try again'})
+            return
+
+        with server.metrics.lock:
+            server.metrics.in_flight += 1
+
+        start = time.perf_counter()
+        status, image, error = 200, None, None
+        pool = server.pool
+        try:
+            future = pool.submit(render_figure,
+                                 config=request.get('config'),
+                                 path=request.get('path'),
+                                 fmt=fmt, root=server.root)
+        except (BrokenProcessPool, RuntimeError):
+            server.finish_render()
+            future = None
+            status, error = 500, 'Render workers are restarting, try again'
+            server.replace_pool(pool)
+
+        if future is not None:
+            # The slot is held until the render ends even if it times out
+            future.add_done_callback(server.finish_render)
+            try:
+                image, error = future.result(timeout=server.render_timeout)
+                if error is not None:
+                    server.log.error(f'Render failed:\n{error}')
+                    status, error = 400, get_error_message(error)
+
+            except FutureTimeout:
+                future.cancel()
+                status, error = 504, 'Render timed out'
+
+            except BrokenProcessPool:
+                status, error = 500, 'Render worker crashed, try again'
+                server.replace_pool(pool)
+
+        server.metrics.record(time.perf_counter() - start, error is None)
+
+        if error is not None:
+            if status != 400:
+                server.log.error(f'Render failed: {error}')
+            self.send_json(status, {'error': error})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_types[fmt])
+        self.send_header('Content-Length', str(len(image)))
+        self.end_headers()
+        self.wfile.write(image)
+
+
+class RenderServer(ThreadingHTTPServer):
+    """
+    HTTP server that hands renders off to a pool of warm worker processes
+
+    Attributes:
+        pool: Process pool rendering the figures, replaced if a worker dies
+        n_workers: Number of worker processes in the pool
+        limit: Semaphore limiting the renders queued or running at once
+        metrics: RenderMetrics for the metrics endpoint
+        root: Directory relative paths in config strings are relative to
+        queue_timeout: Seconds a request waits to start before being rejected
+        render_timeout: Seconds a request waits for its render before
+                        responding with a timeout. A render already running
+                        keeps its slot until it ends
+    """
+    daemon_threads = True
+
+    def __init__(self, address, n_workers=None, max_requests=None,
+                 queue_timeout=30, render_timeout=300, root=None):
+        super(RenderServer, self).__init__(address, RenderHandler)
+        self.log = get_logger('snowplot.server')
+
+        if n_workers is None:
+            n_workers = cpu_count() or 1
+        if max_requests is None:
+            max_requests = 2 * n_workers
+
+        self.n_workers = n_workers
+        self.pool_lock = threading.Lock()
+        self.pool = self.start_pool()
+        self.limit = threading.BoundedSemaphore(max_requests)
+        self.metrics = RenderMetrics()
+        self.root = abspath(root or getcwd())
+        self.queue_timeout = queue_timeout
+        self.render_timeout = render_timeout
+
+        self.log.info(f'Rendering with {n_workers} workers and up to '
+                      f'{max_requests} requests at once')
+
+    def start_pool(self):
+        """
+        Returns:
+            pool: ProcessPoolExecutor with its workers started so the first
+                  request is warm
+        """
+        pool = ProcessPoolExecutor(max_workers=self.n_workers,
+                                   initializer=_init_worker)
+        for i in range(self.n_workers):
+            pool.submit(time.sleep, 0)
+        return pool
+
+    def replace_pool(self, broken):
+        """
+        Replaces a pool broken by a worker dying, once no matter how many
+        requests saw it break
+
+        Args:
+            broken: The pool the request found broken
+        """
+        with self.pool_lock:
+            if self.pool is not broken:
+                return
+            self.log.error('A render worker died, restarting the workers')
+            self.pool = self.start_pool()
+        broken.shutdown(wait=False)
+
+    def finish_render(self, future=None):
+        """
+        Frees the slot of a render once it has finished, failed or been
+        cancelled
+        """
+        self.limit.release()
+        with self.metrics.lock:
+            self.metrics.in_flight -= 1
+
+    def server_close(self):
+        super(RenderServer, self).server_close()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+def serve(host='127.0.0.1', port=8000, **kwargs):
+    """
+    Runs the render server until interrupted
+
+    Args:
+        host: Address to listen on
+        port: Port to listen on
+        kwargs: Keyword arguments passed to RenderServer
+    """
+    server = RenderServer((host, port), **kwargs)
+    server.log.info('Serving snowplot {} on http://{}:{}'
+                    ''.format(snowplot.__version__, *server.server_address[0:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,168 @@
+"""
+Smoothing of a single profile column using centered windows. Windows can be
+a number of samples or a width in depth. Depth windows work on unevenly spaced
+samples, the mean directly and the other methods on an evenly spaced grid
+interpolated back to the original depths.
+
+Methods:
+    * mean - moving average
+    * median - moving median, robust to spikes
+    * savgol - Savitzky-Golay filter of a 2nd order polynomial, keeps peaks
+    * gaussian - gaussian weighted average spanning +/- 2 sigma
+"""
+import numpy as np
+import pandas as pd
+
+methods = ['mean', 'median', 'savgol', 'gaussian']
+
+
+def moving_mean(values, n):
+    """
+    Centered moving average in linear time using a cumulative sum. The window
+    shrinks at the ends so no NaNs are introduced.
+
+    Args:
+        values: numpy array of evenly spaced values
+        n: Number of samples in the window
+    Returns:
+        smoothed: numpy array the same length as values
+    """
+    half = n // 2
+    idx = np.arange(len(values))
+    lo = np.clip(idx - half, 0, len(values))
+    hi = np.clip(idx + n - half, 0, len(values))
+
+    csum = np.concatenate([[0], np.cumsum(values, dtype=np.float64)])
+    return (csum[hi] - csum[lo]) / (hi - lo)
+
+
+def smooth_samples(values, n, method='mean'):
+    """
+    Smooths evenly spaced values with a centered window
+
+    Args:
+        values: numpy array of evenly spaced values without NaNs
+        n: Number of samples in the window
+        method: Name of the smoothing method, one of methods
+    Returns:
+        smoothed: numpy array the same length as values
+    """
+    if method not in methods:
+        raise ValueError(f'Unknown smoothing method {method}, use one of '
+                         f'{", ".join(methods)}')
+
+    n = int(round(n))
+    if n <= 1 or len(values) < 2:
+        return np.array(values, dtype=np.float64)
+
+    if method == 'mean':
+        smoothed = moving_mean(values, n)
+
+    elif method == 'median':
+        smoothed = pd.Series(values).rolling(n, center=True, min_periods=1)
+        smoothed = smoothed.median().values
+
+    elif method == 'savgol':
+        from scipy.signal import savgol_filter
+
+        # Window must be odd, longer than the polynomial and fit the data
+        n = min(n, len(values))
+        n = n if n % 2 == 1 else n - 1
+        if n <= 2:
+            return np.array(values, dtype=np.float64)
+        smoothed = savgol_filter(values, n, 2, mode='interp')
+
+    else:
+        from scipy.ndimage import gaussian_filter1d
+        smoothed = gaussian_filter1d(np.asarray(values, dtype=np.float64),
+                                     n / 4, mode='nearest', truncate=2.0)
+
+    return smoothed
+
+
+def window_mean(depth, values, window):
+    """
+    Centered moving average over a window measured in depth. Works on
+    unevenly spaced depths using a cumulative sum.
+
+    Args:
+        depth: numpy array of increasing depths
+        values: numpy array of values at each depth
+        window: Width of the window in the same units as depth
+    Returns:
+        smoothed: numpy array the same length as values
+    """
+    lo = np.searchsorted(depth, depth - window / 2, side='left')
+    hi = np.searchsorted(depth, depth + window / 2, side='right')
+    csum = np.concatenate([[0], np.cumsum(values, dtype=np.float64)])
+    return (csum[hi] - csum[lo]) / (hi - lo)
+
+
+def smooth_depth(depth, values, window, method='mean', max_points=101):
+    """
+    Smooths values using a centered window measured in depth. The mean is
+    computed directly on the depths. Other methods are applied to the values
+    averaged onto an evenly spaced grid with at most max_points per window
+    then interpolated back, keeping the cost linear in the number of samples.
+    NaNs are left in place.
+
+    Args:
+        depth: numpy array of the depth of each value
+        values: numpy array of the values to smooth
+        window: Width of the window in the same units as depth
+        method: Name of the smoothing method, one of methods
+        max_points: Most grid points in a window for methods other than mean
+    Returns:
+        smoothed: numpy array the same length and order as values
+    """
+    if method not in methods:
+        raise ValueError(f'Unknown smoothing method {method}, use one of '
+                         f'{", ".join(methods)}')
+
+    depth = np.asarray(depth, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    smoothed = np.full(len(values), np.nan)
+
+    valid = np.isfinite(depth) & np.isfinite(values)
+    if valid.sum() < 2 or window <= 0:
+        smoothed[valid] = values[valid]
+        return smoothed
+
+    # Work in increasing depth
+    order = np.argsort(depth[valid], kind='stable')
+    d = depth[valid][order]
+    v = values[valid][order]
+
+    if method == 'mean':
+        result = window_mean(d, v, window)
+
+    else:
+        steps = np.diff(d)
+        steps = steps[steps > 0]
+        span = d[-1] - d[0]
+        if len(steps) == 0:
+            spacing = window
+        else:
+            spacing = np.median(steps)
+
+        # Limit the points in a window and the size of the grid
+        spacing = max(spacing, window / max_points, span / (4 * len(d)))
+
+        # Average the samples in each grid cell, filling empty cells
+        n_cells = int(span // spacing) + 1
+        cell = ((d - d[0]) // spacing).astype(int)
+        counts = np.bincount(cell, minlength=n_cells)
+        sums = np.bincount(cell, weights=v, minlength=n_cells)
+        centers = d[0] + (np.arange(n_cells) + 0.5) * spacing
+        filled = counts > 0
+        gridded = np.interp(centers, centers[filled],
+                            sums[filled] / counts[filled])
+
+        on_grid = smooth_samples(gridded, window / spacing, method=method)
+        result = np.interp(d, centers, on_grid)
+
+    # Back to the original order
+    out = np.empty_like(result)
+    out[order] = result
+    smoothed[valid] = out
+    return smoothed
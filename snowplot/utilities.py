@@ -1,4 +1,8 @@
 import logging
+import os
+import tempfile
+from functools import lru_cache
+from os.path import basename, dirname
 
 import coloredlogs
 from inicheck.checkers import CheckType
@@ -163,9 +167,59 @@ def titlize(label):
 
     return temp
 
+@lru_cache(maxsize=None)
+def _read_master_config(paths):
+    if paths is None:
+        return MasterConfig(modules=['snowplot'])
+    return MasterConfig(path=list(paths))
+
+
+def get_master_config(core_config=None):
+    """
+    Parses a master config once per process, later calls return the same
+    object so it must not be modified.
+
+    Args:
+        core_config: Path or list of paths to master configs, defaults to
+                     the master config of snowplot
+    Returns:
+        mcfg: inicheck MasterConfig object
+    """
+    if core_config is not None:
+        if isinstance(core_config, str):
+            core_config = [core_config]
+        core_config = tuple(core_config)
+    return _read_master_config(core_config)
+
+
 def get_profile_defaults(section, core_config):
-    m = MasterConfig(core_config)
+    m = get_master_config(core_config)
     defaults = {}
     for name,obj in m.cfg[section].items():
         defaults[name] = obj.default
     return defaults
+
+
+def write_file(path, write, mode='wb'):
+    """
+    Writes a file through a hidden temp file in the same directory that then
+    replaces it, so a reader never opens a partially written file. Each call
+    gets a temp file of its own so concurrent writers never share one, the
+    last to finish wins.
+
+    Args:
+        path: Path to the file to write
+        write: Function called with the open temp file to write the contents
+        mode: Mode to open the temp file with, wb or w
+    """
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', prefix=f'.{basename(path)}.',
+                               dir=dirname(path) or None)
+    try:
+        with os.fdopen(fd, mode) as fp:
+            write(fp)
+        os.replace(tmp, path)
+
+    except BaseException:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise
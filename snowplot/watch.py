@@ -0,0 +1,224 @@
+"""
+Watches a config file and the data files it plots, re-rendering the figure
+when any of them change. Profiles are kept in memory between renders and
+only the panels affected by a change are loaded again.
+"""
+import os
+import time
+import traceback
+from os import mkdir
+from os.path import abspath, isdir, join
+
+from inicheck.output import generate_config
+
+from snowplot.cache import ProfileCache
+from snowplot.figure import build_profiles, load_profiles, read_user_config
+from snowplot.utilities import get_logger
+
+
+def get_stat(path):
+    """
+    Returns:
+        stat: Tuple of the modified time and size of the file or None if it
+              doesn't exist
+    """
+    try:
+        s = os.stat(path)
+        return s.st_mtime_ns, s.st_size
+    except OSError:
+        return None
+
+
+class ConfigWatcher(object):
+    """
+    Polls a config file and its data files for changes. When the config
+    changes it is checked again and only the profiles with changed processing
+    options are rebuilt. When a data file changes only its profile is
+    reloaded. The figure is rendered again whenever anything it shows
+    changed.
+
+    Attributes:
+        config_file: Path to the config file watched
+        interval: Seconds between checking for changes
+        cfg: Dictionary of the last valid config
+        data: Dictionary of profile names to loaded profiles
+    """
+
+    def __init__(self, config_file, interval=1.0):
+        self.config_file = abspath(config_file)
+        self.interval = interval
+        self.log = get_logger('snowplot.watch')
+
+        self.cfg = None
+        self.data = {}
+        self.cache = None
+        self._stats = {}
+
+    def changed(self, path):
+        """
+        Checks whether a file changed since it was last checked
+
+        Args:
+            path: Path to the file
+        Returns:
+            bool: True if the file is new or changed
+        """
+        stat = get_stat(path)
+        if path in self._stats.keys() and self._stats[path] == stat:
+            return False
+
+        self._stats[path] = stat
+        return True
+
+    @staticmethod
+    def get_processing_options(cfg, name, profile):
+        """
+        Args:
+            cfg: Dictionary of the cast config
+            name: Name of the profile in the data dictionary
+            profile: Profile object listing its processing keys
+        Returns:
+            options: Dictionary of the config items that change the loaded
+                     data of the profile
+        """
+        for section in cfg.keys():
+            if section.replace('_', '').lower() == name:
+                items = cfg[section]
+                keys = ['filename'] + profile.processing_keys
+                return {k: items.get(k) for k in keys}
+
+    def update_config(self):
+        """
+        Reads and checks the config again. The previous config is kept if the
+        new one has errors. Profiles whose processing options are unchanged
+        keep their loaded data.
+
+        Returns:
+            bool: True if the config changed in a way that needs a render
+        """
+        ucfg, errors = read_user_config(self.config_file)
+        if len(errors) > 0:
+            self.log.error('Errors in config file, keeping the last valid '
+                           'config. Check report above.')
+            return False
+
+        cfg = ucfg.cfg
+
+        # Watching always saves and never shows the figure
+        cfg['output']['show_plot'] = False
+        if cfg['output']['filename'] is None:
+            cfg['output']['filename'] = 'figure.png'
+
+        if cfg == self.cfg:
+            self.log.info('Config has no changes to apply')
+            return False
+
+        out = cfg['output']['output_dir']
+        if not isdir(out):
+            mkdir(out)
+        if cfg['output']['write_full_config']:
+            generate_config(ucfg, join(out, 'config_full.ini'))
+
+        self.cache = None
+        if cfg['output']['cache_dir'] is not None:
+            self.cache = ProfileCache(cfg['output']['cache_dir'],
+                                      max_size=cfg['output']['cache_size'])
+
+        data = build_profiles(cfg, cache=self.cache)
+
+        # Keep the data of profiles that would load the same thing
+        for name, profile in data.items():
+            old = self.data.get(name)
+
+            if old is not None and old.is_loaded and \
+                    self.get_processing_options(self.cfg, name, profile) == \
+                    self.get_processing_options(cfg, name, profile):
+                for k in old.cached_attributes:
+                    setattr(profile, k, getattr(old, k))
+                profile.df = old.df
+                profile.set_xlimits(profile.df)
+            else:
+                self.log.info(f'Profile {name} will be reloaded')
+
+        self.cfg = cfg
+        self.data = data
+        return True
+
+    def check(self):
+        """
+        Checks for changes once and updates the figure if needed
+
+        Returns:
+            actions: List of what was done, e.g. config, load lyteprobe, render
+        """
+        actions = []
+
+        if self.changed(self.config_file):
+            try:
+                if self.update_config():
+                    actions.append('config')
+
+            # Files part way through being edited may not parse
+            except Exception:
+                self.log.error(f'Unable to read {self.config_file}, keeping '
+                               f'the last valid config:\n'
+                               f'{traceback.format_exc()}')
+
+        if self.cfg is None:
+            return actions
+
+        # Reload the panels whose data file changed
+        for name, profile in list(self.data.items()):
+            path = abspath(profile.filename)
+            if self.changed(path) and profile.is_loaded:
+                self.log.info(f'Data for {name} changed')
+                self.data[name] = build_profiles(self.cfg,
+                                                 cache=self.cache)[name]
+
+        # Load anything new or changed and keep it in memory
+        to_load = {n: p for n, p in self.data.items() if not p.is_loaded}
+        if to_load:
+            try:
+                if self.cfg['output']['load_workers'] > 1:
+                    load_profiles(to_load,
+                                  n_workers=self.cfg['output']['load_workers'],
+                                  executor=self.cfg['output']['load_executor'])
+                else:
+                    for p in to_load.values():
+                        p.load()
+
+            except Exception:
+                self.log.error(f'Unable to load profiles:\n'
+                               f'{traceback.format_exc()}')
+                return actions
+
+            actions += [f'load {n}' for n in to_load.keys()]
+
+        if actions:
+            from snowplot.plotting import build_figure
+            try:
+                build_figure(self.data, self.cfg, reuse=True)
+                actions.append('render')
+                self.log.info('Rendered {}'.format(
+                    join(self.cfg['output']['output_dir'],
+                         self.cfg['output']['filename'])))
+
+            except Exception:
+                self.log.error(f'Unable to render figure:\n'
+                               f'{traceback.format_exc()}')
+
+        return actions
+
+    def run(self):
+        """
+        Checks for changes until interrupted
+        """
+        self.log.info(f'Watching {self.config_file} for changes, press '
+                      f'Ctrl+C to stop')
+        try:
+            while True:
+                self.check()
+                time.sleep(self.interval)
+
+        except KeyboardInterrupt:
+            pass
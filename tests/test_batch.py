@@ -0,0 +1,111 @@
+from snowplot.batch import (get_config_jobs, get_figure_names,
+                            get_template_jobs, run_batch)
+from os.path import join, isfile, basename
+import os
+import pytest
+
+
+def exit_on_crash(job):
+    """
+    Job that kills its worker process for jobs named crash
+    """
+    if job[0] == 'crash':
+        os._exit(1)
+    return job[0], None
+
+
+def test_run_batch_worker_died():
+    """
+    Test a worker dying fails only its job and the batch continues
+    """
+    jobs = [(name, None, None) for name in ['a', 'b', 'crash', 'c', 'd']]
+    failures = run_batch(jobs, n_workers=2, job_fn=exit_on_crash)
+    assert list(failures.keys()) == ['crash']
+
+
+@pytest.mark.parametrize('files, expected', [
+    (['/d/a/p1.csv', '/d/a/p2.csv'], ['p1', 'p2']),
+    (['/d/a/p1.csv', '/d/b/p1.csv', '/d/b/p2.csv'], ['a_p1', 'b_p1', 'p2']),
+    (['/d/a/p1.csv', '/d/a/p1.txt'], ['p1_csv', 'p1_txt']),
+    (['/d/p1.csv'], ['p1']),
+])
+def test_get_figure_names(files, expected):
+    assert get_figure_names(files) == expected
+
+
+class TestBatch:
+
+    @pytest.fixture()
+    def template(self, tmpdir, data_dir):
+        f = join(str(tmpdir), 'template.ini')
+        with open(f, mode='w+') as fp:
+            fp.write('[hand_hardness]\n')
+            fp.write(f'filename: {join(data_dir, "snowex_stratigraphy.csv")}\n')
+            fp.write('[output]\n')
+            fp.write(f'output_dir: {str(tmpdir)}\n')
+            fp.write('filename: figure.png\n')
+            fp.write('dpi: 50\n')
+        return f
+
+    @pytest.fixture()
+    def data_files(self, tmpdir, data_dir):
+        bad = join(str(tmpdir), 'bad.csv')
+        with open(bad, mode='w+') as fp:
+            fp.write('not,a,pit\n')
+        return [join(data_dir, 'snowex_stratigraphy.csv'), bad]
+
+    def test_template_jobs(self, template, data_files):
+        jobs = get_template_jobs(template, data_files)
+        names = [basename(j[0]) for j in jobs]
+        assert names == ['snowex_stratigraphy.csv', 'bad.csv']
+        assert jobs[0][2]['output']['filename'] == 'snowex_stratigraphy.png'
+        assert jobs[0][2]['hand_hardness']['filename'] == data_files[0]
+
+        # Only the first job writes the full config
+        assert 'write_full_config' not in jobs[0][2]['output']
+        assert jobs[1][2]['output']['write_full_config'] is False
+
+    def test_config_jobs(self, template, tmpdir):
+        jobs = get_config_jobs([str(tmpdir)])
+        assert [j[1] for j in jobs] == [template]
+
+    def test_config_jobs_output_dir(self, template, tmpdir):
+        """
+        Test only one config writing to an output directory writes the full
+        config
+        """
+        other = join(str(tmpdir), 'other.ini')
+        with open(template) as fp:
+            with open(other, 'w') as out:
+                out.write(fp.read())
+
+        jobs = get_config_jobs([str(tmpdir)])
+        assert [basename(j[1]) for j in jobs] == ['other.ini', 'template.ini']
+        assert [j[2]['output'].get('write_full_config') for j in jobs] == \
+            [None, False]
+
+    def test_template_collisions(self, template, data_dir, tmpdir):
+        """
+        Test data files with the same name render to different figures
+        """
+        files = []
+        for site in ['site_a', 'site_b']:
+            os.makedirs(join(str(tmpdir), site))
+            files.append(join(str(tmpdir), site, 'pit.csv'))
+            with open(join(data_dir, 'snowex_stratigraphy.csv')) as fp:
+                with open(files[-1], 'w') as out:
+                    out.write(fp.read())
+
+        assert run_batch(get_template_jobs(template, files), n_workers=2) == {}
+        for site in ['site_a', 'site_b']:
+            assert isfile(join(str(tmpdir), f'{site}_pit.png'))
+
+    @pytest.mark.parametrize('n_workers', [1, 2])
+    def test_run_batch(self, template, data_files, tmpdir, n_workers):
+        """
+        Test failures are reported per job without stopping the batch
+        """
+        jobs = get_template_jobs(template, data_files)
+        failures = run_batch(jobs, n_workers=n_workers)
+        assert list(failures.keys()) == [data_files[1]]
+        assert isfile(join(str(tmpdir), 'snowex_stratigraphy.png'))
@@ -0,0 +1,83 @@
+from snowplot.binning import bin_statistics, rolling_variance
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture()
+def signal():
+    # Evenly spaced samples from the bottom to the surface like an SMP
+    rng = np.random.default_rng(0)
+    depth = -np.arange(20000)[::-1] * 0.004
+    return depth, rng.lognormal(size=len(depth))
+
+
+def get_rolling_variance(values, half_window):
+    return pd.Series(values).rolling(2 * half_window + 1, center=True,
+                                     min_periods=1).var(ddof=0).values
+
+
+@pytest.mark.parametrize('half_window', [0, 1, 12, 50000])
+def test_rolling_variance(signal, half_window):
+    """
+    Test the rolling variance matches pandas including the shrinking ends
+    """
+    values = signal[1]
+    np.testing.assert_allclose(rolling_variance(values, half_window),
+                               get_rolling_variance(values, half_window),
+                               atol=1e-9)
+
+
+@pytest.mark.parametrize('texture_window, half_window', [
+    # 0.1 cm at 0.004 cm per sample is 25 samples
+    (None, 12),
+    (0.5, 62),
+])
+def test_bin_statistics(signal, texture_window, half_window):
+    """
+    Test every statistic matches grouping the samples with pandas
+    """
+    depth, values = signal
+    df = bin_statistics(depth, values, 0.1, texture_window=texture_window)
+
+    bins = np.floor(-depth / 0.1)
+    groups = pd.Series(values).groupby(bins)
+    texture = pd.Series(get_rolling_variance(values, half_window))
+    expected = pd.DataFrame({'mean': groups.mean(),
+                             'median': groups.median(),
+                             'min': groups.min(),
+                             'max': groups.max(),
+                             'texture': texture.groupby(bins).mean(),
+                             'count': groups.count()}).iloc[::-1]
+
+    assert df.index.is_monotonic_increasing
+    assert df['count'].sum() == len(values)
+    np.testing.assert_allclose(df.index.values,
+                               -(expected.index.values + 0.5) * 0.1)
+    for c in expected.columns:
+        np.testing.assert_allclose(df[c].values, expected[c].values)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+def test_chunks(signal, chunk_size):
+    """
+    Test binning in chunks never splits a bin
+    """
+    depth, values = signal
+    pd.testing.assert_frame_equal(
+        bin_statistics(depth, values, 0.1, chunk_size=chunk_size),
+        bin_statistics(depth, values, 0.1))
+
+
+def test_unsorted():
+    """
+    Test unsorted samples and NaNs are handled
+    """
+    df = bin_statistics([-0.5, -2.5, -1.5, -0.2, -0.8], [1, 3, 2, np.nan, 4], 1)
+    np.testing.assert_allclose(df.index.values, [-2.5, -1.5, -0.5])
+    np.testing.assert_allclose(df['mean'].values, [3, 2, 2.5])
+    np.testing.assert_array_equal(df['count'].values, [1, 1, 2])
+    assert len(bin_statistics([], [], 1).index) == 0
+
+    with pytest.raises(ValueError):
+        bin_statistics([0], [1], 0)
@@ -0,0 +1,91 @@
+from snowplot.cache import ProfileCache
+from snowplot.profiles import GrainSizeProfile
+from inicheck.tools import get_user_config
+from os.path import join
+import os
+import pytest
+
+
+class TestProfileCache:
+
+    @pytest.fixture()
+    def config(self, data_dir, tmpdir):
+        f = join(str(tmpdir), 'config.ini')
+        with open(f, mode='w+') as fp:
+            fp.write('[grain_size]\n')
+            fp.write(f'filename: {join(data_dir, "snowex_stratigraphy.csv")}\n')
+            fp.write('[output]\n')
+        ucfg = get_user_config(f, modules=['snowplot'])
+        return ucfg.cfg['grain_size']
+
+    @pytest.fixture()
+    def cache(self, tmpdir):
+        return ProfileCache(join(str(tmpdir), 'cache'))
+
+    def test_cache_hit(self, config, cache, monkeypatch):
+        """
+        Test a second profile with the same options never opens the file
+        """
+        p1 = GrainSizeProfile(cache=cache, **config)
+        p1.load()
+        assert len(os.listdir(cache.cache_dir)) == 1
+
+        def fail(*args, **kwargs):
+            raise AssertionError('File was reopened on a cache hit')
+
+        monkeypatch.setattr(GrainSizeProfile, 'open', fail)
+        p2 = GrainSizeProfile(cache=cache, **config)
+        assert p2.df.equals(p1.df)
+
+    def test_cache_key_options(self, config, cache):
+        """
+        Test styling options share a key but processing options do not
+        """
+        p = GrainSizeProfile(cache=cache, **config)
+        p.load()
+        key = cache.get_key(p)
+
+        p.title = 'New title'
+        assert cache.get_key(p) == key
+
+        p.smoothing = 5
+        assert cache.get_key(p) != key
+
+    def test_eviction(self, config, tmpdir):
+        cache = ProfileCache(join(str(tmpdir), 'cache'), max_size=0)
+        GrainSizeProfile(cache=cache, **config).load()
+        assert os.listdir(cache.cache_dir) == []
+
+    def test_evicted_entries(self, config, cache, monkeypatch):
+        """
+        Test entries removed by another render are misses and never fail
+        """
+        p = GrainSizeProfile(cache=cache, **config)
+        p.load()
+        key = cache.get_key(p)
+        os.remove(cache.get_path(key))
+        assert cache.get(key, p) is None
+
+        # Listed then removed before eviction reads it
+        listdir = os.listdir
+        monkeypatch.setattr(os, 'listdir',
+                            lambda d: listdir(d) + ['removed' + cache.ext])
+        cache.max_size = 0
+        cache.put(key, p, p.df)
+        assert listdir(cache.cache_dir) == []
+
+    def test_concurrent_put(self, config, cache):
+        """
+        Test threads writing the same entry at once never share a temp file
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        p = GrainSizeProfile(cache=cache, **config)
+        p.load()
+        key = cache.get_key(p)
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda i: cache.put(key, p, p.df), range(32)))
+
+        assert os.listdir(cache.cache_dir) == [key + cache.ext]
+        assert cache.get(key, p).equals(p.df)
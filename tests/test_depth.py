@@ -0,0 +1,62 @@
+from snowplot.depth import cumulative_trapezoid, depth_from_acceleration
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture()
+def capture():
+    """
+    Probe at rest, pushed down, slowed and at rest again sampled at 16 kHz
+    """
+    n = 40000
+    rng = np.random.default_rng(0)
+    time = np.arange(n) / 16000
+    motion = np.zeros(n)
+    motion[10000:20000] = -0.5
+    motion[20000:30000] = 0.5
+    acc = -1 + motion + rng.normal(0, 0.01, n)
+    return time, acc
+
+
+def test_cumulative_trapezoid():
+    """
+    Test a constant integrates to a line across blocks
+    """
+    values = np.ones(10)
+    result = cumulative_trapezoid(values, np.full(9, 0.5), block_size=3)
+    np.testing.assert_allclose(result, np.arange(10) * 0.5)
+
+
+def test_matches_study_lyte(capture):
+    """
+    Test the depth matches integrating the whole dataframe with study_lyte
+    """
+    depth = pytest.importorskip('study_lyte.depth')
+    time, acc = capture
+    df = pd.DataFrame({'time': time, 'acceleration': acc})
+    expected = depth.get_depth_from_acceleration(df)['acceleration'].values
+
+    np.testing.assert_allclose(depth_from_acceleration(time, acc), expected,
+                               rtol=1e-10, atol=1e-12)
+
+
+def test_float32(capture):
+    """
+    Test integrating at float32 stays close to float64
+    """
+    time, acc = capture
+    expected = depth_from_acceleration(time, acc)
+    result = depth_from_acceleration(time, acc, dtype='float32')
+
+    assert result.dtype == np.float32
+    assert np.max(np.abs(result - expected)) < 1e-5 * np.max(np.abs(expected))
+
+
+@pytest.mark.parametrize('n', [0, 1, 2])
+def test_short(n):
+    """
+    Test captures too short to integrate don't fail
+    """
+    result = depth_from_acceleration(np.arange(n) / 16000, -np.ones(n))
+    np.testing.assert_array_equal(result, np.zeros(n))
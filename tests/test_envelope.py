@@ -0,0 +1,146 @@
+from snowplot.envelope import DepthEnvelope
+from snowplot.figure import build_profiles, make_vertical_plot
+from snowplot.profiles import EnvelopeProfile
+from snowplot.resample import make_grid, resample
+from inicheck.tools import get_user_config
+from os.path import isfile, join
+import numpy as np
+import os
+import shutil
+import pytest
+
+
+@pytest.fixture()
+def values():
+    # Profiles x depth bins with gaps and a spread that keeps growing
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(1, 1, size=(200, 30))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    values[100:] *= 50
+    return values
+
+
+def test_statistics(values):
+    """
+    Test the running count, mean and variance match numpy on all the
+    profiles at once
+    """
+    envelope = DepthEnvelope(n_value_bins=256)
+    for row in values:
+        envelope.update(row)
+
+    np.testing.assert_array_equal(envelope.count,
+                                  np.isfinite(values).sum(axis=0))
+    np.testing.assert_allclose(envelope.mean, np.nanmean(values, axis=0))
+    np.testing.assert_allclose(envelope.variance,
+                               np.nanvar(values, axis=0, ddof=1))
+    assert envelope.n_profiles == envelope.count.max()
+
+
+@pytest.mark.parametrize('q', [0.1, 0.5, 0.9])
+def test_quantile(values, q):
+    """
+    Test quantiles are within one histogram bin after the range widened
+    """
+    envelope = DepthEnvelope(n_value_bins=256)
+    for row in values:
+        envelope.update(row)
+
+    expected = np.nanquantile(values, q, axis=0, method='inverted_cdf')
+    assert np.all(np.abs(envelope.quantile(q) - expected) <= envelope._width)
+
+
+def test_grow():
+    """
+    Test deeper profiles add depth bins and shallow ones leave them empty
+    """
+    envelope = DepthEnvelope(spacing=2.0, top=1.0)
+    envelope.update([1, 2])
+    envelope.update([3, 4, 5])
+
+    np.testing.assert_allclose(envelope.grid, [1, -1, -3])
+    np.testing.assert_array_equal(envelope.count, [2, 2, 1])
+    median = envelope.quantile([0.5])[0]
+    assert np.all(np.isfinite(median))
+    assert np.isnan(DepthEnvelope().quantile(0.5)).all()
+
+
+def test_n_value_bins():
+    with pytest.raises(ValueError):
+        DepthEnvelope(n_value_bins=5)
+
+
+class TestEnvelopeProfile:
+
+    @pytest.fixture()
+    def config(self, data_dir, tmpdir):
+        """
+        Template and figure configs summarizing copies of the Lyte profile
+        """
+        d = join(str(tmpdir), 'profiles')
+        os.mkdir(d)
+        for i in range(3):
+            shutil.copy(join(data_dir, 'lyte_profile.csv'),
+                        join(d, f'profile_{i}.csv'))
+
+        template = join(str(tmpdir), 'template.ini')
+        with open(template, 'w') as fp:
+            fp.write(f'[lyte_probe]\n'
+                     f'filename: {join(d, "profile_0.csv")}\n'
+                     f'[output]\n')
+
+        f = join(str(tmpdir), 'figure.ini')
+        with open(f, 'w') as fp:
+            fp.write(f'[envelope]\nfilename: {template}\n'
+                     f'profiles: {d}\n'
+                     f'[output]\noutput_dir: {tmpdir}\n'
+                     f'filename: figure.png\nshow_plot: False\n')
+        return f
+
+    def test_matches_profile(self, config, data_dir, tmpdir):
+        """
+        Test copies of one profile summarize to that profile
+        """
+        cfg = get_user_config(config, modules=['snowplot']).cfg
+        profile = EnvelopeProfile(**cfg['envelope'])
+        df = profile.df
+
+        assert profile.n_profiles == 3
+        assert profile.column_to_plot == 'p50'
+        assert profile.envelope_columns == ('p10', 'p90')
+        assert list(df.columns) == ['p10', 'p50', 'p90', 'mean', 'std',
+                                    'count']
+        assert profile.xlimits == [df['p10'].min(), df['p90'].max()]
+
+        # Same profile as on its own, averaged into the depth bins
+        template = get_user_config(join(str(tmpdir), 'template.ini'),
+                                   modules=['snowplot']).cfg
+        single = build_profiles(template)['lyteprobe']
+        grid = make_grid(1.0, single.df.index.min() - 0.5)
+        expected = resample(single.df.index.values,
+                            single.df[single.column_to_plot].values, grid,
+                            method='mean')
+
+        np.testing.assert_allclose(df['mean'].values[:len(grid)], expected)
+        assert np.nanmax(np.abs(df['p50'].values[:len(grid)] - expected)) <= \
+            np.nanmax(expected) / 512 * 2
+        np.testing.assert_allclose(df['std'].dropna().values, 0, atol=1e-9)
+
+    def test_cache(self, config, tmpdir):
+        """
+        Test the profiles summarized are cached instead of the envelope
+        """
+        cache_dir = join(str(tmpdir), 'cache')
+        make_vertical_plot(config, overrides={
+            'output': {'cache_dir': cache_dir}})
+
+        assert isfile(join(str(tmpdir), 'figure.png'))
+
+        # Copies of one file share an entry keyed by their contents
+        assert len(os.listdir(cache_dir)) == 1
+
+    def test_missing_profiles(self, config, tmpdir):
+        cfg = get_user_config(config, modules=['snowplot']).cfg
+        cfg['envelope']['profiles'] = [join(str(tmpdir), 'bogus', '*.csv')]
+        with pytest.raises(ValueError):
+            EnvelopeProfile(**cfg['envelope']).load()
@@ -0,0 +1,109 @@
+from snowplot.events import EventSidecar
+from os.path import isfile, join
+import json
+import os
+import pytest
+
+parameters = {'n_points_for_basis': 10, 'start_threshold': 0.1,
+              'stop_threshold': 0.7, 'surface_threshold': 0.02}
+detected = {'start': 5, 'stop': 90, 'surface': 12}
+
+
+class TestEventSidecar:
+
+    @pytest.fixture()
+    def filename(self, tmpdir):
+        f = join(str(tmpdir), 'capture.csv')
+        with open(f, 'w') as fp:
+            fp.write('a,b\n1,2\n')
+        return f
+
+    @pytest.fixture()
+    def stored(self, filename):
+        EventSidecar(filename).put(detected, parameters)
+        return filename
+
+    def set_manual(self, filename, **manual):
+        path = filename + EventSidecar.ext
+        with open(path) as fp:
+            entry = json.load(fp)
+        entry['manual'].update(manual)
+        with open(path, 'w') as fp:
+            json.dump(entry, fp)
+
+    def test_missing(self, filename):
+        sidecar = EventSidecar(filename)
+        assert sidecar.get(parameters) is None
+        assert sidecar.get_manual() == {}
+
+    def test_round_trip(self, stored):
+        assert isfile(stored + '.events.json')
+        assert EventSidecar(stored).get(parameters) == detected
+
+    def test_other_parameters(self, stored):
+        """
+        Test events detected with other thresholds are detected again
+        """
+        other = dict(parameters)
+        other['start_threshold'] = 0.2
+        assert EventSidecar(stored).get(other) is None
+
+    def test_manual(self, stored):
+        """
+        Test events set by hand replace the detected ones and are kept when
+        the events are stored again
+        """
+        self.set_manual(stored, surface=20)
+        expected = dict(detected)
+        expected['surface'] = 20
+        assert EventSidecar(stored).get(parameters) == expected
+
+        EventSidecar(stored).put(detected, parameters)
+        assert EventSidecar(stored).get_manual() == {'surface': 20}
+
+    def test_written_by_hand(self, filename):
+        """
+        Test a sidecar with only manual events is used
+        """
+        with open(filename + EventSidecar.ext, 'w') as fp:
+            json.dump({'manual': {'stop': 50}}, fp)
+
+        sidecar = EventSidecar(filename)
+        assert sidecar.get(parameters) is None
+        assert sidecar.get_manual() == {'stop': 50}
+
+    def test_touched(self, stored):
+        """
+        Test a new modified time with the same contents keeps the events
+        """
+        st = os.stat(stored)
+        os.utime(stored, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        assert EventSidecar(stored).get(parameters) == detected
+
+    def test_all_manual(self, filename):
+        """
+        Test a sidecar with every event set by hand needs nothing detected
+        """
+        manual = {'start': 3, 'stop': 80, 'surface': 10}
+        with open(filename + EventSidecar.ext, 'w') as fp:
+            json.dump({'manual': manual}, fp)
+
+        assert EventSidecar(filename).get(parameters) == manual
+
+    def test_changed(self, stored):
+        """
+        Test detected events for a file that changed are not used but the
+        events set by hand are kept when they are stored again
+        """
+        self.set_manual(stored, surface=20)
+        with open(stored, 'a') as fp:
+            fp.write('3,4\n')
+
+        sidecar = EventSidecar(stored)
+        assert sidecar.get(parameters) is None
+        assert sidecar.get_manual() == {'surface': 20}
+
+        sidecar.put(detected, parameters)
+        expected = dict(detected)
+        expected['surface'] = 20
+        assert EventSidecar(stored).get(parameters) == expected
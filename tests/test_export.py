@@ -0,0 +1,143 @@
+from snowplot.export import (export_profiles, get_path, get_profile_id,
+                             list_profiles, read_profile)
+from snowplot.figure import build_profiles, make_vertical_plot
+from snowplot.profiles import DatasetProfile
+from inicheck.tools import get_user_config
+from os.path import join, isfile
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+
+class TestExport:
+
+    def write_config(self, d, sections):
+        f = join(d, f'{"_".join(sections.keys())}.ini')
+        with open(f, 'w') as fp:
+            for section, items in sections.items():
+                fp.write(f'[{section}]\n')
+                for k, v in items.items():
+                    fp.write(f'{k}: {v}\n')
+            fp.write('[output]\n')
+        return f
+
+    @pytest.fixture()
+    def configs(self, data_dir, tmpdir):
+        d = join(str(tmpdir), 'configs')
+        os.mkdir(d)
+        profiles = {
+            'lyte_probe': {'filename': join(data_dir, 'lyte_profile.csv')},
+            'snow_micropen': {'filename': join(data_dir, 'smp.pnt')},
+            'hand_hardness': {'filename': join(data_dir, 'hand_hardness.txt')}}
+        return [self.write_config(d, {k: v}) for k, v in profiles.items()]
+
+    @pytest.fixture()
+    def dataset(self, configs, tmpdir):
+        d = join(str(tmpdir), 'dataset')
+        jobs = [(f, f, None) for f in configs]
+        assert export_profiles(jobs, d, n_workers=1) == {}
+        return d
+
+    def test_partitions(self, dataset):
+        assert sorted(os.listdir(dataset)) == [
+            'profile_type=HandHardness', 'profile_type=LyteProbe',
+            'profile_type=SnowMicroPen']
+
+    def test_matches_profiles(self, dataset, configs):
+        """
+        Test the exported rows match the processed profiles
+        """
+        profiles = list_profiles(dataset)
+        assert len(profiles.index) == 3
+
+        for f in configs:
+            cfg = get_user_config(f, modules=['snowplot']).cfg
+            profile = list(build_profiles(cfg).values())[0]
+            profile_id = get_profile_id(profile)
+            df = read_profile(dataset, profile_id)
+
+            assert df['profile_type'].iloc[0] == profile.name
+            np.testing.assert_allclose(df['depth'].values,
+                                       profile.df.index.values)
+            np.testing.assert_allclose(
+                df['value'].values,
+                profile.df[profile.column_to_plot].values)
+
+    def test_append(self, dataset, configs, data_dir, tmpdir):
+        """
+        Test exporting again skips existing profiles and new profiles are
+        added without rewriting the existing files
+        """
+        files = {}
+        for root, dirs, names in os.walk(dataset):
+            for n in names:
+                files[join(root, n)] = os.stat(join(root, n)).st_mtime_ns
+
+        new = self.write_config(str(tmpdir), {'grain_size': {
+            'filename': join(data_dir, 'snowex_stratigraphy.csv')}})
+        jobs = [(f, f, None) for f in configs + [new]]
+        assert export_profiles(jobs, dataset, n_workers=2) == {}
+
+        for f, mtime in files.items():
+            assert os.stat(f).st_mtime_ns == mtime
+
+        assert len(list_profiles(dataset).index) == 4
+
+    def test_failures(self, dataset, tmpdir):
+        f = self.write_config(str(tmpdir), {'hand_hardness': {
+            'filename': join(str(tmpdir), 'missing.txt')}})
+        assert list(export_profiles([(f, f, None)], dataset)) == [f]
+
+    def test_read_profile(self, dataset, monkeypatch):
+        """
+        Test only the file of the profile is opened
+        """
+        profiles = list_profiles(dataset)
+        profile_id = profiles['profile_id'].iloc[0]
+
+        opened = []
+        read_parquet = pd.read_parquet
+
+        def record(path, **kwargs):
+            opened.append(path)
+            return read_parquet(path, **kwargs)
+
+        monkeypatch.setattr(pd, 'read_parquet', record)
+        df = read_profile(dataset, profile_id, columns=['value',
+                                                        'profile_type'])
+        assert opened == [get_path(dataset, profiles['profile_type'].iloc[0],
+                                   profile_id)]
+        assert list(df.columns) == ['value', 'profile_type']
+
+    def test_missing_profile(self, dataset):
+        with pytest.raises(ValueError):
+            read_profile(dataset, 'bogus')
+
+    @pytest.mark.parametrize('profile_type', ['LyteProbe', 'HandHardness'])
+    def test_plot_from_dataset(self, dataset, tmpdir, profile_type):
+        """
+        Test a figure can be made from a profile in the dataset
+        """
+        profiles = list_profiles(dataset)
+        profile_id = profiles.loc[profiles['profile_type'] == profile_type,
+                                  'profile_id'].iloc[0]
+
+        f = join(str(tmpdir), 'figure.ini')
+        with open(f, 'w') as fp:
+            fp.write(f'[dataset]\nfilename: {dataset}\n'
+                     f'profile_id: {profile_id}\n'
+                     f'[output]\noutput_dir: {tmpdir}\n'
+                     f'filename: figure.png\nshow_plot: False\n')
+
+        cfg = get_user_config(f, modules=['snowplot']).cfg
+        profile = DatasetProfile(**cfg['dataset'])
+        expected = read_profile(dataset, profile_id)
+        np.testing.assert_allclose(profile.df.iloc[:, 0].values,
+                                   expected['value'].values)
+        assert profile.is_layered_data == (profile_type == 'HandHardness')
+
+        make_vertical_plot(f)
+        assert isfile(join(str(tmpdir), 'figure.png'))
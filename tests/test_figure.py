@@ -0,0 +1,176 @@
+from snowplot.figure import (build_profiles, load_profiles,
+                             make_vertical_plot, read_user_config)
+from snowplot.utilities import get_master_config
+from inicheck.tools import get_user_config
+from os.path import isfile, join
+import os
+import pandas as pd
+import pytest
+
+
+class TestLoadProfiles:
+
+    @pytest.fixture()
+    def cfg(self, data_dir, tmpdir):
+        """
+        Config for a four panel figure
+        """
+        f = join(str(tmpdir), 'config.ini')
+        with open(f, 'w') as fp:
+            fp.write(f'[lyte_probe]\n'
+                     f'filename: {join(data_dir, "lyte_profile.csv")}\n'
+                     f'[snow_micropen]\n'
+                     f'filename: {join(data_dir, "smp.pnt")}\nplot_id: 2\n'
+                     f'[hand_hardness]\n'
+                     f'filename: {join(data_dir, "hand_hardness.txt")}\n'
+                     f'plot_id: 3\n'
+                     f'[grain_size]\n'
+                     f'filename: {join(data_dir, "snowex_stratigraphy.csv")}\n'
+                     f'plot_id: 4\n'
+                     f'[output]\n')
+        return get_user_config(f, modules=['snowplot']).cfg
+
+    @pytest.mark.parametrize('executor', ['thread', 'process'])
+    def test_load_profiles(self, cfg, executor):
+        """
+        Test loading at the same time matches loading one at a time
+        """
+        expected = build_profiles(cfg)
+        data = build_profiles(cfg)
+        load_profiles(data, executor=executor)
+
+        assert len(data) == 4
+        for name, profile in data.items():
+            assert profile.is_loaded
+            pd.testing.assert_frame_equal(profile.df, expected[name].df)
+            assert profile.column_to_plot == expected[name].column_to_plot
+            assert profile.xlimits == expected[name].xlimits
+
+    @pytest.mark.parametrize('executor', ['thread', 'process'])
+    def test_load_profiles_errors(self, cfg, executor, tmpdir):
+        """
+        Test every panel that fails is reported
+        """
+        data = build_profiles(cfg)
+        for name in ['handhardness', 'grainsize']:
+            data[name].filename = join(str(tmpdir), 'missing.csv')
+
+        with pytest.raises(RuntimeError) as e:
+            load_profiles(data, n_workers=2, executor=executor)
+
+        assert '3 (handhardness)' in str(e.value)
+        assert '4 (grainsize)' in str(e.value)
+        assert data['lyteprobe'].is_loaded
+
+    def test_unknown_executor(self, cfg):
+        with pytest.raises(ValueError):
+            load_profiles(build_profiles(cfg), executor='bogus')
+
+
+class TestReadUserConfig:
+
+    @pytest.fixture()
+    def config(self, data_dir, tmpdir):
+        f = join(str(tmpdir), 'config.ini')
+        with open(f, 'w') as fp:
+            fp.write(f'[hand_hardness]\n'
+                     f'filename: {join(data_dir, "hand_hardness.txt")}\n'
+                     f'[output]\noutput_dir: {tmpdir}\n'
+                     f'filename: figure.png\nshow_plot: False\n')
+        return f
+
+    def test_master_config(self):
+        assert get_master_config() is get_master_config()
+
+    def test_matches_inicheck(self, config):
+        """
+        Test the shared master config reads the same as parsing it each time
+        """
+        overrides = {'hand_hardness': {'title': 'Pit 1'}}
+        ucfg, errors = read_user_config(config, overrides=overrides)
+        expected = get_user_config(config, modules=['snowplot']).cfg
+
+        assert errors == []
+        assert ucfg.cfg['hand_hardness']['title'] == 'pit 1'
+        ucfg.cfg['hand_hardness']['title'] = expected['hand_hardness']['title']
+        for section, items in expected.items():
+            assert dict(ucfg.cfg[section]) == dict(items)
+
+    def test_cache(self, config, monkeypatch):
+        """
+        Test an unchanged config is only checked once and copies are returned
+        """
+        import snowplot.figure
+
+        checked = []
+        check_config = snowplot.figure.check_config
+
+        def check(ucfg):
+            checked.append(ucfg)
+            return check_config(ucfg)
+
+        monkeypatch.setattr(snowplot.figure, 'check_config', check)
+
+        first, errors = read_user_config(config)
+        first.cfg['output']['dpi'] = 1
+        second, errors = read_user_config(config)
+        assert len(checked) == 1
+        assert second.cfg['output']['dpi'] == 100
+
+        # Only the overridden items are checked again
+        ucfg, errors = read_user_config(config,
+                                        overrides={'output': {'dpi': 50}})
+        assert len(checked) == 2
+        assert checked[-1].cfg == {'output': {'dpi': 50}}
+        assert ucfg.cfg['output']['dpi'] == 50
+        assert ucfg.cfg['hand_hardness'] == first.cfg['hand_hardness']
+
+        with open(config, 'a') as fp:
+            fp.write('dpi: 50\n')
+        ucfg, errors = read_user_config(config)
+        assert len(checked) == 3
+        assert ucfg.cfg['output']['dpi'] == 50
+
+    def test_cache_overrides(self, config, data_dir, monkeypatch):
+        """
+        Test renders of the same config with a new output directory each
+        time, like the server, check the whole config once
+        """
+        import snowplot.figure
+        from snowplot.server import render_figure
+
+        checked = []
+        check_config = snowplot.figure.check_config
+
+        def check(ucfg):
+            checked.append(ucfg.cfg)
+            return check_config(ucfg)
+
+        monkeypatch.setattr(snowplot.figure, 'check_config', check)
+
+        for i in range(3):
+            image, error = render_figure(path=config, root='/')
+            assert error is None
+
+        # Items never overridden like the dpi are only checked the first time
+        assert ['dpi' in c['output'] for c in checked] == \
+            [True, False, False, False]
+        assert 'output_dir' in checked[-1]['output']
+
+    def test_override_errors(self, config):
+        """
+        Test errors in overridden items are reported on a cached config
+        """
+        read_user_config(config)
+        ucfg, errors = read_user_config(
+            config, overrides={'hand_hardness': {'filename': 'missing.txt'}})
+        assert len(errors) == 1
+
+    @pytest.mark.parametrize('write_full_config', [True, False])
+    def test_write_full_config(self, config, tmpdir, write_full_config):
+        make_vertical_plot(config, overrides={
+            'output': {'write_full_config': write_full_config}})
+
+        assert isfile(join(str(tmpdir), 'figure.png'))
+        assert isfile(join(str(tmpdir), 'config_full.ini')) == \
+            write_full_config
@@ -0,0 +1,43 @@
+import subprocess
+import sys
+import json
+import pytest
+
+
+def get_imported(statement):
+    """
+    Runs the import statement in a fresh interpreter and returns the names of
+    the top level modules imported
+    """
+    code = f'{statement}\nimport sys, json\n' \
+           f'print(json.dumps(sorted(set(m.split(".")[0] for m in sys.modules))))'
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                         text=True, check=True)
+    return json.loads(out.stdout.strip().split('\n')[-1])
+
+
+@pytest.mark.parametrize('statement, not_imported', [
+    ('import snowplot', ['inicheck', 'coloredlogs', 'numpy', 'pandas',
+                         'matplotlib', 'snowmicropyn', 'study_lyte']),
+    ('import snowplot.cli', ['inicheck', 'pandas', 'matplotlib']),
+    ('import snowplot.profiles', ['matplotlib', 'snowmicropyn',
+                                  'study_lyte']),
+    ('import snowplot.figure', ['matplotlib', 'snowmicropyn', 'study_lyte']),
+])
+def test_deferred_imports(statement, not_imported):
+    """
+    Test heavy dependencies are only imported when they are needed
+    """
+    imported = get_imported(statement)
+    for name in not_imported:
+        assert name not in imported
+
+
+def test_inicheck_attributes():
+    """
+    Test inicheck still finds the deferred config header and checkers
+    """
+    from inicheck.config import MasterConfig
+    mcfg = MasterConfig(modules=['snowplot'])
+    assert 'snowplot.utilities' in mcfg.checker_modules
+    assert 'snowplot' in mcfg.header
@@ -0,0 +1,175 @@
+from snowplot.cli import batch as batch_cli, index as index_cli
+from snowplot.index import ProfileIndex, get_reader, parse_timestamp
+from os.path import join
+import os
+import shutil
+import pytest
+
+
+@pytest.fixture()
+def data(data_dir, tmpdir):
+    """
+    Copy of the test data with a subdirectory and an unsupported file
+    """
+    d = join(str(tmpdir), 'data')
+    os.makedirs(join(d, 'smp'))
+    for f in ['lyte_profile.csv', 'hand_hardness.txt',
+              'snowex_stratigraphy.csv', 'config.ini']:
+        shutil.copy(join(data_dir, f), d)
+    shutil.copy(join(data_dir, 'smp.pnt'), join(d, 'smp'))
+    return d
+
+
+@pytest.fixture()
+def index(data):
+    index = ProfileIndex(join(data, 'snowplot_index.sqlite'))
+    index.update([data])
+    return index
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2022-01-14--13:07:11', '2022-01-14T13:07:11'),
+    ('2020-01-28T13:55', '2020-01-28T13:55:00'),
+    ('yesterday', None),
+])
+def test_parse_timestamp(value, expected):
+    assert parse_timestamp(value) == expected
+
+
+def test_get_reader(data):
+    assert get_reader(join(data, 'config.ini')) is None
+    assert get_reader(join(data, 'smp', 'smp.pnt')).__name__ == 'read_smp'
+    assert get_reader(join(data, 'lyte_profile.csv')).__name__ == 'read_lyte'
+
+
+def test_update(index, data):
+    """
+    Test every supported file is indexed from its header
+    """
+    rows = {r['path']: r for r in index.query()}
+    assert len(rows) == 4
+
+    lyte = rows[join(data, 'lyte_profile.csv')]
+    assert lyte['profile_type'] == 'LyteProbe'
+    assert lyte['flavor'] == 'radicl'
+    assert lyte['timestamp'] == '2022-01-14T13:07:11'
+    assert lyte['header']['radicl VERSION'] == '0.5.1'
+
+    smp = rows[join(data, 'smp', 'smp.pnt')]
+    assert smp['profile_type'] == 'SnowMicroPen'
+    assert smp['samples_count'] == 19118
+    assert smp['timestamp'].startswith('2001-08-02T18:20:28')
+    assert smp['depth_top'] == 0
+    assert smp['depth_bottom'] < 0
+
+    pit = rows[join(data, 'snowex_stratigraphy.csv')]
+    assert (pit['profile_type'], pit['flavor']) == ('Layered', 'snowex')
+    assert pit['timestamp'] == '2020-01-28T13:55:00'
+
+
+def test_incremental(index, data, monkeypatch):
+    """
+    Test only changed files are read again and removed files are dropped
+    """
+    import snowplot.index
+
+    # Touched but unchanged, changed and removed files
+    os.utime(join(data, 'smp', 'smp.pnt'))
+    with open(join(data, 'hand_hardness.txt'), 'a') as fp:
+        fp.write('\n')
+    os.remove(join(data, 'lyte_profile.csv'))
+
+    read = []
+    original = snowplot.index.read_text
+
+    def read_text(path):
+        read.append(path)
+        return original(path)
+
+    monkeypatch.setattr(snowplot.index, 'read_text', read_text)
+    counts = index.update([data])
+
+    assert counts['added'] == 0
+    assert counts['updated'] == 1
+    assert counts['unchanged'] == 2
+    assert counts['removed'] == 1
+    assert read == [join(data, 'hand_hardness.txt')]
+    assert index.update([data])['unchanged'] == 3
+
+
+def test_removed_while_indexing(index, data, monkeypatch):
+    """
+    Test files removed after the directories are listed are skipped
+    """
+    import snowplot.index
+
+    skipped = index.update([data])['skipped']
+
+    # Listed then removed before they are read
+    gone = [join(data, 'lyte_profile.csv'), join(data, 'never_indexed.csv')]
+    os.remove(gone[0])
+    find_files = snowplot.index.find_files
+    monkeypatch.setattr(snowplot.index, 'find_files',
+                        lambda *args, **kwargs: sorted(
+                            find_files(*args, **kwargs) + gone))
+
+    counts = index.update([data])
+    assert counts['removed'] == 1
+    assert counts['skipped'] == skipped + 1
+    assert gone[0] not in index.select()
+
+
+def test_select(index, data):
+    files = index.select("profile_type = ? AND timestamp >= '2021'",
+                         params=('LyteProbe',))
+    assert files == [join(data, 'lyte_profile.csv')]
+    assert len(index.select("flavor IN ('snowex', 'text')")) == 2
+
+
+def test_cli(data, capsys):
+    """
+    Test indexing then selecting profiles from the command line
+    """
+    assert index_cli([data]) == 0
+    assert '4 added' in capsys.readouterr().out
+
+    assert index_cli([data, '--where', "profile_type = 'SnowMicroPen'"]) == 0
+    out = capsys.readouterr().out.split()
+    assert out == [join(data, 'smp', 'smp.pnt')]
+
+
+def test_missing_index(tmpdir):
+    """
+    Test querying an index that doesn't exist raises without creating it
+    """
+    f = join(str(tmpdir), 'missing.sqlite')
+    with pytest.raises(FileNotFoundError):
+        ProfileIndex(f).select()
+    assert not os.path.isfile(f)
+
+
+def test_batch_default_index(data, tmpdir, capsys, monkeypatch):
+    """
+    Test batch finds the index snowplot index wrote in the same directory
+    """
+    import snowplot.batch
+
+    template = join(str(tmpdir), 'template.ini')
+    with open(template, 'w') as fp:
+        fp.write(f'[snow_micropen]\nfilename: {join(data, "smp", "smp.pnt")}'
+                 f'\n[output]\noutput_dir: {tmpdir}\n')
+
+    rendered = []
+    monkeypatch.setattr(snowplot.batch, 'run_batch',
+                        lambda jobs, **kwargs: rendered.extend(jobs) or {})
+    where = "profile_type = 'SnowMicroPen'"
+
+    # Nothing indexed yet
+    monkeypatch.chdir(str(tmpdir))
+    assert batch_cli(['--template', template, '--where', where, data]) == 1
+    assert 'No index found' in capsys.readouterr().out
+    assert not os.path.isfile(join(data, 'snowplot_index.sqlite'))
+
+    assert index_cli([data]) == 0
+    assert batch_cli(['--template', template, '--where', where, data]) == 0
+    assert [j[0] for j in rendered] == [join(data, 'smp', 'smp.pnt')]
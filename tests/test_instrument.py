@@ -0,0 +1,65 @@
+from snowplot.instrument import StageRecorder, stage
+from snowplot.figure import make_vertical_plot
+from os.path import join
+import numpy as np
+import json
+import pytest
+
+
+class TestStageRecorder:
+
+    def test_not_recording(self):
+        """
+        Test stages do nothing without a recorder
+        """
+        with stage('open') as entry:
+            assert entry is None
+
+    def test_nested_stages(self):
+        recorder = StageRecorder()
+        with recorder.recording():
+            with stage('load'):
+                with stage('open'):
+                    data = np.ones(1000000)
+                with stage('processing'):
+                    data = data * 2
+        stages = {s['stage']: s for s in recorder.stages}
+
+        assert list(stages.keys()) == ['load', 'load/open', 'load/processing']
+        assert stages['load/open']['allocated_mb'] >= 8
+        # The peak of the parent includes the peak of its children
+        assert stages['load']['peak_mb'] >= stages['load/processing']['peak_mb']
+        assert stages['load']['seconds'] >= stages['load/open']['seconds']
+
+    def test_without_memory(self):
+        recorder = StageRecorder(memory=False)
+        with recorder.recording():
+            with stage('open'):
+                pass
+        assert 'peak_mb' not in recorder.stages[0].keys()
+        assert recorder.report()['memory'] is False
+
+
+def test_profile_report(data_dir, tmpdir):
+    """
+    Test making a figure writes a report with stages for each profile
+    """
+    cfg = join(str(tmpdir), 'config.ini')
+    with open(cfg, 'w') as fp:
+        fp.write(f'[hand_hardness]\nfilename: '
+                 f'{join(data_dir, "hand_hardness.txt")}\n'
+                 f'[output]\noutput_dir: {tmpdir}\nfilename: figure.png\n'
+                 f'show_plot: False\n')
+
+    report_file = join(str(tmpdir), 'report.json')
+    make_vertical_plot(cfg, profile_report=report_file)
+
+    with open(report_file) as fp:
+        report = json.load(fp)
+
+    names = [s['stage'] for s in report['stages']]
+    for name in ['check_config', 'generate_config', 'build_figure',
+                 'build_figure/handhardness/load/open',
+                 'build_figure/handhardness/layered_profile',
+                 'build_figure/savefig']:
+        assert f'make_vertical_plot/{name}' in names
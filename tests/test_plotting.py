@@ -0,0 +1,155 @@
+from snowplot.plotting import (build_figure, decimate, lttb_decimate,
+                                minmax_decimate)
+from snowplot.figure import build_profiles
+from inicheck.tools import get_user_config
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import tracemalloc
+import logging
+import gc
+import pytest
+import io
+
+
+@pytest.fixture()
+def profile():
+    depth = np.linspace(-100, 0, 10000)
+    values = np.sin(depth) * 100 + np.random.default_rng(0).normal(size=len(depth))
+    return depth, values
+
+
+@pytest.mark.parametrize('n_bins', [10, 100, 1000])
+def test_minmax_decimate(profile, n_bins):
+    """
+    Test the envelope of the profile is kept in every bin
+    """
+    depth, values = profile
+    d, v = minmax_decimate(depth, values, n_bins)
+    assert len(d) <= 2 * n_bins + 2
+    assert v.max() == values.max()
+    assert v.min() == values.min()
+    assert d[0] == depth[0]
+    assert d[-1] == depth[-1]
+    assert np.all(np.diff(d) > 0)
+
+
+def test_minmax_decimate_small(profile):
+    """
+    Test profiles with fewer points than the bins are left alone
+    """
+    depth, values = profile
+    d, v = minmax_decimate(depth[0:10], values[0:10], 100)
+    assert len(d) == 10
+
+
+@pytest.mark.parametrize('n_out', [3, 50, 500])
+def test_lttb_decimate(profile, n_out):
+    depth, values = profile
+    d, v = lttb_decimate(depth, values, n_out)
+    assert len(d) == n_out
+    assert d[0] == depth[0]
+    assert d[-1] == depth[-1]
+    assert np.all(np.diff(d) > 0)
+
+
+@pytest.mark.parametrize('method', ['minmax', 'lttb'])
+def test_decimate_limits(profile, method):
+    """
+    Test only the visible range is kept plus a point beyond each edge
+    """
+    depth, values = profile
+    d, v = decimate(depth, values, 100, method=method, limits=[-20, -50])
+    assert d.min() < -50
+    assert d.max() > -20
+    assert d[1] >= -50
+    assert d[-2] <= -20
+    assert len(d) <= 202
+
+
+def test_decimate_unknown_method(profile):
+    with pytest.raises(ValueError):
+        decimate(*profile, 100, method='bogus')
+
+
+class TestBuildFigure:
+
+    @pytest.fixture()
+    def cfg(self, data_dir, tmpdir):
+        f = join(str(tmpdir), 'config.ini')
+        with open(f, 'w') as fp:
+            fp.write(f'[hand_hardness]\n'
+                     f'filename: {join(data_dir, "hand_hardness.txt")}\n'
+                     f'[output]\ndpi: 37\nshow_plot: False\n')
+        return get_user_config(f, modules=['snowplot']).cfg
+
+    def render(self, cfg, reuse=False):
+        fig = build_figure(build_profiles(cfg), cfg, reuse=reuse)
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png')
+        return fig, buf.getvalue()
+
+    def test_no_global_state(self, cfg):
+        """
+        Test building a figure leaves pyplot and rcParams alone
+        """
+        dpi = matplotlib.rcParams['figure.dpi']
+        fig, image = self.render(cfg)
+
+        assert plt.get_fignums() == []
+        assert matplotlib.rcParams['figure.dpi'] == dpi
+        assert fig.dpi == 37
+        assert image.startswith(b'\x89PNG')
+
+    def test_reuse(self, cfg):
+        """
+        Test the figure and canvas are reused and cleared between renders
+        """
+        fig, image = self.render(cfg, reuse=True)
+        canvas = fig.canvas
+        for i in range(3):
+            fig2, image2 = self.render(cfg, reuse=True)
+
+        assert fig2 is fig
+        assert fig2.canvas is canvas
+        assert len(fig2.axes) == 1
+        assert len(fig2.axes[0].lines) == 1
+        assert image2 == image
+        assert self.render(cfg)[0] is not fig
+
+    def test_reuse_memory(self, cfg):
+        """
+        Test memory stays flat over many renders
+        """
+        # Captured log records would otherwise grow with every render
+        logging.disable(logging.CRITICAL)
+        try:
+            for i in range(3):
+                self.render(cfg, reuse=True)
+
+            tracemalloc.start()
+            for i in range(2):
+                self.render(cfg, reuse=True)
+            gc.collect()
+            start = tracemalloc.get_traced_memory()[0]
+            for i in range(10):
+                self.render(cfg, reuse=True)
+            gc.collect()
+            end = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+        finally:
+            logging.disable(logging.NOTSET)
+
+        assert (end - start) / 1e6 < 0.5
+
+    def test_threads(self, cfg):
+        """
+        Test rendering from several threads at once
+        """
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda i: self.render(cfg, reuse=True)[1],
+                                    range(12)))
+
+        assert all(r == results[0] for r in results)
@@ -0,0 +1,80 @@
+from snowplot.pnt import get_coordinates, read_header, read_pnt
+from snowmicropyn import Profile as SMP
+from os.path import join
+import numpy as np
+import struct
+import pytest
+
+
+@pytest.fixture()
+def smp_file(data_dir):
+    return join(data_dir, 'smp.pnt')
+
+
+def test_read_header(smp_file):
+    """
+    Test the header matches snowmicropyn without reading the samples
+    """
+    header = read_header(smp_file)
+    p = SMP.load(smp_file)
+
+    assert header['timestamp'] == p.timestamp
+    assert header['coordinates'] == p.coordinates
+    assert header['samples_count'] == len(p)
+    assert header['spatial_resolution'] == p.spatial_resolution
+
+
+def test_read_pnt(smp_file):
+    """
+    Test the force and depth match snowmicropyn converted to mN and cm
+    """
+    header, df = read_pnt(smp_file)
+    p = SMP.load(smp_file)
+    expected = p.samples.iloc[::-1]
+
+    assert df.index.name == 'depth'
+    assert df.index.is_monotonic_increasing
+    assert df.index[-1] == 0
+    np.testing.assert_allclose(df.index.values,
+                               expected['distance'].values / -10)
+    np.testing.assert_allclose(df['force'].values,
+                               expected['force'].values * 1000)
+
+
+@pytest.mark.parametrize('size', [100, 1000])
+def test_truncated(smp_file, tmpdir, size):
+    f = join(str(tmpdir), 'truncated.pnt')
+    with open(smp_file, 'rb') as fp:
+        raw = fp.read(size)
+    with open(f, 'wb') as fp:
+        fp.write(raw)
+
+    with pytest.raises(ValueError):
+        read_pnt(f)
+
+
+@pytest.mark.parametrize('latitude, longitude, north, east, expected', [
+    (46.8, 9.8, 'N', 'E', (46.8, 9.8)),
+    (43.5, 116.1, 'N', 'W', (43.5, -116.1)),
+    # Not measured or invalid
+    (-99999, 9.8, 'S', 'E', None),
+    (91, 9.8, 'N', 'E', None),
+])
+def test_get_coordinates(latitude, longitude, north, east, expected):
+    assert get_coordinates(latitude, longitude, north, east) == expected
+
+
+def test_coordinates(smp_file, tmpdir):
+    """
+    Test coordinates written to the header match snowmicropyn
+    """
+    with open(smp_file, 'rb') as fp:
+        raw = bytearray(fp.read())
+    struct.pack_into('>ff', raw, 264, 43.5, 116.1)
+    struct.pack_into('>cc', raw, 280, b'N', b'W')
+
+    f = join(str(tmpdir), 'located.pnt')
+    with open(f, 'wb') as fp:
+        fp.write(raw)
+
+    assert read_header(f)['coordinates'] == SMP.load(f).coordinates
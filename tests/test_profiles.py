@@ -2,7 +2,9 @@ from snowplot.profiles import *
 import pytest
 from os.path import join, dirname, isfile
 from inicheck.tools import get_user_config
+import json
 import os
+import shutil
 
 
 class TestHandHardnessProfile:
@@ -40,6 +42,43 @@ class TestHandHardnessProfile:
         """
         assert profile.scale[letter_value] == numeric
 
+    @pytest.mark.parametrize("cfg_dict", [{}])
+    def test_read_simple_text_sources(self, profile, data_dir, cfg_dict):
+        """
+        Test paths, open files and lists of lines all parse the same
+        """
+        filename = join(data_dir, 'hand_hardness.txt')
+        expected = profile.read_simple_text(filename)
+
+        with open(filename) as fp:
+            assert profile.read_simple_text(fp).equals(expected)
+
+        with open(filename) as fp:
+            lines = fp.readlines()
+        assert profile.read_simple_text(lines).equals(expected)
+
+    @pytest.mark.parametrize("cfg_dict, lines, expected", [
+        ({}, ['10-0 = F, 4F\n'], [[0, 'F', 2], [-10, '4F', 5]]),
+        ({}, ['20-10 = P\n', '10-0 = 1F\n'], [[0, 'P', 11], [-10, 'P', 11],
+                                             [-10, '1F', 8], [-20, '1F', 8]]),
+    ])
+    def test_read_simple_text(self, profile, cfg_dict, lines, expected):
+        df = profile.read_simple_text(lines)
+        assert df[['depth', 'hardness', 'numeric']].values.tolist() == expected
+
+    @pytest.mark.parametrize("cfg_dict, lines, bad_lines", [
+        ({}, ['20-10 = P\n', '10-0 = X\n'], ['Line #2']),
+        ({}, ['20 = P\n', '10-0 = F = P\n', '5-0 = F\n'], ['Line #1', 'Line #2']),
+    ])
+    def test_read_simple_text_errors(self, profile, cfg_dict, lines, bad_lines):
+        """
+        Test bad lines are reported by their line number
+        """
+        with pytest.raises(ValueError) as e:
+            profile.read_simple_text(lines)
+        for line in bad_lines:
+            assert line in str(e.value)
+
 
 class TestGrainSizeProfile:
     section = 'grain_size'
@@ -70,3 +109,320 @@ class TestGrainSizeProfile:
     def test_profile_read(self, profile, cfg_dict):
         profile.open()
         print(profile)
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({})
+    ])
+    def test_get_layered_profile(self, profile, cfg_dict):
+        """
+        Test each layer is outlined with zeros at its top and bottom
+        """
+        df = profile.get_layered_profile()
+        nlayers = len(profile.df['layer_number'].unique())
+        assert len(df.index) == len(profile.df.index) + 2 * nlayers
+
+        # First layer is 100-97 cm inverted to 0 to -3 cm
+        assert df['numeric'].values[0:4].tolist() == [0, 1, 1, 0]
+        assert df['depth'].values[0:4].tolist() == [0, 0, -3, -3]
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({})
+    ])
+    def test_get_layered_profile_memoized(self, profile, cfg_dict):
+        """
+        Test the outlined profile is reused until the data changes
+        """
+        df = profile.get_layered_profile()
+        assert profile.get_layered_profile() is df
+
+        profile.df = profile.df.iloc[0:4]
+        assert profile.get_layered_profile() is not df
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({})
+    ])
+    def test_read_snowex_header(self, profile, cfg_dict):
+        assert profile.header_info['PitID'] == 'COGM3N22_20200128'
+        assert profile.df.index.max() == 0
+        assert profile.df.index.min() == -100
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({})
+    ])
+    def test_read_snowex_unknown_value(self, profile, cfg_dict, tmpdir):
+        f = join(str(tmpdir), 'bad.csv')
+        with open(f, mode='w+') as fp:
+            fp.write('# Top (cm),Bottom (cm),Grain Size (mm)\n')
+            fp.write('10.0,0.0,huge\n')
+
+        with pytest.raises(ValueError) as e:
+            profile.read_snowex_csv(f)
+        assert 'huge' in str(e.value)
+
+
+class TestLyteProbeProfile:
+    section = 'lyte_probe'
+
+    @pytest.fixture()
+    def config(self, cfg_dict):
+        s = f'[{self.section}]\n'
+        for k, v in cfg_dict.items():
+            s += f'{k}: {v}\n'
+        f = join(dirname(__file__), 'config.ini')
+        s += '[output]\n'
+        with open(f, mode='w+') as fp:
+            fp.write(s)
+        ucfg = get_user_config(f, modules=['snowplot'])
+        yield ucfg.cfg[self.section]
+        if isfile(f):
+            os.remove(f)
+
+    @pytest.fixture()
+    def profile(self, data_dir, config):
+        filename = join(data_dir, 'lyte_profile.csv')
+        config['filename'] = filename
+        return LyteProbeProfile(**config)
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({})
+    ])
+    def test_open_columns(self, profile, cfg_dict):
+        """
+        Test only the columns used in processing are read
+        """
+        assert sorted(profile.df.columns) == ['Sensor1', 'Sensor2', 'Sensor3',
+                                              'acceleration', 'time']
+        assert profile.column_to_plot == 'Sensor1'
+        assert profile.data_type == 'radicl'
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({'dtype': 'float32'}),
+    ])
+    def test_open_low_memory(self, profile, data_dir, cfg_dict):
+        """
+        Test reduced precision reads match the default
+        """
+        cfg = get_user_config(join(dirname(__file__), 'config.ini'),
+                              modules=['snowplot']).cfg[self.section]
+        cfg.update({'filename': join(data_dir, 'lyte_profile.csv'),
+                    'dtype': 'float64'})
+        expected = LyteProbeProfile(**cfg)
+
+        assert profile.df['Sensor2'].dtype == np.float32
+        assert len(profile.df.index) == len(expected.df.index)
+        # Samples at the same depth can sort differently at float32
+        np.testing.assert_allclose(np.sort(profile.df['Sensor1'].values),
+                                   np.sort(expected.df['Sensor1'].values))
+        np.testing.assert_allclose(profile.df.index.values,
+                                   expected.df.index.values, rtol=1e-6)
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({})
+    ])
+    def test_lazy_load(self, profile, cfg_dict):
+        """
+        Test the header is available without loading and the data loads on
+        first access and can be released
+        """
+        assert not profile.is_loaded
+        assert profile.header_info['MODEL NUMBER'] == '3'
+        assert not profile.is_loaded
+
+        assert len(profile.df.index) > 0
+        assert profile.is_loaded
+
+        profile.release()
+        assert not profile.is_loaded
+        profile.load()
+        assert profile.is_loaded
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({'autocrop': True, 'event_sidecar': True})
+    ])
+    def test_event_sidecar(self, profile, cfg_dict, tmpdir, monkeypatch):
+        """
+        Test detected events are stored and reused and events set by hand
+        replace them
+        """
+        import study_lyte.detect
+        from snowplot.cache import ProfileCache
+        from snowplot.events import EventSidecar
+
+        cfg = get_user_config(join(dirname(__file__), 'config.ini'),
+                              modules=['snowplot']).cfg[self.section]
+        cfg['filename'] = join(str(tmpdir), 'lyte.csv')
+        shutil.copy(profile.filename, cfg['filename'])
+
+        n = len(LyteProbeProfile(**cfg).df.index)
+        sidecar = EventSidecar(cfg['filename'])
+        assert isfile(sidecar.path)
+        assert sidecar.get_manual() == {}
+
+        # Stored events are used without detecting them
+        def fail(*args, **kwargs):
+            raise AssertionError('Events were detected again')
+
+        monkeypatch.setattr(study_lyte.detect, 'get_acceleration_start', fail)
+        assert len(LyteProbeProfile(**cfg).df.index) == n
+
+        cache = ProfileCache(join(str(tmpdir), 'cache'))
+        key = cache.get_key(LyteProbeProfile(**cfg))
+
+        with open(sidecar.path) as fp:
+            entry = json.load(fp)
+        entry['manual']['stop'] = entry['detected']['stop'] - 100
+        with open(sidecar.path, 'w') as fp:
+            json.dump(entry, fp)
+
+        assert len(LyteProbeProfile(**cfg).df.index) == n - 100
+        # Cached profiles cropped with the old events are not reused
+        assert cache.get_key(LyteProbeProfile(**cfg)) != key
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({'depth_method': 'acc'}),
+        ({'depth_method': 'avg'}),
+        ({'depth_method': 'acc', 'dtype': 'float32'}),
+    ])
+    def test_depth_from_acceleration(self, profile, cfg_dict):
+        """
+        Test the accelerometer depth is used or averaged with the barometer
+        """
+        cfg = get_user_config(join(dirname(__file__), 'config.ini'),
+                              modules=['snowplot']).cfg[self.section]
+        cfg.update({'filename': profile.filename, 'depth_method': 'baro',
+                    'dtype': 'float64'})
+        baro = LyteProbeProfile(**cfg).df.sort_values('time')
+
+        df = profile.df.sort_values('time')
+        assert not df['acc_depth'].isnull().any()
+        np.testing.assert_array_equal(df['Sensor1'].values,
+                                      baro['Sensor1'].values)
+
+        if cfg_dict['depth_method'] == 'acc':
+            np.testing.assert_array_equal(df.index.values,
+                                          df['acc_depth'].values)
+        else:
+            np.testing.assert_allclose(
+                df.index.values,
+                (baro.index.values + df['acc_depth'].values) / 2)
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({'smoothing': 25}),
+        ({'smoothing_depth': 2.0}),
+        ({'smoothing_depth': 2.0, 'smoothing_method': 'median'}),
+        ({'smoothing_depth': 2.0, 'smoothing_method': 'savgol'}),
+        ({'smoothing_depth': 2.0, 'smoothing_method': 'gaussian'}),
+    ])
+    def test_smoothing(self, profile, cfg_dict):
+        """
+        Test only the plotted column is smoothed and no NaNs are added
+        """
+        cfg = get_user_config(join(dirname(__file__), 'config.ini'),
+                              modules=['snowplot']).cfg[self.section]
+        cfg.update({'filename': profile.filename, 'smoothing': None,
+                    'smoothing_depth': None})
+        raw = LyteProbeProfile(**cfg)
+
+        df = profile.df
+        assert not df['Sensor1'].isnull().any()
+        assert df['Sensor1'].std() < raw.df['Sensor1'].std()
+        np.testing.assert_array_equal(df['Sensor2'].values,
+                                      raw.df['Sensor2'].values)
+
+
+class TestSnowMicroPenProfile:
+    section = 'snow_micropen'
+
+    @pytest.fixture()
+    def config(self, cfg_dict):
+        s = f'[{self.section}]\n'
+        for k, v in cfg_dict.items():
+            s += f'{k}: {v}\n'
+        f = join(dirname(__file__), 'config.ini')
+        s += '[output]\n'
+        with open(f, mode='w+') as fp:
+            fp.write(s)
+        ucfg = get_user_config(f, modules=['snowplot'])
+        yield ucfg.cfg[self.section]
+        if isfile(f):
+            os.remove(f)
+
+    @pytest.fixture()
+    def profile(self, data_dir, config):
+        filename = join(data_dir, 'smp.pnt')
+        config['filename'] = filename
+        return SnowMicroPenProfile(**config)
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({})
+    ])
+    def test_readers(self, profile, config, cfg_dict):
+        """
+        Test the native reader matches snowmicropyn
+        """
+        expected = SnowMicroPenProfile(**dict(config, reader='snowmicropyn'))
+
+        assert profile.reader == 'native'
+        assert profile.header_info == expected.header_info
+        np.testing.assert_allclose(profile.df.index.values,
+                                   expected.df.index.values)
+        np.testing.assert_allclose(profile.df['force'].values,
+                                   expected.df['force'].values)
+        np.testing.assert_allclose(profile.xlimits, expected.xlimits)
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({})
+    ])
+    def test_header_only(self, profile, cfg_dict):
+        """
+        Test the header is read without loading the samples
+        """
+        assert profile.header_info['timestamp'].year == 2001
+        assert not profile.is_loaded
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({})
+    ])
+    def test_fallback(self, profile, cfg_dict, monkeypatch):
+        """
+        Test snowmicropyn is used when the native reader fails
+        """
+        import snowplot.pnt
+
+        def fail(*args, **kwargs):
+            raise ValueError('bad pnt')
+
+        monkeypatch.setattr(snowplot.pnt, 'read_pnt', fail)
+        monkeypatch.setattr(snowplot.pnt, 'read_header', fail)
+
+        assert profile.header_info['timestamp'].year == 2001
+        assert len(profile.df.index) > 0
+        assert 'distance' in profile.df.columns
+
+    @pytest.mark.parametrize('cfg_dict', [
+        ({'bin_size': 0.1}),
+        ({'bin_size': 0.1, 'chunk_size': 1000, 'fill_range': True}),
+    ])
+    def test_bin_size(self, profile, config, cfg_dict):
+        """
+        Test the force is reduced to bins plotting the median
+        """
+        raw = SnowMicroPenProfile(**dict(config, bin_size=None))
+        df = profile.df
+
+        assert profile.column_to_plot == 'median'
+        assert list(df.columns) == ['mean', 'median', 'min', 'max',
+                                    'texture', 'count']
+        assert df['count'].sum() == len(raw.df.index)
+        assert np.all(np.diff(df.index.values) > 0)
+        assert df['min'].min() == raw.df['force'].min()
+        assert df['max'].max() == raw.df['force'].max()
+
+        assert profile.is_envelope_data == cfg_dict.get('fill_range', False)
+        if profile.is_envelope_data:
+            assert profile.envelope_columns == ('min', 'max')
+            assert not profile.fill_solid
+            # The shaded range fits in the plot
+            assert profile.xlimits == [df['min'].min(), df['max'].max()]
+        else:
+            assert profile.xlimits == [df['median'].min(), df['median'].max()]
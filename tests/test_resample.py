@@ -0,0 +1,85 @@
+from snowplot.resample import make_grid, resample, resample_profiles
+from snowplot.figure import build_profiles
+from inicheck.tools import get_user_config
+from os.path import join
+import numpy as np
+import pytest
+
+
+def test_make_grid():
+    np.testing.assert_allclose(make_grid(0.5, -2), [0, -0.5, -1, -1.5, -2])
+    np.testing.assert_allclose(make_grid(1, -2.5, top=-1), [-1, -2])
+
+    with pytest.raises(ValueError):
+        make_grid(0, -2)
+
+
+@pytest.mark.parametrize('method, depth, values, expected', [
+    # Between samples only, unsorted
+    ('interp', [-0.5, -2.5, -1.5], [1, 3, 2], [np.nan, 1.5, 2.5, np.nan]),
+    # Samples within half a spacing, NaNs and samples below the grid dropped
+    ('mean', [-3.1, -1.2, -0.9, -0.1, -1.8, -5], [4, 2, 3, 1, np.nan, 6],
+     [1, 2.5, np.nan, 4]),
+])
+def test_resample(method, depth, values, expected):
+    grid = np.array([0, -1, -2, -3.])
+    np.testing.assert_allclose(resample(depth, values, grid, method=method),
+                               expected)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        resample([0, -1], [1, 2], make_grid(1, -1), method='bogus')
+
+
+class TestResampleProfiles:
+
+    @pytest.fixture()
+    def profiles(self, data_dir, tmpdir):
+        f = join(str(tmpdir), 'config.ini')
+        with open(f, 'w') as fp:
+            fp.write(f'[lyte_probe]\n'
+                     f'filename: {join(data_dir, "lyte_profile.csv")}\n'
+                     f'[snow_micropen]\n'
+                     f'filename: {join(data_dir, "smp.pnt")}\nplot_id: 2\n'
+                     f'[hand_hardness]\n'
+                     f'filename: {join(data_dir, "hand_hardness.txt")}\n'
+                     f'plot_id: 3\n'
+                     f'[output]\n')
+        cfg = get_user_config(f, modules=['snowplot']).cfg
+        return list(build_profiles(cfg).values())
+
+    @pytest.mark.parametrize('method', ['interp', 'mean'])
+    def test_shared_grid(self, profiles, method):
+        """
+        Test every profile lands on one grid reaching the deepest sample and
+        profiles are released after
+        """
+        grid, data = resample_profiles(profiles, spacing=0.5, method=method)
+        deepest = min([p.df.index.min() for p in profiles])
+        for p in profiles:
+            p.release()
+
+        assert data.shape == (len(profiles), len(grid))
+        assert grid[0] == 0
+        assert grid[-1] - 0.5 < deepest <= grid[-1] + 0.5
+        assert not any([p.is_loaded for p in profiles])
+
+        # Each profile has data down to its deepest sample
+        for p, row in zip(profiles, data):
+            valid = grid[np.isfinite(row)]
+            assert valid.min() >= p.df.index.min() - 0.5
+
+    def test_matches_profile(self, profiles):
+        """
+        Test resampled values stay within the range of the profile
+        """
+        grid, data = resample_profiles(profiles[:1], spacing=1.0,
+                                       bottom=-50, dtype='float32')
+        df = profiles[0].df
+        c = profiles[0].column_to_plot
+
+        assert data.dtype == np.float32
+        assert len(grid) == 51
+        row = data[0][np.isfinite(data[0])]
+        assert row.min() >= df[c].min() and row.max() <= df[c].max()
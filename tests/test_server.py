@@ -0,0 +1,204 @@
+from snowplot.server import RenderServer, get_path_overrides
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from os.path import join
+import threading
+import time
+import shutil
+import os
+import json
+import pytest
+
+
+def start_server(root, **kwargs):
+    server = RenderServer(('127.0.0.1', 0), n_workers=1, max_requests=2,
+                          root=root, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture(scope='module')
+def server(data_dir):
+    server = start_server(data_dir)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, data):
+    req = Request(url + '/render', data=json.dumps(data).encode(),
+                  headers={'Content-Type': 'application/json'})
+    return urlopen(req, timeout=60)
+
+
+def get_url(server):
+    return 'http://{}:{}'.format(*server.server_address[0:2])
+
+
+def test_get_path_overrides(data_dir, tmpdir):
+    """
+    Test paths in a posted config are rebased on the root and the cache is off
+    """
+    f = join(str(tmpdir), 'config.ini')
+    with open(f, 'w') as fp:
+        fp.write('[hand_hardness]\nfilename: hand_hardness.txt\n'
+                 '[output]\ncache_dir: cache\n')
+
+    overrides = get_path_overrides(f, data_dir)
+    assert overrides['hand_hardness']['filename'] == \
+        join(os.path.realpath(data_dir), 'hand_hardness.txt')
+    assert overrides['output'] == {'cache_dir': None}
+
+
+@pytest.mark.parametrize('filename', ['/etc/passwd', '../conftest.py'])
+def test_get_path_overrides_outside(data_dir, tmpdir, filename):
+    f = join(str(tmpdir), 'config.ini')
+    with open(f, 'w') as fp:
+        fp.write(f'[hand_hardness]\nfilename: {filename}\n')
+
+    with pytest.raises(ValueError):
+        get_path_overrides(f, data_dir)
+
+
+class TestRenderServer:
+
+    @pytest.fixture()
+    def url(self, server):
+        return 'http://{}:{}'.format(*server.server_address[0:2])
+
+    def post(self, url, data):
+        return post(url, data)
+
+    @pytest.mark.parametrize('fmt, content_type, magic', [
+        ('png', 'image/png', b'\x89PNG'),
+        ('svg', 'image/svg+xml', b'<?xml'),
+    ])
+    def test_render_config(self, url, fmt, content_type, magic):
+        """
+        Test rendering a config posted as text with paths relative to the root
+        """
+        config = '[grain_size]\nfilename: snowex_stratigraphy.csv\n' \
+                 '[output]\ndpi: 50\n'
+        resp = self.post(url, {'config': config, 'format': fmt})
+        assert resp.headers['Content-Type'] == content_type
+        assert resp.read().startswith(magic)
+
+    @pytest.mark.parametrize('path', ['/etc/passwd', '../conftest.py'])
+    def test_render_path_outside(self, url, path):
+        """
+        Test config files outside of the root are refused
+        """
+        with pytest.raises(HTTPError) as e:
+            self.post(url, {'path': path})
+        assert e.value.code == 400
+        assert 'outside of the server root' in json.loads(e.value.read())[
+            'error']
+
+    @pytest.mark.parametrize('data', [
+        {'config': '[hand_hardness]\nfilename: missing.txt\n[output]\n'},
+        {'config': '[hand_hardness]\nfilename: ../conftest.py\n[output]\n'},
+        {'path': 'missing.ini'},
+        {'config': '[output]\n', 'format': 'gif'},
+        {},
+    ])
+    def test_render_errors(self, url, data):
+        with pytest.raises(HTTPError) as e:
+            self.post(url, data)
+        assert e.value.code == 400
+
+        # Tracebacks stay in the server log
+        assert 'Traceback' not in json.loads(e.value.read())['error']
+
+    def test_metrics(self, url):
+        self.post(url, {'config': '[grain_size]\nfilename: '
+                                  'snowex_stratigraphy.csv\n[output]\n'})
+        metrics = json.loads(urlopen(url + '/metrics').read())
+        assert metrics['rendered'] >= 1
+        assert metrics['in_flight'] == 0
+        assert metrics['latency']['p95'] > 0
+
+    def test_posted_cache_dir(self, url, tmpdir):
+        """
+        Test a posted config can't choose where cached profiles are read from
+        """
+        cache_dir = join(str(tmpdir), 'cache')
+        self.post(url, {'config': '[hand_hardness]\nfilename: '
+                                  'hand_hardness.txt\n[output]\n'
+                                  f'cache_dir: {cache_dir}\n'})
+        assert not os.path.isdir(cache_dir)
+
+
+def test_render_path(data_dir, tmpdir):
+    """
+    Test a config file in the root is rendered with its paths relative to it
+    and its data paths and cache confined to the root
+    """
+    root = str(tmpdir)
+    os.makedirs(join(root, 'configs'))
+    shutil.copy(join(data_dir, 'hand_hardness.txt'), root)
+    cache_dir = join(root, 'cache')
+    configs = {'good.ini': '../hand_hardness.txt',
+               'outside.ini': join(data_dir, 'hand_hardness.txt')}
+    for name, filename in configs.items():
+        with open(join(root, 'configs', name), 'w') as fp:
+            fp.write(f'[hand_hardness]\nfilename: {filename}\n'
+                     f'[output]\ncache_dir: {cache_dir}\n')
+
+    server = start_server(root)
+    try:
+        resp = post(get_url(server), {'path': 'configs/good.ini'})
+        assert resp.read().startswith(b'\x89PNG')
+        assert not os.path.isdir(cache_dir)
+
+        with pytest.raises(HTTPError) as e:
+            post(get_url(server), {'path': 'configs/outside.ini'})
+        assert e.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_timeout(data_dir):
+    """
+    Test a timed out render responds 504 and holds its slot until it ends
+    """
+    server = start_server(data_dir, render_timeout=0.01)
+    try:
+        with pytest.raises(HTTPError) as e:
+            post(get_url(server), {'config': '[grain_size]\nfilename: '
+                                             'snowex_stratigraphy.csv\n'
+                                             '[output]\n'})
+        assert e.value.code == 504
+
+        for i in range(600):
+            if server.metrics.summary()['in_flight'] == 0:
+                break
+            time.sleep(0.1)
+        assert server.metrics.summary()['in_flight'] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_broken_pool(data_dir):
+    """
+    Test a worker dying responds 500 and the workers are restarted
+    """
+    server = start_server(data_dir)
+    config = {'config': '[grain_size]\nfilename: snowex_stratigraphy.csv\n'
+                        '[output]\ndpi: 50\n'}
+    try:
+        broken = server.pool
+        with pytest.raises(Exception):
+            broken.submit(os._exit, 1).result(timeout=60)
+
+        with pytest.raises(HTTPError) as e:
+            post(get_url(server), config)
+        assert e.value.code == 500
+        assert server.pool is not broken
+
+        assert post(get_url(server), config).read().startswith(b'\x89PNG')
+    finally:
+        server.shutdown()
+        server.server_close()
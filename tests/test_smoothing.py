@@ -0,0 +1,78 @@
+from snowplot.smoothing import moving_mean, smooth_depth, smooth_samples
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture()
+def signal():
+    rng = np.random.default_rng(0)
+    depth = np.sort(rng.uniform(-100, 0, 5000))
+    values = np.sin(depth / 10) + rng.normal(0, 0.2, len(depth))
+    return depth, values
+
+
+def test_moving_mean():
+    """
+    Test the mean matches a centered pandas rolling mean
+    """
+    values = np.random.default_rng(0).normal(size=1000)
+    expected = pd.Series(values).rolling(11, center=True, min_periods=1).mean()
+    np.testing.assert_allclose(moving_mean(values, 11), expected.values)
+
+
+@pytest.mark.parametrize('method', ['mean', 'median', 'savgol', 'gaussian'])
+def test_smooth_samples(method):
+    """
+    Test every method keeps the length, adds no NaNs and leaves a constant
+    signal alone
+    """
+    values = np.full(100, 3.0)
+    smoothed = smooth_samples(values, 10, method=method)
+    assert len(smoothed) == 100
+    np.testing.assert_allclose(smoothed, 3.0)
+
+
+def test_smooth_samples_unknown():
+    with pytest.raises(ValueError):
+        smooth_samples(np.ones(10), 3, method='bogus')
+
+
+@pytest.mark.parametrize('method', ['mean', 'median', 'savgol', 'gaussian'])
+def test_smooth_depth(signal, method):
+    """
+    Test smoothing unevenly spaced data reduces the noise but keeps the shape
+    """
+    depth, values = signal
+    smoothed = smooth_depth(depth, values, 2.0, method=method)
+    truth = np.sin(depth / 10)
+
+    assert not np.isnan(smoothed).any()
+    assert np.abs(smoothed - truth).mean() < np.abs(values - truth).mean() / 2
+
+
+def test_smooth_depth_window_in_depth(signal):
+    """
+    Test the window is the same physical width regardless of sample density
+    """
+    depth = np.linspace(-100, 0, 1001)
+    values = (depth > -50).astype(float)
+
+    coarse = smooth_depth(depth, values, 10)
+    fine_depth = np.linspace(-100, 0, 10001)
+    fine = smooth_depth(fine_depth, (fine_depth > -50).astype(float), 10)
+
+    np.testing.assert_allclose(coarse, np.interp(depth, fine_depth, fine),
+                               atol=0.01)
+
+
+def test_smooth_depth_order_and_nans():
+    """
+    Test unsorted depths are returned in their order and NaNs are kept
+    """
+    depth = np.array([0, -3, -1, -2, -4, -5], dtype=float)
+    values = np.array([0, 3, 1, np.nan, 4, 5], dtype=float)
+    smoothed = smooth_depth(depth, values, 0.1)
+
+    assert np.isnan(smoothed[3])
+    np.testing.assert_allclose(smoothed[[0, 1, 2, 4, 5]], [0, 3, 1, 4, 5])
@@ -1,4 +1,6 @@
-from snowplot.utilities import titlize
+from snowplot.utilities import titlize, write_file
+from os.path import join
+import os
 import pytest
 
 @pytest.mark.parametrize('label, expected',[
@@ -8,3 +10,23 @@ import pytest
 ])
 def test_titlize(label, expected):
     assert titlize(label) == expected
+
+
+def test_write_file(tmpdir):
+    """
+    Test the file is replaced whole and a failed write leaves no temp file
+    """
+    f = join(str(tmpdir), 'out.txt')
+    write_file(f, lambda fp: fp.write('first'), mode='w')
+    write_file(f, lambda fp: fp.write(b'second'))
+
+    def fail(fp):
+        fp.write(b'partial')
+        raise ValueError('Write failed')
+
+    with pytest.raises(ValueError):
+        write_file(f, fail)
+
+    with open(f) as fp:
+        assert fp.read() == 'second'
+    assert os.listdir(str(tmpdir)) == ['out.txt']
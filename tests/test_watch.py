@@ -0,0 +1,99 @@
+from snowplot.watch import ConfigWatcher
+from os.path import isfile, join
+import os
+import shutil
+import pytest
+
+
+class TestConfigWatcher:
+
+    @pytest.fixture()
+    def files(self, data_dir, tmpdir):
+        """
+        Copies of the data so they can be modified
+        """
+        d = str(tmpdir)
+        for f in ['hand_hardness.txt', 'snowex_stratigraphy.csv']:
+            shutil.copy(join(data_dir, f), join(d, f))
+        return d
+
+    def write_config(self, d, title='Hand Hardness'):
+        f = join(d, 'config.ini')
+        with open(f, 'w') as fp:
+            fp.write(f'[hand_hardness]\n'
+                     f'filename: {join(d, "hand_hardness.txt")}\n'
+                     f'title: {title}\n'
+                     f'[grain_size]\n'
+                     f'filename: {join(d, "snowex_stratigraphy.csv")}\n'
+                     f'plot_id: 2\n'
+                     f'[output]\n'
+                     f'output_dir: {d}\n'
+                     f'filename: watched.png\n')
+        self.touch(f)
+        return f
+
+    @staticmethod
+    def touch(f):
+        """
+        Moves the modified time forward in case writes land in the same tick
+        """
+        st = os.stat(f)
+        os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    @pytest.fixture()
+    def watcher(self, files):
+        w = ConfigWatcher(self.write_config(files))
+        assert sorted(w.check()) == ['config', 'load grainsize',
+                                     'load handhardness', 'render']
+        return w
+
+    def test_first_render(self, watcher, files):
+        assert isfile(join(files, 'watched.png'))
+        assert isfile(join(files, 'config_full.ini'))
+
+    def test_no_changes(self, watcher):
+        assert watcher.check() == []
+
+    def test_config_change_keeps_data(self, watcher, files):
+        """
+        Test changing a title renders again without loading anything
+        """
+        df = watcher.data['grainsize'].df
+        self.write_config(files, title='New Title')
+
+        assert watcher.check() == ['config', 'render']
+        assert watcher.data['grainsize'].df is df
+
+    def test_data_change_reloads_panel(self, watcher, files):
+        """
+        Test only the panel of a changed data file is loaded again
+        """
+        df = watcher.data['grainsize'].df
+        f = join(files, 'hand_hardness.txt')
+        with open(f, 'a') as fp:
+            fp.write('\n')
+        self.touch(f)
+
+        assert watcher.check() == ['load handhardness', 'render']
+        assert watcher.data['grainsize'].df is df
+
+    @pytest.mark.parametrize('old, new', [
+        # Fails checking
+        ('filename: watched.png\n',
+         'filename: watched.png\nload_executor: bogus\n'),
+        # Fails parsing
+        ('plot_id: 2\n', 'plot_id: 2\n[hand_hardness]\nplot_id: 3\n')])
+    def test_config_errors_keep_last(self, watcher, files, old, new):
+        """
+        Test a config with errors doesn't replace the last valid one
+        """
+        cfg = watcher.cfg
+        f = join(files, 'config.ini')
+        with open(f) as fp:
+            lines = fp.read()
+        with open(f, 'w') as fp:
+            fp.write(lines.replace(old, new))
+        self.touch(f)
+
+        assert watcher.check() == []
+        assert watcher.cfg is cfg